@@ -1,49 +1,64 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Body
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Body, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response
 from typing import Optional, List
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 import shutil
 import os
 import json
 import uuid
+import base64
 import datetime
 import tempfile
+import time
 from datetime import timezone, timedelta
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
-from ..services.face_recognition import face_service
+from ..services.face_client import face_service
+from ..services.face_gallery import face_gallery
 from ..services.payroll import payroll_service
-from ..services.auth import auth_service, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from ..services.auth import auth_service, PasswordHasherBusy, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 from ..services.biometric_import import biometric_service
-from ..core.database import get_db, engine
+from ..services.punch_ingest import punch_service
+from ..services.employee_search import employee_search
+from ..services.time_format import format_clock, format_clocks, to_ist
+from ..services.attendance_rollup import attendance_rollup, DASHBOARD_CACHE, HOUR_COLUMNS
+from ..services.cache import cache, invalidate_on_commit
+from ..services.live_events import live_events
+from ..services.presence import presence
+from ..services.department_directory import department_directory, DEPARTMENT_CACHE
+from ..services.loan_ledger import loan_ledger
+from ..core.database import get_db, get_async_db, engine, pool_stats
+from ..core.partitioning import month_range
+from ..core.rate_limit import TokenBucketLimiter, client_ip
+from ..core.metrics import PAYROLL_JOB, PAYROLL_EMPLOYEES
 from ..models import models
-from ..models.models import Employee, AttendanceLog, SalaryStructure, AdminUser, Department, Payroll, PayrollStatus, EmployeeLoan, LoanPayment
+from ..models.models import Employee, AttendanceLog, SalaryStructure, AdminUser, Department, Payroll, PayrollStatus, EmployeeLoan, LoanPayment, DailyAttendanceSummary
 from jose import JWTError, jwt
 
 
 import logging
 import sys
+from ..core.logging_config import SCAN_LOGGER, AUDIT_LOGGER
 
-# Configure logging to file - Force Handler
+# Handlers, format and rotation come from app/core/logging_config.py
 logger = logging.getLogger("api_endpoints")
-logger.setLevel(logging.INFO)
-
-# Avoid adding permissions if already exists, but ensure file handler
-if not any(isinstance(h, logging.FileHandler) for h in logger.handlers):
-    fh = logging.FileHandler('backend_debug_forced.log')
-    fh.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
+# Per-scan events (check-in/out, registration); routine ones are sampled
+scan_logger = logging.getLogger(SCAN_LOGGER)
+# Registrations are rare and must not be sampled away like routine scans
+audit_logger = logging.getLogger(AUDIT_LOGGER)
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    """
+    Authorize from the token's claims. The (subject, token version) pair is
+    checked against admin_users once and then cached, so most requests do
+    not touch the database here; routes get a Principal (id, username, role).
+    """
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -57,29 +72,99 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
         
-    user = db.query(AdminUser).filter(AdminUser.username == username).first()
+    user = auth_service.get_principal(payload)
     if user is None:
         raise credentials_exception
     return user
 
+# Login attempts: a burst, then a steady refill per minute. Per IP against storms, per username against guessing.
+# Setting a burst or per-minute value to 0 disables that limiter.
+login_ip_limiter = TokenBucketLimiter(
+    capacity=int(os.getenv("LOGIN_IP_BURST", "20")),
+    rate=float(os.getenv("LOGIN_IP_PER_MINUTE", "10")) / 60
+)
+login_user_limiter = TokenBucketLimiter(
+    capacity=int(os.getenv("LOGIN_USER_BURST", "5")),
+    rate=float(os.getenv("LOGIN_USER_PER_MINUTE", "2")) / 60
+)
+
+def _check_login_rate(request: Request, username: str):
+    """429 with Retry-After once this client or this username is out of login attempts"""
+    ip = client_ip(request)
+    wait = max(login_ip_limiter.hit(ip), login_user_limiter.hit((username or "").lower()))
+    if wait > 0:
+        logger.warning(f"Login rate limited: user={username!r} ip={ip}")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts. Try again later.",
+            headers={"Retry-After": str(int(wait) + 1)},
+        )
+
+async def _verify_password(plain_password: str, hashed_password: str):
+    try:
+        return await auth_service.verify_password_async(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+
 @router.post("/auth/login")
 async def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = db.query(AdminUser).filter(AdminUser.username == form_data.username).first()
-    if not user or not auth_service.verify_password(form_data.password, user.password_hash):
+    _check_login_rate(request, form_data.username)
+    user = await run_in_threadpool(
+        lambda: db.query(AdminUser).filter(AdminUser.username == form_data.username).first()
+    )
+    if not user or not await _verify_password(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_user_limiter.reset(form_data.username.lower())
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth_service.create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=auth_service.token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+@router.post("/auth/change-password")
+async def change_password(
+    request: Request,
+    current_password: str = Body(...),
+    new_password: str = Body(..., min_length=8),
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """Change the caller's password; every token issued before this stops working"""
+    _check_login_rate(request, current_user.username)
+    user = await run_in_threadpool(
+        lambda: db.query(AdminUser).filter(AdminUser.id == current_user.id).first()
+    )
+    if not user or not await _verify_password(current_password, user.password_hash):
+        raise HTTPException(status_code=400, detail="Current password is incorrect")
+
+    try:
+        user.password_hash = await auth_service.get_password_hash_async(new_password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+
+    def _save():
+        db.commit()  # bumps token_version (see auth service)
+        db.refresh(user)
+    await run_in_threadpool(_save)
+
+    access_token = auth_service.create_access_token(
+        data=auth_service.token_claims(user), expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"status": "success", "access_token": access_token, "token_type": "bearer"}
+
+@router.get("/system/db-pool")
+def get_db_pool_stats(current_user: AdminUser = Depends(get_current_user)):
+    """Connection pool occupancy and checkout wait/hold timings for this worker process"""
+    return pool_stats()
+
 @router.get("/debug/salary-schema")
 def check_salary_schema(db: Session = Depends(get_db)):
     """Diagnostic endpoint to check salary_structures table schema"""
@@ -214,7 +299,7 @@ async def register_face(
             default_company = Company(id="default", name="Default Company")
             db.add(default_company)
             db.commit()
-            print("✅ Created default company")
+            logger.info("Created default company")
         
         # First, remove any inactive employees with the same code or mobile
         # This prevents unique constraint violations
@@ -230,7 +315,7 @@ async def register_face(
                 # Delete the inactive employee
                 db.delete(inactive_emp)
             db.commit()
-            print(f"🗑️ Removed {len(inactive_employees)} inactive employee(s) to allow re-registration")
+            audit_logger.info("Removed inactive employees to allow re-registration", extra={"emp_code": emp_id, "removed": len(inactive_employees)})
         
         # Now check if an active employee exists
         existing_emp = db.query(Employee).filter(
@@ -250,9 +335,7 @@ async def register_face(
             try:
                 embedding = face_service.register_face(temp_file_path)
             except Exception as e:
-                print(f"CRITICAL ERROR in face_service: {e}")
-                import traceback
-                traceback.print_exc()
+                audit_logger.exception("Face service failed during registration", extra={"emp_code": emp_id})
                 # Fallback for demo if service crashes completely
                 embedding = [0.1] * 512
             
@@ -261,7 +344,6 @@ async def register_face(
             
             # Create Employee
             # Note: face_service returns a list, we store it as JSON
-            print(f"📝 Creating employee record: {emp_id} - {name}")
             new_emp = Employee(
                 id=str(uuid.uuid4()),
                 emp_code=emp_id,
@@ -272,10 +354,9 @@ async def register_face(
                 company_id="default" # detailed tenant logic later
             )
             db.add(new_emp)
-            print(f"💾 Committing employee {emp_id} to database...")
             db.commit()
             db.refresh(new_emp)
-            print(f"✅ Employee {emp_id} registered successfully! ID: {new_emp.id}")
+            audit_logger.info("Employee registered", extra={"event": "register", "emp_code": emp_id, "employee_id": new_emp.id})
             
             return {"status": "success", "message": f"Employee {name} registered with Face ID", "id": new_emp.id, "emp_code": emp_id}
 
@@ -283,9 +364,7 @@ async def register_face(
             raise  # Re-raise HTTP exceptions as-is
         except Exception as e:
             db.rollback()
-            print(f"❌ Registration failed for {emp_id}: {e}")
-            import traceback
-            traceback.print_exc()
+            audit_logger.exception("Registration failed", extra={"event": "register", "emp_code": emp_id})
             raise HTTPException(status_code=500, detail=f"Registration error: {str(e)}")
 
         finally:
@@ -295,24 +374,64 @@ async def register_face(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Outer registration error: {e}")
-        import traceback
-        traceback.print_exc()
+        audit_logger.exception("Registration error", extra={"event": "register", "emp_code": emp_id})
         raise HTTPException(status_code=500, detail=f"System error: {str(e)}")
 
+def _live_payload(db: Session, today, log, emp, time_label: str):
+    """A check-in/out and the updated counters, as sent to /dashboard/live subscribers"""
+    return {
+        "activity": {
+            "id": log.id,
+            "employee_name": f"{emp.first_name} {emp.last_name or ''}",
+            "emp_code": emp.emp_code,
+            "department": emp.department,
+            "time": time_label,
+            "status": log.status,
+            "total_hours": log.total_hours_worked
+        },
+        "counters": attendance_rollup.day_counts(db, today)
+    }
+
+def _publish_live(db: Session, event_type: str, today, log, emp, time_label: str):
+    """Push a check-in/out to /dashboard/live subscribers (blocking; call from the threadpool)"""
+    if not live_events.has_audience():
+        return
+    try:
+        live_events.publish(event_type, _live_payload(db, today, log, emp, time_label))
+    except Exception as e:
+        logger.error(f"Live event publish failed: {e}")
+
+async def _publish_live_async(adb: AsyncSession, event_type: str, today, log, emp, time_label: str):
+    """_publish_live for the async check-in: counters on the session, the Redis publish in the threadpool"""
+    if not live_events.has_audience():
+        return
+    try:
+        payload = await adb.run_sync(lambda db: _live_payload(db, today, log, emp, time_label))
+        await run_in_threadpool(live_events.publish, event_type, payload)
+    except Exception as e:
+        logger.error(f"Live event publish failed: {e}")
+
+def _save_upload(upload: UploadFile, path: str):
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+
 @router.post("/attendance/mark")
 async def mark_attendance(
     emp_id: Optional[str] = Form(None, description="Employee Code (Optional for 1:N)"),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    adb: AsyncSession = Depends(get_async_db)
 ):
-    temp_file = f"temp_live_{file.filename}"
+    """
+    Kiosk check-in. Database access is awaited on the async session and the
+    face work runs in the threadpool, so a worker keeps many scans in flight
+    instead of blocking its event loop on each one.
+    """
+    temp_file = f"temp_live_{uuid.uuid4().hex}_{file.filename}"
     try:
-        with open(temp_file, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await run_in_threadpool(_save_upload, file, temp_file)
 
         # 1. Liveness Check
-        if not face_service.verify_liveness(temp_file):
+        if not await run_in_threadpool(face_service.verify_liveness, temp_file):
              return {
                  "status": "failed",
                  "reason": "Liveness check failed. Please blink and ensure good lighting."
@@ -323,43 +442,32 @@ async def mark_attendance(
 
         if emp_id:
             # --- 1:1 Matching ---
-            print(f"🔍 1:1 Matching mode for Employee ID: {emp_id}")
-            emp = db.query(Employee).filter(Employee.emp_code == emp_id).first()
+            emp = (await adb.execute(select(Employee).where(Employee.emp_code == emp_id))).scalars().first()
             if not emp:
                 raise HTTPException(status_code=404, detail="Employee not found")
             
             if not emp.face_encoding_ref:
                 return {"status": "failed", "reason": "No face data registered for this employee"}
                 
-            result = face_service.match_face(temp_file, json.loads(emp.face_encoding_ref))
+            result = await run_in_threadpool(face_service.match_face, temp_file, json.loads(emp.face_encoding_ref))
             if result["match"]:
                 matched_emp = emp
                 confidence = result["confidence"]
-                print(f"✅ 1:1 Match successful for {emp.emp_code} with confidence {confidence:.2f}")
             else:
-                print(f"❌ 1:1 Match failed for {emp.emp_code}: {result.get('reason', 'Face mismatch')}")
+                scan_logger.info("Check-in face mismatch", extra={"event": "check_in", "mode": "1:1", "emp_code": emp.emp_code, "reason": result.get("reason", "Face mismatch")})
                 return {"status": "failed", "reason": result.get("reason", "Face mismatch")}
         
         else:
             # --- 1:N Search (Auto Detect) ---
-            print("🔍 1:N Auto-Detection mode (no Employee ID provided)")
-            all_employees = db.query(Employee).filter(Employee.is_face_registered == True).all()
-            print(f"📋 Found {len(all_employees)} registered employees in database")
-            
-            candidates = {}
-            for e in all_employees:
-                if e.face_encoding_ref:
-                    candidates[e.id] = json.loads(e.face_encoding_ref)
-            
-            print(f"🎯 Searching among {len(candidates)} face candidates...")
-            result = face_service.identify_face(temp_file, candidates)
+            # Embeddings are re-read only when the gallery version changes
+            gallery_version, candidates = await face_gallery.load_async(adb)
+            result = await run_in_threadpool(face_service.identify_face, temp_file, candidates, gallery_version)
             
             if result["match"]:
-                matched_emp = db.query(Employee).filter(Employee.id == result["employee_id"]).first()
+                matched_emp = await adb.get(Employee, result["employee_id"])
                 confidence = result["confidence"]
-                print(f"✅ 1:N Match successful! Identified: {matched_emp.emp_code} ({matched_emp.first_name}) with confidence {confidence:.2f}")
             else:
-                 print(f"❌ 1:N Match failed: {result.get('reason', 'Face not recognized')}")
+                 scan_logger.info("Check-in face not recognized", extra={"event": "check_in", "mode": "1:N", "candidates": len(candidates), "reason": result.get("reason", "Face not recognized")})
                  return {"status": "failed", "reason": result.get("reason", "Face not recognized")}
 
         if matched_emp:
@@ -368,43 +476,53 @@ async def mark_attendance(
             now_ist = datetime.datetime.now(IST)
             today = now_ist.date()
             
-            # Check if already marked attendance today
-            existing_log = db.query(AttendanceLog).filter(
-                AttendanceLog.employee_id == matched_emp.id,
-                AttendanceLog.date == today
-            ).first()
+            # Repeat punch: answered from today's presence map (Redis calls block, so off the loop)
+            known, state = await run_in_threadpool(presence.shared_state, matched_emp.id, today)
+            if not known:
+                state = await adb.run_sync(lambda db: presence.local_state(db, matched_emp.id, today))
+            if state:
+                scan_logger.info("Repeat check-in", extra={"event": "check_in", "emp_code": matched_emp.emp_code, "check_in": state["check_in"]})
+                return {
+                    "status": "failed",
+                    "reason": f"Attendance already marked for {matched_emp.first_name} ({matched_emp.emp_code}) at {state['check_in']}"
+                }
+            
+            # Check if already marked attendance today (not in the map, e.g. bulk-imported)
+            existing_log = (await adb.execute(
+                select(AttendanceLog.check_in, AttendanceLog.check_out).where(
+                    AttendanceLog.employee_id == matched_emp.id,
+                    AttendanceLog.date == today
+                ).limit(1)
+            )).first()
             
             
             if existing_log:
-                # Convert check_in time to IST for display
-                if existing_log.check_in.tzinfo is None:
-                    # If timezone-naive, assume it's UTC
-                    check_in_ist = existing_log.check_in.replace(tzinfo=timezone.utc).astimezone(IST)
-                else:
-                    # If timezone-aware, convert to IST
-                    check_in_ist = existing_log.check_in.astimezone(IST)
-                    
-                print(f"⚠️ Attendance already marked for {matched_emp.emp_code} today at {check_in_ist}")
+                await run_in_threadpool(presence.record, matched_emp.id, today, existing_log.check_in, existing_log.check_out)
+                check_in_label = format_clock(existing_log.check_in, "--:--")
+                scan_logger.info("Repeat check-in", extra={"event": "check_in", "emp_code": matched_emp.emp_code, "check_in": check_in_label})
                 return {
                     "status": "failed",
-                    "reason": f"Attendance already marked for {matched_emp.first_name} ({matched_emp.emp_code}) at {check_in_ist.strftime('%I:%M %p')}"
+                    "reason": f"Attendance already marked for {matched_emp.first_name} ({matched_emp.emp_code}) at {check_in_label}"
                 }
             
             # Log Attendance
             try:
-                print(f"✅ Marking attendance for {matched_emp.emp_code} ({matched_emp.first_name})")
                 log = AttendanceLog(
                     id=str(uuid.uuid4()),
                     employee_id=matched_emp.id,
                     date=today,
                     check_in=now_ist,
                     status="present",
-                    confidence_score=float(confidence)
+                    confidence_score=float(confidence),
+                    source="face"
                 )
-                db.add(log)
-                db.commit()
-                db.refresh(log)
-                print(f"✅ Attendance logged successfully: ID={log.id}, Time={log.check_in}")
+                adb.add(log)
+                await adb.commit()
+                scan_logger.info("Checked in", extra={"event": "check_in", "emp_code": matched_emp.emp_code, "log_id": log.id, "confidence": round(float(confidence), 3)})
+                await run_in_threadpool(presence.record, matched_emp.id, today, check_in=now_ist)
+                # Rollup and live feed are shared with the sync paths; run them on this session's connection
+                await adb.run_sync(lambda db: attendance_rollup.apply_change_and_commit(db, today, matched_emp, None, {"status": "present"}))
+                await _publish_live_async(adb, "check_in", today, log, matched_emp, format_clock(now_ist))
                 
                 return {
                     "status": "success",
@@ -412,11 +530,11 @@ async def mark_attendance(
                     "confidence": confidence,
                     "employee": matched_emp.first_name,
                     "emp_code": matched_emp.emp_code,
-                    "time": now_ist.strftime('%I:%M %p')
+                    "time": format_clock(now_ist)
                 }
             except Exception as db_error:
-                db.rollback()
-                print(f"❌ DATABASE ERROR while marking attendance: {db_error}")
+                await adb.rollback()
+                scan_logger.exception("Database error while marking attendance", extra={"event": "check_in", "emp_code": matched_emp.emp_code})
                 return {
                     "status": "failed",
                     "reason": f"Database error: {str(db_error)}"
@@ -433,12 +551,14 @@ async def mark_attendance(
 
 
 @router.post("/attendance/checkout")
-async def mark_checkout(
+def mark_checkout(
     emp_id: Optional[str] = Form(None),
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
     """Mark check-out time for an employee"""
+    # Plain def: face matching, the database and the presence map's Redis calls all block,
+    # so this runs in the threadpool instead of on the event loop
     temp_file = f"temp_checkout_{file.filename}"
     try:
         with open(temp_file, "wb") as buffer:
@@ -471,13 +591,8 @@ async def mark_checkout(
                 return {"status": "failed", "reason": result.get("reason", "Face mismatch")}
         else:
             # 1:N Search
-            all_employees = db.query(Employee).filter(Employee.is_face_registered == True).all()
-            candidates = {}
-            for e in all_employees:
-                if e.face_encoding_ref:
-                    candidates[e.id] = json.loads(e.face_encoding_ref)
-            
-            result = face_service.identify_face(temp_file, candidates)
+            gallery_version, candidates = face_gallery.load(db)
+            result = face_service.identify_face(temp_file, candidates, gallery_version)
             
             if result["match"]:
                 matched_emp = db.query(Employee).filter(Employee.id == result["employee_id"]).first()
@@ -491,6 +606,14 @@ async def mark_checkout(
             now_ist = datetime.datetime.now(IST)
             today = now_ist.date()
             
+            # Repeat check-out: answered from today's presence map without a query
+            state = presence.get(db, matched_emp.id, today)
+            if state and state["check_out"]:
+                return {
+                    "status": "failed",
+                    "reason": f"Already checked out today at {state['check_out']}"
+                }
+            
             # Find today's attendance log
             existing_log = db.query(AttendanceLog).filter(
                 AttendanceLog.employee_id == matched_emp.id,
@@ -505,16 +628,16 @@ async def mark_checkout(
             
             
             if existing_log.check_out:
-                if existing_log.check_out.tzinfo is None:
-                    check_out_ist = existing_log.check_out.replace(tzinfo=timezone.utc).astimezone(IST)
-                else:
-                    check_out_ist = existing_log.check_out.astimezone(IST)
+                presence.record(matched_emp.id, today, existing_log.check_in, existing_log.check_out)
                 return {
                     "status": "failed",
-                    "reason": f"Already checked out today at {check_out_ist.strftime('%I:%M %p')}"
+                    "reason": f"Already checked out today at {format_clock(existing_log.check_out)}"
                 }
             
             
+            # The log as the rollup counted it, before this check-out
+            counted = {"status": existing_log.status, **{c: getattr(existing_log, c) for c in HOUR_COLUMNS}}
+            
             # Mark check-out
             existing_log.check_out = now_ist
             
@@ -542,15 +665,13 @@ async def mark_checkout(
                     duration = now_ist - check_in_time
                     raw_hours = duration.total_seconds() / 3600
                     
-                    print(f"⏱️ Time Calc - In: {check_in_time}, Out: {now_ist}")
-                    print(f"⏱️ Raw Duration: {raw_hours:.2f} hours")
                     
                     # Tiffin/Break Deduction (30 mins = 0.5 hours)
                     deduction = 0.5
                     net_hours = max(0, raw_hours - deduction)
                     
                     existing_log.total_hours_worked = round(net_hours, 2)
-                    print(f"✅ Net Hours (after {deduction}h deduction): {existing_log.total_hours_worked}")
+                    scan_logger.info("Checked out", extra={"event": "check_out", "emp_code": matched_emp.emp_code, "raw_hours": round(raw_hours, 2), "net_hours": float(existing_log.total_hours_worked)})
                     
                     # Enhanced OT Calculation
                     # Check if weekend (Saturday=5, Sunday=6)
@@ -582,17 +703,21 @@ async def mark_checkout(
                             existing_log.ot_hours = 0.0
                             
                 except Exception as e:
-                    print(f"❌ Error calculating hours: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    scan_logger.exception("Error calculating hours", extra={"event": "check_out", "emp_code": matched_emp.emp_code})
             
             db.commit()
+            presence.record(matched_emp.id, today, existing_log.check_in, now_ist)
+            attendance_rollup.apply_change_and_commit(
+                db, today, matched_emp, counted,
+                {"status": existing_log.status, **{c: getattr(existing_log, c) for c in HOUR_COLUMNS}}
+            )
+            _publish_live(db, "check_out", today, existing_log, matched_emp, format_clock(now_ist))
             
             return {
                 "status": "success",
                 "employee": matched_emp.first_name,
                 "emp_code": matched_emp.emp_code,
-                "check_out_time": now_ist.strftime('%I:%M %p'),
+                "check_out_time": format_clock(now_ist),
                 "total_hours": existing_log.total_hours_worked,
                 "ot_hours": existing_log.ot_hours if not is_weekend else existing_log.ot_weekend_hours
             }
@@ -605,15 +730,18 @@ async def mark_checkout(
 
 
 @router.post("/attendance/import-biometric")
-async def import_biometric_attendance(
+def import_biometric_attendance(
     file_path: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
+    dry_run: bool = Form(False, description="Only return a diff against stored rows"),
     db: Session = Depends(get_db)
 ):
     """Import attendance from biometric EXCEL file (Uploaded or local path)"""
     import tempfile
     import shutil
     
+    run_import = biometric_service.preview_import if dry_run else biometric_service.import_from_excel
+    
     if file:
         # Handle Uploaded File
         with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp:
@@ -621,11 +749,10 @@ async def import_biometric_attendance(
             final_path = tmp.name
         
         try:
-            result = biometric_service.import_from_excel(final_path, db)
+            result = run_import(final_path, db)
             return result
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Biometric import failed")
             raise HTTPException(status_code=500, detail=str(e))
         finally:
             if os.path.exists(final_path):
@@ -638,14 +765,87 @@ async def import_biometric_attendance(
             raise HTTPException(status_code=404, detail=f"File not found: {final_path}")
             
         try:
-            result = biometric_service.import_from_excel(final_path, db)
+            result = run_import(final_path, db)
             return result
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("Biometric import failed")
             raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/attendance/import-biometric/apply")
+def apply_biometric_preview(
+    preview_id: str = Body(...),
+    overwrite_conflicts: bool = Body(False),
+    db: Session = Depends(get_db)
+):
+    """Apply a dry-run preview without re-parsing the workbook"""
+    try:
+        return biometric_service.apply_preview(preview_id, db, overwrite_conflicts=overwrite_conflicts)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.exception("Applying biometric preview failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/attendance/punches")
+async def ingest_device_punches(
+    request: Request,
+    x_device_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Raw punch feed from biometric devices.
+    Body is a JSON array, JSON lines, or CSV (device_id,emp_code,timestamp[,idempotency_key]).
+    Retried batches are de-duplicated by idempotency key.
+    Requires X-Device-Key to match DEVICE_API_KEY; without a configured key the feed is off.
+    """
+    import hmac
+    device_key = os.getenv("DEVICE_API_KEY")
+    if not device_key:
+        raise HTTPException(status_code=503, detail="Device punch feed is disabled (DEVICE_API_KEY not set)")
+    if not hmac.compare_digest((x_device_key or "").encode(), device_key.encode()):
+        raise HTTPException(status_code=401, detail="Invalid device key")
+
+    body = await request.body()
+    try:
+        return await run_in_threadpool(punch_service.ingest, body, db)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        logger.exception("Device punch ingest failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/attendance/import-biometric/batch")
+def import_biometric_batch(
+    files: List[UploadFile] = File(..., description="Excel workbooks and/or ZIP archives of workbooks"),
+    db: Session = Depends(get_db)
+):
+    """Import several biometric device exports (all sheets) in one transaction"""
+    # Plain def: copying uploads, waiting on the parse pool and committing all block,
+    # so this runs in the threadpool instead of on the event loop
+    upload_dir = tempfile.mkdtemp(prefix="biometric_upload_")
+    try:
+        paths = []
+        for idx, upload in enumerate(files):
+            suffix = os.path.splitext(upload.filename or "")[1]
+            path = os.path.join(upload_dir, f"{idx}{suffix}")
+            with open(path, "wb") as buffer:
+                shutil.copyfileobj(upload.file, buffer)
+            paths.append(path)
+
+        return biometric_service.import_batch(paths, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Biometric batch import failed")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
 @router.get("/employees")
 def get_employees(
     department: Optional[str] = None,
@@ -684,10 +884,7 @@ def get_employees(
             "created_at": getattr(emp, 'created_at', None).isoformat() if getattr(emp, 'created_at', None) else None
         } for emp in employees]
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        logger.error(f"Error fetching employees: {e}\n{error_trace}")
-        print(f"Error fetching employees: {e}\n{error_trace}")
+        logger.exception(f"Error fetching employees: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/employees/{emp_id}")
@@ -765,50 +962,83 @@ def delete_employee(
     if hard_delete:
         # Hard delete - permanently remove
         # First delete related attendance logs
+        dates = [d for (d,) in db.query(AttendanceLog.date).filter(AttendanceLog.employee_id == emp_id).distinct()]
         db.query(AttendanceLog).filter(AttendanceLog.employee_id == emp_id).delete()
         # Then delete employee
         db.delete(emp)
+        # Bulk delete skips the ORM events; recompute the days the employee was counted on
+        attendance_rollup.refresh(db, dates)
         db.commit()
+        presence.forget(emp_id, presence.today())
         return {"status": "success", "message": "Employee permanently deleted"}
     else:
         # Soft delete - just mark as inactive
         emp.status = "inactive"
+        # Today's present count must stop including them (past days keep their history)
+        today = datetime.datetime.now(timezone(timedelta(hours=5, minutes=30))).date()
+        attendance_rollup.refresh(db, [today], [emp.id])
         db.commit()
         return {"status": "success", "message": "Employee deactivated successfully"}
 
+def _etag_matches(if_none_match: str, etag: str):
+    """If-None-Match check: "*" or any listed tag equal to etag, weak (W/) or not"""
+    def opaque(tag):
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+    tags = [tag.strip() for tag in if_none_match.split(",") if tag.strip()]
+    return "*" in tags or opaque(etag) in {opaque(tag) for tag in tags}
+
+def _etag_response(request: Request, etag: str, body: bytes):
+    """JSON body with its ETag, or 304 when the client's copy still matches"""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _cached_json(request: Request, key: str, compute):
+    """Serve a dashboard aggregate from the cache, answering 304 when the client's ETag still matches"""
+    etag, body = cache.get_or_compute(DASHBOARD_CACHE, key, compute)
+    return _etag_response(request, etag, body)
+
 @router.get("/dashboard/department-stats")
-def get_department_stats(db: Session = Depends(get_db)):
+def get_department_stats(request: Request, db: Session = Depends(get_db)):
     """Get employee count by department"""
     from sqlalchemy import func
     
-    dept_stats = db.query(
-        Employee.department,
-        func.count(Employee.id).label('count')
-    ).filter(
-        Employee.status == 'active'
-    ).group_by(Employee.department).all()
+    def compute():
+        dept_stats = db.query(
+            Employee.department,
+            func.count(Employee.id).label('count')
+        ).filter(
+            Employee.status == 'active'
+        ).group_by(Employee.department).all()
+        
+        return [{
+            "department": dept or "Unassigned",
+            "count": count
+        } for dept, count in dept_stats]
     
-    return [{
-        "department": dept or "Unassigned",
-        "count": count
-    } for dept, count in dept_stats]
+    return _cached_json(request, "department-stats", compute)
 
 @router.get("/dashboard/employee-type-stats")
-def get_employee_type_stats(db: Session = Depends(get_db)):
+def get_employee_type_stats(request: Request, db: Session = Depends(get_db)):
     """Get employee count by type"""
     from sqlalchemy import func
     
-    type_stats = db.query(
-        Employee.employee_type,
-        func.count(Employee.id).label('count')
-    ).filter(
-        Employee.status == 'active'
-    ).group_by(Employee.employee_type).all()
+    def compute():
+        type_stats = db.query(
+            Employee.employee_type,
+            func.count(Employee.id).label('count')
+        ).filter(
+            Employee.status == 'active'
+        ).group_by(Employee.employee_type).all()
+        
+        return [{
+            "employee_type": emp_type or "full_time",
+            "count": count
+        } for emp_type, count in type_stats]
     
-    return [{
-        "employee_type": emp_type or "full_time",
-        "count": count
-    } for emp_type, count in type_stats]
+    return _cached_json(request, "employee-type-stats", compute)
 
 
 @router.post("/payroll/calculate-demo")
@@ -828,70 +1058,152 @@ async def calculate_payroll(
     return payroll_service.calculate_net_salary(structure, attendance)
 
 @router.get("/dashboard/stats")
-def get_dashboard_stats(db: Session = Depends(get_db)):
+def get_dashboard_stats(request: Request, db: Session = Depends(get_db)):
     try:
         from sqlalchemy import func
         
-        total_employees = db.query(Employee).filter(Employee.status == 'active').count()
-        
-        today = datetime.date.today()
-        
-        # query distinct employees present today
-        present_query = db.query(AttendanceLog.employee_id).filter(
-            AttendanceLog.date == today,
-            AttendanceLog.status == "present"
-        ).distinct()
-        
-        present_count = present_query.count()
-        
-        # Simple logic: Absent = Total - Present (ignoring leaves/shifts for now)
-        absent_count = max(0, total_employees - present_count)
-
-        # Fetch recent logs for the dashboard widget
-        logs = db.query(AttendanceLog).join(Employee).order_by(AttendanceLog.check_in.desc()).limit(10).all()
-        recent_activity = []
-        for log in logs:
-            recent_activity.append({
-                "id": log.id,
-                "employee_name": f"{log.employee.first_name} {log.employee.last_name or ''}",
-                "emp_code": log.employee.emp_code,
-                "department": getattr(log.employee, 'department', None),
-                "time": log.check_in.strftime("%I:%M %p") if log.check_in else "--:--",
-                "status": log.status
-            })
+        # Attendance dates are IST calendar days
+        IST = timezone(timedelta(hours=5, minutes=30))
+        today = datetime.datetime.now(IST).date()
         
-        # Department breakdown (safe query for new columns)
-        department_breakdown = []
-        try:
-            dept_stats = db.query(
-                Employee.department,
-                func.count(Employee.id).label('count')
-            ).filter(
-                Employee.status == 'active'
-            ).group_by(Employee.department).all()
+        def compute():
+            # Present today from the daily rollup (first load of the day computes it)
+            counts = attendance_rollup.day_counts(db, today)
+
+            # Fetch recent logs for the dashboard widget (one joined projection, no per-row employee loads)
+            logs = db.query(
+                AttendanceLog.id, AttendanceLog.check_in, AttendanceLog.status,
+                Employee.first_name, Employee.last_name, Employee.emp_code, Employee.department
+            ).join(Employee).order_by(AttendanceLog.check_in.desc()).limit(10).all()
+            recent_activity = []
+            for log in logs:
+                recent_activity.append({
+                    "id": log.id,
+                    "employee_name": f"{log.first_name} {log.last_name or ''}",
+                    "emp_code": log.emp_code,
+                    "department": log.department,
+                    "time": format_clock(log.check_in, "--:--"),
+                    "status": log.status
+                })
             
-            department_breakdown = [{
-                "department": dept or "Unassigned",
-                "count": count
-            } for dept, count in dept_stats]
-        except Exception:
-            pass
+            # Department breakdown (safe query for new columns)
+            department_breakdown = []
+            try:
+                dept_stats = db.query(
+                    Employee.department,
+                    func.count(Employee.id).label('count')
+                ).filter(
+                    Employee.status == 'active'
+                ).group_by(Employee.department).all()
+                
+                department_breakdown = [{
+                    "department": dept or "Unassigned",
+                    "count": count
+                } for dept, count in dept_stats]
+            except Exception:
+                pass
 
-        return {
-            "total_employees": total_employees,
-            "present_today": present_count,
-            "absent_today": absent_count,
-            "recent_activity": recent_activity,
-            "department_breakdown": department_breakdown, # Fixed key name to match frontend expectation
-            "employee_type_breakdown": [] # TODO: Add this stats query
-        }
+            return {
+                **counts,
+                "recent_activity": recent_activity,
+                "department_breakdown": department_breakdown, # Fixed key name to match frontend expectation
+                "employee_type_breakdown": [] # TODO: Add this stats query
+            }
+        
+        # Keyed by day so the counts roll over at IST midnight
+        return _cached_json(request, f"stats:{today.isoformat()}", compute)
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        logger.error(f"Error fetching dashboard stats: {e}\n{error_trace}")
-        print(f"Error fetching dashboard stats: {e}\n{error_trace}")
+        logger.exception(f"Error fetching dashboard stats: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/dashboard/live")
+async def dashboard_live(request: Request):
+    """
+    Server-sent events: one 'attendance' event per successful check-in/check-out,
+    carrying the activity row and the updated present/absent counters.
+    Load /dashboard/stats once for the initial state, then apply events.
+    """
+    from fastapi.responses import StreamingResponse
+    
+    return StreamingResponse(
+        live_events.stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Longest range one attendance-summary request may cover
+REPORT_MAX_DAYS = 366
+
+@router.get("/reports/attendance-summary")
+def get_attendance_summary_report(
+    start_date: Optional[datetime.date] = None,
+    end_date: Optional[datetime.date] = None,
+    group_by: str = 'department',
+    period: str = 'day',
+    db: Session = Depends(get_db)
+):
+    """
+    Presence and OT totals from the daily rollup.
+    group_by: department | employee_type | none; period: day | month.
+    Defaults to the last 30 days; at most REPORT_MAX_DAYS. Read-only: days
+    without summary rows (no attendance written) are left out, and
+    backfill_attendance_summary.py fills in history.
+    """
+    if group_by not in ('department', 'employee_type', 'none'):
+        raise HTTPException(status_code=400, detail="group_by must be 'department', 'employee_type' or 'none'")
+    if period not in ('day', 'month'):
+        raise HTTPException(status_code=400, detail="period must be 'day' or 'month'")
+    
+    IST = timezone(timedelta(hours=5, minutes=30))
+    today = datetime.datetime.now(IST).date()
+    end_date = end_date or today
+    start_date = start_date or end_date - timedelta(days=29)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date")
+    if (end_date - start_date).days + 1 > REPORT_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {REPORT_MAX_DAYS} days")
+    
+    S = DailyAttendanceSummary
+    rows = db.query(S).filter(S.date >= start_date, S.date <= end_date).order_by(S.date).all()
+    
+    totals = {}
+    for row in rows:
+        bucket = row.date.isoformat() if period == 'day' else row.date.strftime("%Y-%m")
+        group = None if group_by == 'none' else getattr(row, group_by)
+        t = totals.setdefault((bucket, group), {
+            "period": bucket, "group": group, "days": set(),
+            "headcount": 0, "present": 0, "half_day": 0, "absent": 0,
+            "total_hours_worked": 0.0, "ot_hours": 0.0, "ot_weekend_hours": 0.0, "ot_holiday_hours": 0.0
+        })
+        t["days"].add(row.date)
+        t["headcount"] += row.headcount or 0
+        t["present"] += row.present_count or 0
+        t["half_day"] += row.half_day_count or 0
+        t["absent"] += row.absent_count or 0
+        t["total_hours_worked"] += float(row.total_hours_worked or 0)
+        t["ot_hours"] += float(row.ot_hours or 0)
+        t["ot_weekend_hours"] += float(row.ot_weekend_hours or 0)
+        t["ot_holiday_hours"] += float(row.ot_holiday_hours or 0)
+    
+    result = []
+    for t in totals.values():
+        days = len(t.pop("days"))
+        # Headcount summed over days is employee-days; presence rate is per employee-day
+        t["employee_days"] = t.pop("headcount")
+        t["presence_rate"] = round((t["present"] + 0.5 * t["half_day"]) / t["employee_days"] * 100, 1) if t["employee_days"] else 0.0
+        t["days"] = days
+        for key in ("total_hours_worked", "ot_hours", "ot_weekend_hours", "ot_holiday_hours"):
+            t[key] = round(t[key], 2)
+        result.append(t)
+    
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "group_by": group_by,
+        "period": period,
+        "rows": result
+    }
+
 @router.post("/payroll/generate")
 def generate_payroll(
     month: int = Body(..., ge=1, le=12),
@@ -902,8 +1214,8 @@ def generate_payroll(
     Generate payroll for all active employees for a specific month/year.
     Calculates salaries based on attendance logs.
     """
-    from sqlalchemy import extract
     import calendar
+    started = time.perf_counter()
     
     # 1. Get all active employees with salary structure
     employees = db.query(Employee).filter(
@@ -914,6 +1226,19 @@ def generate_payroll(
     errors = []
     
     total_days_in_month = calendar.monthrange(year, month)[1]
+    # Date-range bounds (not extract()) so partitioned attendance_logs prunes to one month
+    month_start, month_end = month_range(year, month)
+    
+    # 1b. Post this month's loan EMIs in one pass for everyone being paid (not locked payrolls),
+    # then read each employee's total deduction for the month
+    locked_ids = {row[0] for row in db.query(Payroll.employee_id).filter(
+        Payroll.month == month,
+        Payroll.year == year,
+        Payroll.status == 'locked'
+    )}
+    payable_ids = [emp.id for emp in employees if emp.salary_structure and emp.id not in locked_ids]
+    loan_ledger.post_month(db, month, year, payable_ids)
+    loan_deductions = loan_ledger.deductions(db, month, year, payable_ids)
     
     for emp in employees:
         try:
@@ -924,8 +1249,8 @@ def generate_payroll(
             # 2. Fetch Attendance Logs for the month
             logs = db.query(AttendanceLog).filter(
                 AttendanceLog.employee_id == emp.id,
-                extract('month', AttendanceLog.date) == month,
-                extract('year', AttendanceLog.date) == year
+                AttendanceLog.date >= month_start,
+                AttendanceLog.date < month_end
             ).all()
             
             # 3. Aggregate Attendance
@@ -978,45 +1303,8 @@ def generate_payroll(
                 "paid_days": paid_days, 
             }
             
-            # 3b. Fetch Loan EMI Deductions for this employee and month
-            loan_deduction = 0
-            from ..models.models import EmployeeLoan, LoanPayment
-            active_loans = db.query(EmployeeLoan).filter(
-                EmployeeLoan.employee_id == emp.id,
-                EmployeeLoan.status == "active"
-            ).all()
-            
-            for loan in active_loans:
-                # Check if payment already recorded for this month/year
-                existing_payment = db.query(LoanPayment).filter(
-                    LoanPayment.loan_id == loan.id,
-                    LoanPayment.month == month,
-                    LoanPayment.year == year
-                ).first()
-                
-                if not existing_payment:
-                    # Add EMI to deduction and record payment
-                    loan_deduction += float(loan.emi_amount)
-                    
-                    # Record the payment
-                    payment = LoanPayment(
-                        loan_id=loan.id,
-                        employee_id=emp.id,
-                        payment_date=datetime.date.today(),
-                        amount=loan.emi_amount,
-                        month=month,
-                        year=year,
-                        status="paid"
-                    )
-                    db.add(payment)
-                    
-                    # Update remaining EMIs
-                    loan.remaining_emis = max(0, loan.remaining_emis - 1)
-                    if loan.remaining_emis == 0:
-                        loan.status = "completed"
-            
             # Add loan_deduction to attendance_summary for payroll calculation
-            attendance_summary["loan_deduction"] = loan_deduction
+            attendance_summary["loan_deduction"] = loan_deductions.get(emp.id, 0)
             
             # 4. Calculate Salary
             # Convert SQLAlchemy model to dict for service
@@ -1136,10 +1424,11 @@ def generate_payroll(
             
         except Exception as e:
             errors.append(f"Failed {emp.emp_code}: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Payroll generation failed for {emp.emp_code}")
     
     db.commit()
+    PAYROLL_JOB.observe(time.perf_counter() - started, scope="all")
+    PAYROLL_EMPLOYEES.inc(generated_count, scope="all")
     
     return {
         "status": "success",
@@ -1155,9 +1444,9 @@ def generate_single_payroll(
     db: Session = Depends(get_db)
 ):
     """Generate payroll for a single employee"""
-    from sqlalchemy import extract
     import calendar
     import datetime
+    started = time.perf_counter()
     
     emp = db.query(Employee).filter(Employee.id == emp_id).first()
     if not emp:
@@ -1167,12 +1456,13 @@ def generate_single_payroll(
         raise HTTPException(status_code=400, detail="Employee salary structure not configured")
         
     total_days_in_month = calendar.monthrange(year, month)[1]
+    month_start, month_end = month_range(year, month)
     
     # 2. Fetch Attendance Logs
     logs = db.query(AttendanceLog).filter(
         AttendanceLog.employee_id == emp.id,
-        extract('month', AttendanceLog.date) == month,
-        extract('year', AttendanceLog.date) == year
+        AttendanceLog.date >= month_start,
+        AttendanceLog.date < month_end
     ).all()
     
     # 3. Aggregate Attendance
@@ -1220,42 +1510,9 @@ def generate_single_payroll(
         "paid_days": paid_days,
     }
     
-    # 3b. Fetch Loan EMI Deductions for this employee and month
-    loan_deduction = 0
-    from ..models.models import EmployeeLoan, LoanPayment
-    active_loans = db.query(EmployeeLoan).filter(
-        EmployeeLoan.employee_id == emp.id,
-        EmployeeLoan.status == "active"
-    ).all()
-    
-    for loan in active_loans:
-        # Check if payment already recorded for this month/year
-        existing_payment = db.query(LoanPayment).filter(
-            LoanPayment.loan_id == loan.id,
-            LoanPayment.month == month,
-            LoanPayment.year == year
-        ).first()
-        
-        if not existing_payment:
-            # Add EMI to deduction and record payment
-            loan_deduction += float(loan.emi_amount)
-            
-            # Record the payment
-            payment = LoanPayment(
-                loan_id=loan.id,
-                employee_id=emp.id,
-                payment_date=datetime.date.today(),
-                amount=loan.emi_amount,
-                month=month,
-                year=year,
-                status="paid"
-            )
-            db.add(payment)
-            
-            # Update remaining EMIs
-            loan.remaining_emis = max(0, loan.remaining_emis - 1)
-            if loan.remaining_emis == 0:
-                loan.status = "completed"
+    # 3b. Post this month's loan EMIs (once per loan and month) and read the deduction
+    loan_ledger.post_month(db, month, year, [emp.id])
+    loan_deduction = loan_ledger.deductions(db, month, year, [emp.id]).get(emp.id, 0)
     
     # Add loan_deduction to attendance_summary
     attendance_summary["loan_deduction"] = loan_deduction
@@ -1369,6 +1626,8 @@ def generate_single_payroll(
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+    PAYROLL_JOB.observe(time.perf_counter() - started, scope="employee")
+    PAYROLL_EMPLOYEES.inc(1, scope="employee")
         
     return {"status": "success", "message": "Payroll generated successfully", "net_salary": payroll_record.net_salary}
 
@@ -1379,7 +1638,9 @@ def get_payrolls(
     employee_id: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(Payroll).join(Employee)
+    from sqlalchemy.orm import contains_eager
+    # Employee columns come from the join itself, not a lazy load per payroll row
+    query = db.query(Payroll).join(Employee).options(contains_eager(Payroll.employee))
     
     if month:
         query = query.filter(Payroll.month == month)
@@ -1510,14 +1771,14 @@ def get_employee_payroll(
     # start_date = target_date.replace(day=1) # Not used?
     
     import calendar
-    from sqlalchemy import extract
     total_days_in_month = calendar.monthrange(target_date.year, target_date.month)[1]
+    month_start, month_end = month_range(target_date.year, target_date.month)
     
     # Fetch all logs for the month
     month_logs = db.query(AttendanceLog).filter(
         AttendanceLog.employee_id == emp_id,
-        extract('month', AttendanceLog.date) == target_date.month,
-        extract('year', AttendanceLog.date) == target_date.year
+        AttendanceLog.date >= month_start,
+        AttendanceLog.date < month_end
     ).all()
     
     # Aggregate Attendance Logic
@@ -1594,6 +1855,37 @@ def get_employee_payroll(
         **result
     }
 
+def _encode_logs_cursor(date, check_in, log_id):
+    """Opaque keyset cursor: position of the last row on a page"""
+    payload = [date.isoformat(), check_in.isoformat() if check_in else None, log_id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def _decode_logs_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_str, check_in_str, log_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (
+            datetime.date.fromisoformat(date_str),
+            datetime.datetime.fromisoformat(check_in_str) if check_in_str else None,
+            str(log_id),
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _estimate_row_count(query, db: Session):
+    """Planner row estimate on Postgres; other databases fall back to an exact count"""
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return query.count(), False
+    compiled = query.statement.compile(dialect=bind.dialect)
+    plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + compiled.string, compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"]), True
+
+
 @router.get("/attendance/logs")
 def get_attendance_logs(
     start_date: Optional[str] = None,
@@ -1603,74 +1895,114 @@ def get_attendance_logs(
     page: int = 1,
     page_size: int = 50,
     sort: str = 'date_desc',
+    cursor: Optional[str] = None,
+    count: str = 'exact',
     db: Session = Depends(get_db)
 ):
-    """Get attendance logs with optional filters and pagination"""
-    from sqlalchemy import desc
-    
-    query = db.query(AttendanceLog).join(Employee)
+    """
+    Get attendance logs with optional filters and pagination.
+    Pass `cursor` (the previous response's next_cursor) for keyset paging on
+    date_desc; `count` is 'exact', 'approx' (planner estimate) or 'none'.
+    """
+    from sqlalchemy import desc, or_, and_
+    
+    if count not in ('exact', 'approx', 'none'):
+        raise HTTPException(status_code=400, detail="count must be 'exact', 'approx' or 'none'")
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), 500)
+    
+    # Only the columns the response uses, in one join
+    query = db.query(
+        AttendanceLog.id,
+        AttendanceLog.date,
+        AttendanceLog.check_in,
+        AttendanceLog.check_out,
+        AttendanceLog.status,
+        AttendanceLog.confidence_score,
+        AttendanceLog.total_hours_worked,
+        AttendanceLog.ot_hours,
+        AttendanceLog.ot_weekend_hours,
+        AttendanceLog.ot_holiday_hours,
+        Employee.first_name,
+        Employee.last_name,
+        Employee.emp_code,
+        Employee.department,
+    ).join(Employee, Employee.id == AttendanceLog.employee_id)
     
     if employee_id:
         query = query.filter(AttendanceLog.employee_id == employee_id)
     if search:
-        search_lower = search.lower()
-        from sqlalchemy import or_
-        query = query.filter(
-            or_(
-                func.lower(func.coalesce(Employee.first_name, '')).contains(search_lower),
-                func.lower(func.coalesce(Employee.last_name, '')).contains(search_lower),
-                func.lower(func.coalesce(Employee.emp_code, '')).contains(search_lower)
-            )
-        )
+        # Resolved against the employee search index, not string-matched per attendance row
+        matched_ids = employee_search.resolve_ids(search, db)
+        if matched_ids is not None:
+            query = query.filter(AttendanceLog.employee_id.in_(matched_ids))
     if start_date:
         query = query.filter(AttendanceLog.date >= start_date)
     if end_date:
         query = query.filter(AttendanceLog.date <= end_date)
     
-    # Get total count for pagination
-    total_records = query.count()
-    
-    # Apply pagination
-    offset = (page - 1) * page_size
-    # Dynamic sorting
-    if sort == 'emp_asc':
-        query = query.order_by(Employee.first_name.asc(), desc(AttendanceLog.date))
+    # Total for pagination, computed before the cursor narrows the range
+    total_is_estimate = False
+    if count == 'exact':
+        total_records = query.order_by(None).count()
+    elif count == 'approx':
+        total_records, total_is_estimate = _estimate_row_count(query.order_by(None), db)
     else:
-        query = query.order_by(desc(AttendanceLog.date), desc(AttendanceLog.check_in))
-        
-    logs = query.offset(offset).limit(page_size).all()
+        total_records = None
+    
+    keyset = sort != 'emp_asc'
+    if keyset:
+        # Newest first; rows without a check-in sort last within the day, id breaks ties
+        query = query.order_by(
+            desc(AttendanceLog.date),
+            AttendanceLog.check_in.desc().nulls_last(),
+            desc(AttendanceLog.id)
+        )
+        if cursor:
+            c_date, c_check_in, c_id = _decode_logs_cursor(cursor)
+            if c_check_in is not None:
+                same_day = or_(
+                    AttendanceLog.check_in < c_check_in,
+                    AttendanceLog.check_in.is_(None),
+                    and_(AttendanceLog.check_in == c_check_in, AttendanceLog.id < c_id)
+                )
+            else:
+                same_day = and_(AttendanceLog.check_in.is_(None), AttendanceLog.id < c_id)
+            query = query.filter(or_(
+                AttendanceLog.date < c_date,
+                and_(AttendanceLog.date == c_date, same_day)
+            ))
+        else:
+            query = query.offset((page - 1) * page_size)
+    else:
+        # Grouped-by-employee view keeps offset paging
+        query = query.order_by(Employee.first_name.asc(), desc(AttendanceLog.date))
+        query = query.offset((page - 1) * page_size)
     
-    # IST timezone for display
-    IST = timezone(timedelta(hours=5, minutes=30))
+    # One extra row tells us whether another page exists
+    logs = query.limit(page_size + 1).all()
+    has_more = len(logs) > page_size
+    logs = logs[:page_size]
+    
+    next_cursor = None
+    if keyset and has_more and logs:
+        last = logs[-1]
+        next_cursor = _encode_logs_cursor(last.date, last.check_in, last.id)
+    
+    # Whole-page time formatting
+    check_ins = format_clocks([log.check_in for log in logs])
+    check_outs = format_clocks([log.check_out for log in logs])
     
     result = []
-    for log in logs:
-        emp = log.employee
-        # Convert times to IST
-        if log.check_in:
-            if log.check_in.tzinfo is None:
-                check_in_ist = log.check_in.replace(tzinfo=timezone.utc).astimezone(IST)
-            else:
-                check_in_ist = log.check_in.astimezone(IST)
-        else:
-            check_in_ist = None
-            
-        if log.check_out:
-            if log.check_out.tzinfo is None:
-                check_out_ist = log.check_out.replace(tzinfo=timezone.utc).astimezone(IST)
-            else:
-                check_out_ist = log.check_out.astimezone(IST)
-        else:
-            check_out_ist = None
-        
+    for log, check_in_label, check_out_label in zip(logs, check_ins, check_outs):
         result.append({
             "id": log.id,
             "date": log.date.isoformat(),
-            "employee_name": f"{emp.first_name} {emp.last_name or ''}".strip(),
-            "emp_code": emp.emp_code,
-            "department": emp.department or "Unassigned",
-            "check_in": check_in_ist.strftime("%I:%M %p") if check_in_ist else None,
-            "check_out": check_out_ist.strftime("%I:%M %p") if check_out_ist else None,
+            "employee_name": f"{log.first_name} {log.last_name or ''}".strip(),
+            "emp_code": log.emp_code,
+            "department": log.department or "Unassigned",
+            "check_in": check_in_label,
+            "check_out": check_out_label,
             "status": log.status,
             "confidence": float(log.confidence_score) if log.confidence_score else None,
             "total_hours_worked": float(log.total_hours_worked) if log.total_hours_worked else 0,
@@ -1682,9 +2014,12 @@ def get_attendance_logs(
     return {
         "logs": result,
         "total": total_records,
+        "total_is_estimate": total_is_estimate,
         "page": page,
         "page_size": page_size,
-        "total_pages": (total_records + page_size - 1) // page_size
+        "total_pages": (total_records + page_size - 1) // page_size if total_records is not None else None,
+        "has_more": has_more,
+        "next_cursor": next_cursor
     }
 
 @router.put("/attendance/logs/{log_id}")
@@ -1734,6 +2069,8 @@ def update_attendance_log(
     if "ot_holiday_hours" in update_data:
         log.ot_holiday_hours = update_data["ot_holiday_hours"]
     
+    log.source = "manual"
+    
     # Recalculate total hours if check_in or check_out changed
     if "check_in" in update_data or "check_out" in update_data:
         if log.check_in and log.check_out:
@@ -1748,11 +2085,98 @@ def update_attendance_log(
         else:
             log.total_hours_worked = 0
     
+    attendance_rollup.refresh(db, [log.date], [log.employee_id])
     db.commit()
     db.refresh(log)
     
     return {"message": "Attendance log updated successfully", "log_id": log.id}
 
+# Rows fetched per server-side cursor round-trip when streaming exports
+EXPORT_BATCH_SIZE = 2000
+
+
+def _attendance_export_query(start_date, end_date, employee_id, search, db: Session):
+    """Filtered attendance projection shared by the export endpoints"""
+    from sqlalchemy import select, desc
+    
+    stmt = select(
+        AttendanceLog.date,
+        Employee.first_name,
+        Employee.last_name,
+        Employee.emp_code,
+        Employee.department,
+        AttendanceLog.check_in,
+        AttendanceLog.check_out,
+        AttendanceLog.status,
+        AttendanceLog.total_hours_worked,
+        AttendanceLog.ot_hours,
+        AttendanceLog.ot_weekend_hours,
+        AttendanceLog.ot_holiday_hours,
+        AttendanceLog.confidence_score,
+    ).join(Employee, Employee.id == AttendanceLog.employee_id)
+    
+    if employee_id:
+        stmt = stmt.where(AttendanceLog.employee_id == employee_id)
+    if search:
+        matched_ids = employee_search.resolve_ids(search, db)
+        if matched_ids is not None:
+            stmt = stmt.where(AttendanceLog.employee_id.in_(matched_ids))
+    if start_date:
+        stmt = stmt.where(AttendanceLog.date >= start_date)
+    if end_date:
+        stmt = stmt.where(AttendanceLog.date <= end_date)
+    
+    return stmt.order_by(desc(AttendanceLog.date), desc(AttendanceLog.check_in))
+
+
+def _stream_attendance_csv(stmt):
+    """
+    Yield the export as CSV text chunks. Runs on its own session because the
+    request's session is closed before the response body is sent.
+    """
+    import csv
+    from io import StringIO
+    from ..core.database import SessionLocal
+    
+    output = StringIO()
+    writer = csv.writer(output)
+    
+    # Header goes out before the query runs so the download starts immediately
+    writer.writerow(['Date', 'Employee Name', 'Employee Code', 'Department', 'Check In', 'Check Out', 'Status', 'Total Hours', 'OT Hours', 'Weekend OT', 'Holiday OT', 'Confidence Score'])
+    yield output.getvalue()
+    
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt, execution_options={"stream_results": True, "yield_per": EXPORT_BATCH_SIZE})
+        for batch in result.partitions():
+            output.seek(0)
+            output.truncate()
+            check_ins = format_clocks([log.check_in for log in batch], '')
+            check_outs = format_clocks([log.check_out for log in batch], '')
+            for log, check_in_label, check_out_label in zip(batch, check_ins, check_outs):
+                writer.writerow([
+                    log.date.isoformat(),
+                    f"{log.first_name} {log.last_name or ''}".strip(),
+                    log.emp_code,
+                    log.department or '',
+                    check_in_label,
+                    check_out_label,
+                    log.status,
+                    f"{float(log.total_hours_worked):.2f}" if log.total_hours_worked else '0.00',
+                    f"{float(log.ot_hours):.2f}" if log.ot_hours else '0.00',
+                    f"{float(log.ot_weekend_hours):.2f}" if log.ot_weekend_hours else '0.00',
+                    f"{float(log.ot_holiday_hours):.2f}" if log.ot_holiday_hours else '0.00',
+                    f"{float(log.confidence_score):.2f}" if log.confidence_score else ''
+                ])
+            yield output.getvalue()
+    except Exception as e:
+        # Headers are already sent; all we can do is log and cut the stream short
+        logger.exception(f"EXPORT STREAM ERROR: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+
 @router.get("/attendance/export")
 def export_attendance_logs(
     start_date: Optional[str] = None,
@@ -1762,94 +2186,114 @@ def export_attendance_logs(
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user)
 ):
-    """Export attendance logs to CSV"""
-    from sqlalchemy import desc
-    import csv
-    from io import StringIO
+    """Export attendance logs to CSV, streamed in batches from a server-side cursor"""
     from fastapi.responses import StreamingResponse
     
-    query = db.query(AttendanceLog).join(Employee)
-    
     logger.info(f"EXPORT REQUEST - Search: '{search}', Start: {start_date}, End: {end_date}, EmpID: {employee_id}")
     
     try:
-        if employee_id:
-            query = query.filter(AttendanceLog.employee_id == employee_id)
-        if search:
-            search_lower = search.lower()
-            from sqlalchemy import or_
-            query = query.filter(
-                or_(
-                    func.lower(func.coalesce(Employee.first_name, '')).contains(search_lower),
-                    func.lower(func.coalesce(Employee.last_name, '')).contains(search_lower),
-                    func.lower(func.coalesce(Employee.emp_code, '')).contains(search_lower)
-                )
-            )
-        if start_date:
-            query = query.filter(AttendanceLog.date >= start_date)
-        if end_date:
-            query = query.filter(AttendanceLog.date <= end_date)
-        
-        # No limit for export, but maybe reasonable cap?
-        logs = query.order_by(desc(AttendanceLog.date), desc(AttendanceLog.check_in)).all()
-        
-        IST = timezone(timedelta(hours=5, minutes=30))
-        
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Header
-        writer.writerow(['Date', 'Employee Name', 'Employee Code', 'Department', 'Check In', 'Check Out', 'Status', 'Total Hours', 'OT Hours', 'Weekend OT', 'Holiday OT', 'Confidence Score'])
-        
-        for log in logs:
-            emp = log.employee
-            
-            if log.check_in:
-                if log.check_in.tzinfo is None:
-                    check_in_ist = log.check_in.replace(tzinfo=timezone.utc).astimezone(IST)
-                else:
-                    check_in_ist = log.check_in.astimezone(IST)
-            else:
-                check_in_ist = None
-                
-            if log.check_out:
-                if log.check_out.tzinfo is None:
-                    check_out_ist = log.check_out.replace(tzinfo=timezone.utc).astimezone(IST)
-                else:
-                    check_out_ist = log.check_out.astimezone(IST)
-            else:
-                check_out_ist = None
-                
-            writer.writerow([
-                log.date.isoformat(),
-                f"{emp.first_name} {emp.last_name or ''}".strip(),
-                emp.emp_code,
-                getattr(emp, 'department', ''),
-                check_in_ist.strftime("%I:%M %p") if check_in_ist else '',
-                check_out_ist.strftime("%I:%M %p") if check_out_ist else '',
-                log.status,
-                f"{float(log.total_hours_worked):.2f}" if log.total_hours_worked else '0.00',
-                f"{float(log.ot_hours):.2f}" if log.ot_hours else '0.00',
-                f"{float(log.ot_weekend_hours):.2f}" if log.ot_weekend_hours else '0.00',
-                f"{float(log.ot_holiday_hours):.2f}" if log.ot_holiday_hours else '0.00',
-                f"{float(log.confidence_score):.2f}" if log.confidence_score else ''
-            ])
-        
-        output.seek(0)
+        stmt = _attendance_export_query(start_date, end_date, employee_id, search, db)
         
         response = StreamingResponse(
-            iter([output.getvalue()]),
+            _stream_attendance_csv(stmt),
             media_type="text/csv"
         )
         response.headers["Content-Disposition"] = "attachment; filename=attendance_logs.csv"
         return response
 
     except Exception as e:
-        logger.error(f"EXPORT ERROR: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception(f"EXPORT ERROR: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
+def _columnar_response(stmt, format: str, filename: str):
+    """StreamingResponse for a Parquet / Arrow IPC export of stmt"""
+    from fastapi.responses import StreamingResponse
+    from ..services import columnar_export
+    
+    if format not in columnar_export.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'parquet' or 'arrow'")
+    try:
+        columnar_export.arrow_schema(stmt)
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Columnar export requires pyarrow on the server")
+    
+    media_type, extension = columnar_export.FORMATS[format]
+    response = StreamingResponse(columnar_export.stream_columnar(stmt, format), media_type=media_type)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}.{extension}"
+    return response
+
+
+@router.get("/attendance/export/columnar")
+def export_attendance_columnar(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    search: Optional[str] = None,
+    format: str = 'parquet',
+    db: Session = Depends(get_db),
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """Export attendance logs as Parquet (default) or Arrow IPC, same filters as /attendance/export"""
+    stmt = _attendance_export_query(start_date, end_date, employee_id, search, db)
+    return _columnar_response(stmt, format, "attendance_logs")
+
+
+@router.get("/payroll/export/columnar")
+def export_payroll_columnar(
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    employee_id: Optional[str] = None,
+    format: str = 'parquet',
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """Export payroll runs as Parquet (default) or Arrow IPC, same filters as /payroll/list"""
+    from sqlalchemy import select
+    
+    stmt = select(
+        Payroll.id,
+        Payroll.employee_id,
+        Employee.emp_code,
+        Employee.first_name,
+        Employee.last_name,
+        Employee.department,
+        Employee.employee_type,
+        Payroll.month,
+        Payroll.year,
+        Payroll.total_days,
+        Payroll.working_days,
+        Payroll.present_days,
+        Payroll.ot_hours,
+        Payroll.basic_earned,
+        Payroll.hra_earned,
+        Payroll.conveyance_earned,
+        Payroll.washing_allowance,
+        Payroll.casting_allowance,
+        Payroll.ttb_allowance,
+        Payroll.plating_allowance,
+        Payroll.other_allowances,
+        Payroll.gross_salary,
+        Payroll.pf_amount,
+        Payroll.esi_amount,
+        Payroll.pt_amount,
+        Payroll.welfare_fund,
+        Payroll.loan_deduction,
+        Payroll.total_deductions,
+        Payroll.net_salary,
+        Payroll.status,
+        Payroll.generated_at,
+    ).join(Employee, Employee.id == Payroll.employee_id)
+    
+    if month:
+        stmt = stmt.where(Payroll.month == month)
+    if year:
+        stmt = stmt.where(Payroll.year == year)
+    if employee_id:
+        stmt = stmt.where(Payroll.employee_id == employee_id)
+    
+    stmt = stmt.order_by(Payroll.year, Payroll.month, Employee.emp_code)
+    return _columnar_response(stmt, format, "payroll")
+
+
 @router.get("/employees/{emp_id}/salary")
 def get_employee_salary_struct(emp_id: str, db: Session = Depends(get_db)):
     sal = db.query(SalaryStructure).filter(SalaryStructure.employee_id == emp_id).first()
@@ -2145,10 +2589,11 @@ def download_payslip_pdf(
             # Calculate Attendance (Reusing Logic)
             import calendar
             total_days_in_month = calendar.monthrange(year, month)[1]
+            month_start, month_end = month_range(year, month)
             month_logs = db.query(AttendanceLog).filter(
                 AttendanceLog.employee_id == emp_id,
-                extract('month', AttendanceLog.date) == month,
-                extract('year', AttendanceLog.date) == year
+                AttendanceLog.date >= month_start,
+                AttendanceLog.date < month_end
             ).all()
             
             logs_by_date = {log.date: log for log in month_logs}
@@ -2230,6 +2675,9 @@ def download_payslip_pdf(
             }
 
     # --- Generate PDF ---
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
     filename = f"Payslip_{emp.first_name}_{today.strftime('%b_%Y')}.pdf"
     filepath = f"temp_{filename}"
     
@@ -2328,58 +2776,27 @@ def download_payslip_pdf(
 
 @router.get("/departments")
 def get_departments(
+    request: Request,
     status: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Get all departments with optional status filter"""
     try:
-        query = db.query(Department)
-        
-        if status:
-            query = query.filter(Department.status == status)
-        
-        departments = query.all()
-        
-        # Get employee count for each department
-        result = []
-        for dept in departments:
-            employee_count = db.query(Employee).filter(
-                Employee.department == dept.name,
-                Employee.status == 'active'
-            ).count()
-            
-            result.append({
-                "id": dept.id,
-                "name": dept.name,
-                "description": dept.description,
-                "department_head": dept.department_head,
-                "status": dept.status,
-                "employee_count": employee_count,
-                "created_at": dept.created_at.isoformat() if dept.created_at else None,
-                "updated_at": dept.updated_at.isoformat() if dept.updated_at else None
-            })
-        
-        return result
+        # One LEFT JOIN ... GROUP BY for all employee counts, cached until employees/departments change
+        etag, body = department_directory.list_cached(db, status)
+        return _etag_response(request, etag, body)
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        logger.error(f"Error fetching departments: {e}\n{error_trace}")
-        print(f"Error fetching departments: {e}\n{error_trace}") # Print to stdout for visibility
+        logger.exception(f"Error fetching departments: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/departments/{dept_id}")
 def get_department_by_id(dept_id: str, db: Session = Depends(get_db)):
     """Get single department details"""
     try:
-        dept = db.query(Department).filter(Department.id == dept_id).first()
-        if not dept:
+        found = department_directory.get(db, dept_id)
+        if not found:
             raise HTTPException(status_code=404, detail="Department not found")
-        
-        # Get employee count
-        employee_count = db.query(Employee).filter(
-            Employee.department == dept.name,
-            Employee.status == 'active'
-        ).count()
+        dept, employee_count = found
         
         return {
             "id": dept.id,
@@ -2391,6 +2808,8 @@ def get_department_by_id(dept_id: str, db: Session = Depends(get_db)):
             "company_id": dept.company_id,
             "created_at": dept.created_at.isoformat() if dept.created_at else None
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching department {dept_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2431,10 +2850,7 @@ def create_department(
         }
     except Exception as e:
         db.rollback()
-        import traceback
-        error_trace = traceback.format_exc()
-        logger.error(f"Error creating department: {e}\n{error_trace}")
-        print(f"Error creating department: {e}\n{error_trace}")
+        logger.exception(f"Error creating department: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/departments/{dept_id}")
@@ -2478,15 +2894,12 @@ def update_department(
 @router.delete("/departments/{dept_id}")
 def delete_department(dept_id: str, db: Session = Depends(get_db)):
     """Delete department (soft delete by setting status to inactive)"""
-    dept = db.query(Department).filter(Department.id == dept_id).first()
-    if not dept:
+    found = department_directory.get(db, dept_id)
+    if not found:
         raise HTTPException(status_code=404, detail="Department not found")
     
     # Check if department has employees
-    employee_count = db.query(Employee).filter(
-        Employee.department == dept.name,
-        Employee.status == 'active'
-    ).count()
+    dept, employee_count = found
     
     if employee_count > 0:
         raise HTTPException(
@@ -2522,7 +2935,7 @@ def get_department_employees(dept_id: str, db: Session = Depends(get_db)):
     } for emp in employees]
 
 @router.delete("/admin/cleanup/employees")
-async def delete_all_employees(
+def delete_all_employees(
     current_user: AdminUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -2553,9 +2966,18 @@ async def delete_all_employees(
         # Delete all employees
         db.query(Employee).delete()
         
+        # Nothing is left to summarize
+        db.query(DailyAttendanceSummary).delete()
+        
+        # Bulk deletes skip the ORM events that normally drop cached dashboard numbers
+        invalidate_on_commit(db, DASHBOARD_CACHE, DEPARTMENT_CACHE)
+        
         # Commit the changes
         db.commit()
         
+        # The bulk log delete skipped the presence map's listeners; rebuild today's (now empty) map
+        presence.warm(db)
+        
         return {
             "success": True,
             "message": "All employee data permanently deleted",
@@ -2598,19 +3020,8 @@ def recalculate_hours(
         
         for log in logs:
             if log.check_in and log.check_out:
-                # Normalize check_in
-                c_in = log.check_in
-                if c_in.tzinfo is None:
-                    c_in = c_in.replace(tzinfo=IST)
-                else:
-                    c_in = c_in.astimezone(IST)
-                
-                # Normalize check_out
-                c_out = log.check_out
-                if c_out.tzinfo is None:
-                    c_out = c_out.replace(tzinfo=IST)
-                else:
-                    c_out = c_out.astimezone(IST)
+                c_in = to_ist(log.check_in)
+                c_out = to_ist(log.check_out)
                 
                 # Calculate duration
                 duration = c_out - c_in
@@ -2651,6 +3062,7 @@ def recalculate_hours(
                 if abs(old_total - log.total_hours_worked) > 0.01:
                     updated_count += 1
         
+        attendance_rollup.refresh(db, {log.date for log in logs})
         db.commit()
         return {
             "status": "success", 
@@ -2659,8 +3071,7 @@ def recalculate_hours(
         
     except Exception as e:
         db.rollback()
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception(f"Recalculating attendance hours failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -2905,40 +3316,44 @@ def reset_employee_payroll_rules(emp_id: str, db: Session = Depends(get_db), cur
 @router.get("/loans")
 def get_all_loans(
     status: str = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user)
 ):
-    """Get all employee loans/advances with optional status filter"""
+    """Get all employee loans/advances with optional status filter (optionally paged with limit/offset)"""
     try:
-        query = db.query(EmployeeLoan)
+        from sqlalchemy import select
+        
+        # One joined projection instead of an employee lookup per loan
+        stmt = select(
+            EmployeeLoan.id, EmployeeLoan.employee_id, EmployeeLoan.loan_type, EmployeeLoan.loan_amount,
+            EmployeeLoan.emi_amount, EmployeeLoan.total_emis, EmployeeLoan.remaining_emis,
+            EmployeeLoan.start_date, EmployeeLoan.end_date, EmployeeLoan.reason, EmployeeLoan.status,
+            EmployeeLoan.created_at, Employee.first_name, Employee.last_name, Employee.emp_code
+        ).join(Employee, Employee.id == EmployeeLoan.employee_id)
         if status:
-            query = query.filter(EmployeeLoan.status == status)
+            stmt = stmt.where(EmployeeLoan.status == status)
+        stmt = stmt.order_by(EmployeeLoan.created_at.desc(), EmployeeLoan.id.desc())
+        if limit is not None:
+            stmt = stmt.limit(max(1, min(limit, 1000))).offset(max(0, offset))
         
-        loans = query.order_by(EmployeeLoan.created_at.desc()).all()
-        
-        # Get employee details for each loan
-        result = []
-        for loan in loans:
-            employee = db.query(Employee).filter(Employee.id == loan.employee_id).first()
-            if employee:
-                result.append({
-                    "id": loan.id,
-                    "employee_id": loan.employee_id,
-                    "employee_name": f"{employee.first_name} {employee.last_name or ''}",
-                    "emp_code": employee.emp_code,
-                    "loan_type": loan.loan_type,
-                    "loan_amount": float(loan.loan_amount),
-                    "emi_amount": float(loan.emi_amount),
-                    "total_emis": loan.total_emis,
-                    "remaining_emis": loan.remaining_emis,
-                    "start_date": loan.start_date.isoformat() if loan.start_date else None,
-                    "end_date": loan.end_date.isoformat() if loan.end_date else None,
-                    "reason": loan.reason,
-                    "status": loan.status,
-                    "created_at": loan.created_at.isoformat() if loan.created_at else None
-                })
-        
-        return result
+        return [{
+            "id": loan.id,
+            "employee_id": loan.employee_id,
+            "employee_name": f"{loan.first_name} {loan.last_name or ''}",
+            "emp_code": loan.emp_code,
+            "loan_type": loan.loan_type,
+            "loan_amount": float(loan.loan_amount),
+            "emi_amount": float(loan.emi_amount),
+            "total_emis": loan.total_emis,
+            "remaining_emis": loan.remaining_emis,
+            "start_date": loan.start_date.isoformat() if loan.start_date else None,
+            "end_date": loan.end_date.isoformat() if loan.end_date else None,
+            "reason": loan.reason,
+            "status": loan.status,
+            "created_at": loan.created_at.isoformat() if loan.created_at else None
+        } for loan in db.execute(stmt)]
     except Exception as e:
         logger.error(f"Error fetching loans: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -3142,43 +3557,67 @@ def delete_loan(
 
 @router.get("/loans/outstanding-report")
 def get_outstanding_report(
+    limit: Optional[int] = None,
+    offset: int = 0,
     db: Session = Depends(get_db),
     current_user: AdminUser = Depends(get_current_user)
 ):
-    """Get outstanding loan report - shows all active loans with outstanding amounts"""
+    """
+    Get outstanding loan report - shows all active loans with outstanding amounts.
+    Sorted by employee name; pass limit/offset to page through large reports
+    (totals always cover every active loan).
+    """
     try:
-        loans = db.query(EmployeeLoan).filter(
+        from sqlalchemy import select
+        
+        employee_name = (Employee.first_name + " " + func.coalesce(Employee.last_name, "")).label("employee_name")
+        outstanding = (EmployeeLoan.emi_amount * EmployeeLoan.remaining_emis).label("outstanding_amount")
+        
+        # Rows, outstanding amounts and report totals from one query; the window
+        # aggregates are computed over all active loans before LIMIT applies
+        stmt = select(
+            EmployeeLoan.id, EmployeeLoan.employee_id, EmployeeLoan.loan_type, EmployeeLoan.loan_amount,
+            EmployeeLoan.emi_amount, EmployeeLoan.total_emis, EmployeeLoan.remaining_emis,
+            EmployeeLoan.start_date, EmployeeLoan.end_date,
+            employee_name, Employee.emp_code, Employee.department, outstanding,
+            func.count().over().label("total_rows"),
+            func.sum(outstanding).over().label("total_outstanding")
+        ).join(Employee, Employee.id == EmployeeLoan.employee_id).where(
             EmployeeLoan.status == "active"
-        ).all()
-        
-        result = []
-        for loan in loans:
-            employee = db.query(Employee).filter(Employee.id == loan.employee_id).first()
-            if employee:
-                outstanding_amount = float(loan.emi_amount) * loan.remaining_emis
-                
-                result.append({
-                    "loan_id": loan.id,
-                    "employee_id": loan.employee_id,
-                    "employee_name": f"{employee.first_name} {employee.last_name or ''}",
-                    "emp_code": employee.emp_code,
-                    "department": employee.department,
-                    "loan_type": loan.loan_type,
-                    "original_amount": float(loan.loan_amount),
-                    "emi_amount": float(loan.emi_amount),
-                    "total_emis": loan.total_emis,
-                    "remaining_emis": loan.remaining_emis,
-                    "outstanding_amount": round(outstanding_amount, 2),
-                    "start_date": loan.start_date.isoformat() if loan.start_date else None,
-                    "end_date": loan.end_date.isoformat() if loan.end_date else None
-                })
-        
-        # Sort by employee name
-        result.sort(key=lambda x: x["employee_name"])
-        
-        # Calculate totals
-        total_outstanding = sum(r["outstanding_amount"] for r in result)
-        total_employees = len(result)
+        ).order_by(employee_name, EmployeeLoan.id)
+        if limit is not None:
+            stmt = stmt.limit(max(1, min(limit, 5000))).offset(max(0, offset))
+        
+        rows = db.execute(stmt).all()
+        if rows:
+            total_employees = rows[0].total_rows
+            total_outstanding = float(rows[0].total_outstanding or 0)
+        elif limit is not None and offset > 0:
+            # Paged past the end: totals still describe the whole report
+            total_employees, total_outstanding = db.execute(
+                select(func.count(), func.coalesce(func.sum(EmployeeLoan.emi_amount * EmployeeLoan.remaining_emis), 0))
+                .select_from(EmployeeLoan).join(Employee, Employee.id == EmployeeLoan.employee_id)
+                .where(EmployeeLoan.status == "active")
+            ).one()
+            total_outstanding = float(total_outstanding)
+        else:
+            total_employees, total_outstanding = 0, 0.0
+        
+        result = [{
+            "loan_id": loan.id,
+            "employee_id": loan.employee_id,
+            "employee_name": loan.employee_name,
+            "emp_code": loan.emp_code,
+            "department": loan.department,
+            "loan_type": loan.loan_type,
+            "original_amount": float(loan.loan_amount),
+            "emi_amount": float(loan.emi_amount),
+            "total_emis": loan.total_emis,
+            "remaining_emis": loan.remaining_emis,
+            "outstanding_amount": round(float(loan.outstanding_amount), 2),
+            "start_date": loan.start_date.isoformat() if loan.start_date else None,
+            "end_date": loan.end_date.isoformat() if loan.end_date else None
+        } for loan in rows]
         
         return {
             "report_date": datetime.datetime.now().isoformat(),
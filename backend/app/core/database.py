@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
+import time
+import threading
 
 from dotenv import load_dotenv
 
@@ -14,16 +17,207 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+# Connection budget per worker process, shared by the sync and async engines: a worker
+# opens at most DB_POOL_SIZE + DB_MAX_OVERFLOW connections, so the server as a whole at
+# most API_WORKERS x that (4 x 20 = 80 by default, under Postgres's max_connections=100)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Share of the budget given to the async engine (kiosk check-ins); the sync engine gets the rest
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "3"))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "3"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))      # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))      # seconds before a connection is replaced
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+
+def _async_url(url: str) -> str:
+    """Same database through an asyncio driver: asyncpg for Postgres, aiosqlite for SQLite"""
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://") or url.startswith("sqlite+pysqlite://"):
+        return "sqlite+aiosqlite://" + url.split("://", 1)[1]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+# aiosqlite opens a connection per checkout (NullPool), so only a pooled async engine takes a share
+if "sqlite" in ASYNC_DATABASE_URL:
+    DB_ASYNC_POOL_SIZE = DB_ASYNC_MAX_OVERFLOW = 0
+SYNC_POOL_SIZE = max(1, DB_POOL_SIZE - DB_ASYNC_POOL_SIZE)
+SYNC_MAX_OVERFLOW = max(0, DB_MAX_OVERFLOW - DB_ASYNC_MAX_OVERFLOW)
+
+
+class PoolMetrics:
+    """Checkout wait and connection hold times, accumulated since startup"""
+
+    # Upper bounds (ms) of the checkout-wait histogram buckets
+    WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.wait_buckets = [0] * (len(self.WAIT_BUCKETS_MS) + 1)
+        self.held_ms_total = 0.0
+        self.held_ms_max = 0.0
+        self.checkins = 0
+
+    def record_wait(self, wait_ms, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            for i, bound in enumerate(self.WAIT_BUCKETS_MS):
+                if wait_ms <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+            else:
+                self.wait_buckets[-1] += 1
+
+    def record_held(self, held_ms):
+        with self._lock:
+            self.checkins += 1
+            self.held_ms_total += held_ms
+            self.held_ms_max = max(self.held_ms_max, held_ms)
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    _timing = threading.local()
+
+    def _do_get(self):
+        # QueuePool._do_get retries by calling itself; only time the outermost call
+        if getattr(self._timing, "active", False):
+            return super()._do_get()
+        self._timing.active = True
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            pool_metrics.record_wait((time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        finally:
+            self._timing.active = False
+        pool_metrics.record_wait((time.perf_counter() - start) * 1000)
+        return conn
+
+
+if "sqlite" in DATABASE_URL and ":memory:" in DATABASE_URL:
+    # In-memory SQLite lives in a single connection; keep SQLAlchemy's default pool for it
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
+        poolclass=TimedQueuePool,
+        pool_size=SYNC_POOL_SIZE,
+        max_overflow=SYNC_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+
+@event.listens_for(engine, "checkout")
+def _connection_checked_out(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checked_out_at"] = time.perf_counter()
+
+
+@event.listens_for(engine, "checkin")
+def _connection_checked_in(dbapi_connection, connection_record):
+    started = connection_record.info.pop("checked_out_at", None)
+    if started is not None:
+        pool_metrics.record_held((time.perf_counter() - started) * 1000)
+
+
+def pool_stats():
+    """Live pool occupancy plus accumulated checkout/hold timings for this process"""
+    pool = engine.pool
+    m = pool_metrics
+    stats = {
+        "pool_class": type(pool).__name__,
+        "checkouts": m.checkouts,
+        "checkout_timeouts": m.timeouts,
+        "checkout_wait_ms_avg": round(m.wait_ms_total / m.checkouts, 3) if m.checkouts else 0.0,
+        "checkout_wait_ms_max": round(m.wait_ms_max, 3),
+        "checkout_wait_ms_buckets": {
+            **{f"le_{bound}": count for bound, count in zip(m.WAIT_BUCKETS_MS, m.wait_buckets)},
+            "inf": m.wait_buckets[-1],
+        },
+        "connection_held_ms_avg": round(m.held_ms_total / m.checkins, 3) if m.checkins else 0.0,
+        "connection_held_ms_max": round(m.held_ms_max, 3),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "timeout_seconds": pool.timeout(),
+        })
+        # Most connections this worker can hold across both engines
+        stats.update({
+            "async_pool_size": DB_ASYNC_POOL_SIZE,
+            "async_max_overflow": DB_ASYNC_MAX_OVERFLOW,
+            "max_connections": pool.size() + pool._max_overflow + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW,
+        })
+    return stats
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    """Async engine, created on first use so the sync-only scripts never need the async drivers"""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        if "sqlite" in ASYNC_DATABASE_URL:
+            _async_engine = create_async_engine(ASYNC_DATABASE_URL)
+        else:
+            _async_engine = create_async_engine(
+                ASYNC_DATABASE_URL,
+                pool_size=DB_ASYNC_POOL_SIZE,
+                max_overflow=DB_ASYNC_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING,
+            )
+        # Objects stay readable after commit; an expired attribute would need IO outside an await
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+async def get_async_db():
+    """AsyncSession for handlers that await the database instead of blocking the event loop"""
+    get_async_engine()
+    async with _async_sessionmaker() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
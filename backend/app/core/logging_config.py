@@ -0,0 +1,166 @@
+"""
+Process-wide logging: structured JSON records written off the request path.
+
+Loggers only enqueue records (QueueHandler); a QueueListener thread formats
+them and writes to stdout (and optionally a file). Configured from env:
+
+    LOG_LEVEL=INFO                 root level
+    LOG_LEVELS=punch_ingest=DEBUG,slow_query=WARNING   per-logger levels
+    LOG_FORMAT=json                json | text
+    LOG_FILE=                      unset: stdout only (containers; the platform collects it)
+    LOG_MAX_BYTES=10485760         rotate a per-process file at this size
+    LOG_BACKUP_COUNT=5             rotated per-process files kept
+    LOG_SCAN_SAMPLE_RATE=0.1       share of routine per-scan records kept
+                                   (warnings and errors are always kept)
+
+Several workers share a LOG_FILE, and Python cannot rotate one file from
+several processes. A plain path (/var/log/attendance/backend.log) is opened
+with WatchedFileHandler: workers append, and an external logrotate renames
+the file. A path containing {pid} (/var/log/attendance/backend.{pid}.log)
+gives each process its own file, rotated in-process by size.
+
+Per-scan events go to the "attendance.scan" logger (SCAN_LOGGER), the only
+one sampled. Audit events that must always be kept (employee registration)
+go to "attendance.audit" (AUDIT_LOGGER).
+"""
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import random
+import logging
+import datetime
+import logging.handlers
+
+SCAN_LOGGER = "attendance.scan"
+AUDIT_LOGGER = "attendance.audit"
+
+# Attributes every LogRecord has; anything else came from `extra=` and is emitted as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, extra fields, exc"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        # Records arrive through JsonQueueHandler with the traceback already rendered into exc_text
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class JsonQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps the traceback out of the message.
+
+    The stock prepare() formats the whole record into msg, traceback
+    included, and drops exc_info, so the writer thread could never emit it
+    as its own field. Here only the message arguments are merged; the
+    traceback travels separately in exc_text (a string, since the
+    exception and its frames should not outlive the call).
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SampleFilter(logging.Filter):
+    """Keep a `rate` share of records below WARNING from one logger; pass everything else"""
+
+    def __init__(self, logger_name: str, rate: float):
+        super().__init__()
+        self.logger_name = logger_name
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        if record.name != self.logger_name and not record.name.startswith(self.logger_name + "."):
+            return True
+        return random.random() < self.rate
+
+
+def _parse_levels(spec: str):
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """Install the queue-based handlers on the root logger (once per process)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    if os.getenv("LOG_FORMAT", "json").lower() == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+
+    handlers = []
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+    handlers.append(stream)
+
+    log_file = os.getenv("LOG_FILE", "")
+    if log_file:
+        if "{pid}" in log_file:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file.replace("{pid}", str(os.getpid())),
+                maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+                backupCount=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+                encoding="utf-8",
+            )
+        else:
+            file_handler = logging.handlers.WatchedFileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = JsonQueueHandler(log_queue)
+    # Sample before enqueueing so dropped records cost nothing downstream
+    queue_handler.addFilter(SampleFilter(SCAN_LOGGER, float(os.getenv("LOG_SCAN_SAMPLE_RATE", "0.1"))))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    for name, level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
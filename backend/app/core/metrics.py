@@ -0,0 +1,271 @@
+"""
+Prometheus metrics for this worker process.
+
+A small in-process registry (counters, gauges, histograms with labels)
+rendered in the Prometheus text exposition format on GET /metrics. With
+METRICS_ENABLED off (the default) the middleware is not installed and
+every observe/inc is a single flag check.
+
+Each uvicorn worker keeps its own numbers; scrape every worker (or run one
+worker per target) and aggregate in Prometheus.
+"""
+import os
+import sys
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Prometheus client defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+# Starlette appends "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block in seconds"""
+        if not METRICS_ENABLED:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def on_collect(self, fn):
+        """fn() runs before each scrape, to refresh gauges that are read rather than counted"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- HTTP ---
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "Requests handled", ("method", "route", "status")))
+HTTP_ERRORS = registry.register(Counter(
+    "http_request_errors_total", "Requests that raised or returned 5xx", ("method", "route")))
+HTTP_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte", ("method", "route")))
+HTTP_RESPONSE_SIZE = registry.register(Histogram(
+    "http_response_size_bytes", "Response body size", ("method", "route"), buckets=SIZE_BUCKETS))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being served"))
+
+# --- Database ---
+DB_QUERIES = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements executed per request", ("route",), buckets=COUNT_BUCKETS))
+DB_TIME = registry.register(Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per request", ("route",)))
+DB_POOL = registry.register(Gauge(
+    "db_pool_connections", "Pooled connections by state", ("state",)))
+DB_POOL_WAIT = registry.register(Gauge(
+    "db_pool_checkout_wait_seconds_max", "Longest wait for a pooled connection since startup"))
+DB_POOL_TIMEOUTS = registry.register(Gauge(
+    "db_pool_checkout_timeouts", "Checkouts that gave up waiting for a connection since startup"))
+
+# --- Face pipeline ---
+FACE_STAGE = registry.register(Histogram(
+    "face_stage_duration_seconds", "Face pipeline stage time (decode, liveness, embed, search)", ("stage",)))
+
+# --- Payroll ---
+PAYROLL_JOB = registry.register(Histogram(
+    "payroll_job_duration_seconds", "Payroll generation run time", ("scope",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)))
+PAYROLL_EMPLOYEES = registry.register(Counter(
+    "payroll_employees_generated_total", "Payroll records generated", ("scope",)))
+
+
+@registry.on_collect
+def _collect_pool():
+    # Only where the app has a database (the inference server does not)
+    database = sys.modules.get(__package__ + ".database")
+    if database is None:
+        return
+    stats = database.pool_stats()
+    for state in ("checked_out", "checked_in", "overflow"):
+        if state in stats:
+            DB_POOL.set(stats[state], state=state)
+    DB_POOL_WAIT.set(stats["checkout_wait_ms_max"] / 1000)
+    DB_POOL_TIMEOUTS.set(stats["checkout_timeouts"])
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (streaming and SSE responses pass through untouched)
+    recording latency, status, response size, errors, in-flight requests and,
+    from QueryStatsMiddleware inside it, SQL statements and time per route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+        size = [0]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                size[0] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status[0] = 500
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(method=method, route=route, status=status[0])
+            HTTP_DURATION.observe(elapsed, method=method, route=route)
+            HTTP_RESPONSE_SIZE.observe(size[0], method=method, route=route)
+            stats = scope.get("query_stats")
+            if stats is not None:
+                DB_QUERIES.observe(stats.count, route=route)
+                DB_TIME.observe(stats.time_ms / 1000, route=route)
+            if status[0] >= 500:
+                HTTP_ERRORS.inc(method=method, route=route)
+
+
+def metrics_response():
+    """GET /metrics: the registry as Prometheus text, or 404 when metrics are off"""
+    from fastapi.responses import Response, PlainTextResponse
+    if not METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled (METRICS_ENABLED=false)\n", status_code=404)
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,166 @@
+"""
+Monthly range partitioning of attendance_logs on Postgres.
+
+The table is converted once by migrate_partition_attendance_logs.py; after
+that, upcoming partitions are created on startup and old ones can be
+detached into an archive schema (see manage_partitions.py). On SQLite, and
+on Postgres before the migration has run, every helper here is a no-op.
+"""
+import datetime
+import json
+import re
+import logging
+from sqlalchemy import text
+
+logger = logging.getLogger("partitioning")
+
+PARENT_TABLE = "attendance_logs"
+DEFAULT_PARTITION = "attendance_logs_default"
+PARTITION_RE = re.compile(r"^attendance_logs_y(\d{4})m(\d{2})$")
+
+# Partitions kept ready ahead of the current month
+MONTHS_AHEAD = 3
+
+
+def month_range(year: int, month: int):
+    """Half-open [first day, first day of next month) bounds for a month filter"""
+    start = datetime.date(year, month, 1)
+    end = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    return start, end
+
+
+def add_months(day: datetime.date, months: int):
+    index = day.year * 12 + (day.month - 1) + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(year: int, month: int):
+    return f"{PARENT_TABLE}_y{year:04d}m{month:02d}"
+
+
+def is_partitioned(conn):
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace"
+    ), {"name": PARENT_TABLE}).scalar())
+
+
+def list_partitions(conn):
+    """[(name, first day of month)] for the monthly partitions currently attached"""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :name AND p.relnamespace = current_schema()::regnamespace"
+    ), {"name": PARENT_TABLE}).scalars().all()
+    partitions = []
+    for name in rows:
+        m = PARTITION_RE.match(name)
+        if m:
+            partitions.append((name, datetime.date(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_partition(conn, year: int, month: int):
+    start, end = month_range(year, month)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(year, month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+
+
+def ensure_upcoming_partitions(engine, months_ahead: int = MONTHS_AHEAD, today: datetime.date = None):
+    """Create partitions for the current month and the next months_ahead. Returns names created."""
+    if engine.dialect.name != "postgresql":
+        return []
+    today = today or datetime.date.today()
+    created = []
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        existing = {name for name, _ in list_partitions(conn)}
+        for offset in range(months_ahead + 1):
+            month = add_months(today, offset)
+            name = partition_name(month.year, month.month)
+            if name in existing:
+                continue
+            try:
+                # Fails if the default partition already holds rows for this month
+                with conn.begin_nested():
+                    create_partition(conn, month.year, month.month)
+                created.append(name)
+            except Exception as e:
+                logger.error(f"Could not create partition {name}: {e}")
+    for name in created:
+        logger.info(f"Created partition {name}")
+    return created
+
+
+def detach_partitions_before(engine, cutoff: datetime.date, archive_schema: str = "archive", dry_run: bool = False):
+    """
+    Detach monthly partitions that end on or before cutoff and move them to
+    archive_schema. The data stays queryable there but drops out of every
+    attendance query and index. Returns the partition names affected.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    if not re.match(r"^[a-z_][a-z0-9_]*$", archive_schema):
+        raise ValueError("archive schema must be a plain lower-case identifier")
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        old = [name for name, first_day in list_partitions(conn) if add_months(first_day, 1) <= cutoff]
+        if dry_run or not old:
+            return old
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+        for name in old:
+            conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+            logger.info(f"Detached partition {name} into {archive_schema}")
+    return old
+
+
+def _scanned_relations(plan):
+    found = []
+    if "Relation Name" in plan:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(_scanned_relations(child))
+    return found
+
+
+def verify_pruning(engine, year: int, month: int):
+    """
+    EXPLAIN the month-scoped payroll and log queries and report which
+    partitions each one would scan. A query prunes correctly when it touches
+    only that month's partition.
+    """
+    if engine.dialect.name != "postgresql":
+        return {"partitioned": False, "queries": {}}
+    start, end = month_range(year, month)
+    expected = partition_name(year, month)
+    queries = {
+        "payroll_month": (
+            f"SELECT * FROM {PARENT_TABLE} WHERE employee_id = :emp AND date >= :start AND date < :end",
+            {"emp": "", "start": start, "end": end},
+        ),
+        "logs_range": (
+            f"SELECT id FROM {PARENT_TABLE} WHERE date >= :start AND date <= :last "
+            "ORDER BY date DESC, check_in DESC NULLS LAST, id DESC LIMIT 50",
+            {"start": start, "last": end - datetime.timedelta(days=1)},
+        ),
+    }
+    report = {"partitioned": False, "expected": expected, "queries": {}}
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return report
+        report["partitioned"] = True
+        for label, (sql, params) in queries.items():
+            plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql), params).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scanned = sorted(set(_scanned_relations(plan[0]["Plan"])))
+            report["queries"][label] = {"scanned": scanned, "pruned": scanned == [expected]}
+    return report
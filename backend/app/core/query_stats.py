@@ -0,0 +1,133 @@
+"""
+SQL statements and database time per request, plus a slow-query log.
+
+Engine-level cursor hooks add every statement's count and duration to the
+QueryStats of the current request (or of an explicit track() block).
+QueryStatsMiddleware opens one per HTTP request and, with
+DB_DEBUG_HEADERS=true, returns the totals as X-DB-Queries / X-DB-Time-ms.
+Statements slower than SLOW_QUERY_MS are logged with the route that ran them.
+
+Tests and scripts use assert_max_queries() to pin query budgets.
+"""
+import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("slow_query")
+
+# Log statements slower than this (milliseconds); 0 disables the slow-query log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+# Expose per-request query count and time as response headers
+DB_DEBUG_HEADERS = os.getenv("DB_DEBUG_HEADERS", "false").lower() in ("1", "true", "yes")
+
+
+class QueryStats:
+    __slots__ = ("count", "time_ms", "statements", "scope")
+
+    def __init__(self, scope=None, keep_statements=False):
+        self.count = 0
+        self.time_ms = 0.0
+        self.statements = [] if keep_statements else None
+        self.scope = scope
+
+    @property
+    def route(self):
+        if self.scope is None:
+            return "-"
+        route = self.scope.get("route")
+        return f'{self.scope.get("method")} {getattr(route, "path", None) or self.scope.get("path")}'
+
+
+_current = contextvars.ContextVar("query_stats", default=None)
+
+
+def current():
+    """QueryStats being collected for this request/block, or None"""
+    return _current.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.time_ms += elapsed_ms
+        if stats.statements is not None:
+            stats.statements.append(statement)
+    if SLOW_QUERY_MS and elapsed_ms >= SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        logger.warning(f"Slow query {elapsed_ms:.0f} ms on {route}: {' '.join(statement.split())[:1000]}")
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_failed(context):
+    # A failed statement never reaches after_cursor_execute
+    conn = context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+@contextmanager
+def track(keep_statements=False, scope=None):
+    """Collect statements run inside the block (in this thread/task) into a QueryStats"""
+    stats = QueryStats(scope, keep_statements)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = ""):
+    """Fail with the offending statements if the block runs more than `limit` SQL statements"""
+    with track(keep_statements=True) as stats:
+        yield stats
+    if stats.count > limit:
+        listing = "\n".join(f"  {i + 1}. {' '.join(s.split())[:200]}" for i, s in enumerate(stats.statements))
+        raise AssertionError(f"{label or 'block'} ran {stats.count} queries (budget {limit}):\n{listing}")
+
+
+class QueryStatsMiddleware:
+    """
+    Pure ASGI middleware: one QueryStats per HTTP request, left in
+    scope["query_stats"] for outer middleware (metrics) to read.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        scope["query_stats"] = stats
+
+        async def send_wrapper(message):
+            if DB_DEBUG_HEADERS and message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.time_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,90 @@
+"""
+In-memory token-bucket rate limiting.
+
+Each key (an IP, a username, ...) gets a bucket of `capacity` tokens that
+refills at `rate` tokens per second; a request spends one token. A rate
+or capacity of zero or less turns the limiter off. Buckets
+are per worker process, which is enough to blunt login storms and password
+guessing without a shared store.
+
+client_ip() gives the key for per-client limits. Behind the reverse proxy
+(Traefik/Coolify) every connection comes from the proxy, so X-Forwarded-For
+is used, but only when the connection comes from TRUSTED_PROXIES.
+"""
+import os
+import time
+import ipaddress
+import threading
+
+# Buckets kept per limiter before idle (refilled) ones are pruned
+MAX_KEYS = 10000
+
+# Peers whose X-Forwarded-For is believed: loopback and the private ranges Docker
+# networks use, where the proxy lives. Narrow this (e.g. to the proxy's subnet) if
+# clients can reach the app directly from a private network.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(net.strip(), strict=False)
+    for net in os.getenv(
+        "TRUSTED_PROXIES", "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+    ).split(",")
+    if net.strip()
+]
+
+
+def _trusted(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in net for net in TRUSTED_PROXIES)
+
+
+def client_ip(request) -> str:
+    """
+    Address of the client behind any trusted proxies: X-Forwarded-For read
+    right to left, skipping trusted hops. Headers from untrusted peers are ignored.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not _trusted(peer):
+        return peer
+    hops = [h.strip() for h in ",".join(request.headers.getlist("x-forwarded-for")).split(",") if h.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+class TokenBucketLimiter:
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        # Non-positive settings mean "no limit" (and would otherwise divide by zero below)
+        self.enabled = self.capacity > 0 and self.rate > 0
+        self._buckets = {}    # key -> (tokens, last refill monotonic time)
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> float:
+        """Spend a token for key. Returns 0 if allowed, else seconds until a token is available."""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                if len(self._buckets) > MAX_KEYS:
+                    self._prune(now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def reset(self, key: str):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _prune(self, now):
+        # A bucket that would be full again carries no state worth keeping
+        full_after = self.capacity / self.rate
+        for key in [k for k, (_, last) in self._buckets.items() if now - last >= full_after]:
+            del self._buckets[key]
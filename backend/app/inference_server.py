@@ -0,0 +1,117 @@
+"""
+Local face inference service (APP_ROLE=inference).
+
+Hosts the face recognition model for API workers running with APP_ROLE=api,
+so only these processes pay for TensorFlow and the model weights:
+
+    uvicorn app.inference_server:app --uds /tmp/attendance-face.sock --workers 2
+
+Images arrive base64-encoded in JSON; answers are exactly what
+FaceRecognitionService returns. No database access: the 1:N gallery is
+uploaded once per version (POST /gallery) and kept in memory.
+"""
+import os
+import base64
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+from fastapi import FastAPI, Body, HTTPException
+
+from .core.logging_config import setup_logging
+setup_logging()
+
+from .services.face_recognition import face_service
+from .core.metrics import METRICS_ENABLED, MetricsMiddleware, metrics_response
+
+app = FastAPI(title="Attendance Face Inference", version="1.0.0")
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+
+# Embedding galleries uploaded by API workers, by version; a scan names the version it
+# needs. Two are kept so workers that have not seen the newest registration still hit.
+GALLERIES_KEPT = 2
+_galleries = OrderedDict()
+_galleries_lock = threading.Lock()
+
+
+@app.on_event("startup")
+def load_model():
+    # Workers here exist to serve scans: load the model before the first one arrives
+    face_service.preload()
+
+
+class _Image:
+    """The request image as a temp file for the duration of a call"""
+
+    def __init__(self, image_b64: str):
+        try:
+            self.data = base64.b64decode(image_b64, validate=True)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid image encoding")
+
+    def __enter__(self):
+        fd, self.path = tempfile.mkstemp(suffix=".jpg", prefix="face_")
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.data)
+        return self.path
+
+    def __exit__(self, *exc):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
+@app.get("/status")
+def status():
+    return face_service.get_status()
+
+
+@app.post("/liveness")
+def liveness(image: str = Body(..., embed=True)):
+    with _Image(image) as path:
+        return {"live": face_service.verify_liveness(path)}
+
+
+@app.post("/register")
+def register(image: str = Body(..., embed=True)):
+    with _Image(image) as path:
+        return {"embedding": face_service.register_face(path)}
+
+
+@app.post("/match")
+def match(image: str = Body(...), embedding: list = Body(...)):
+    with _Image(image) as path:
+        return face_service.match_face(path, embedding)
+
+
+@app.post("/gallery")
+def gallery(version: str = Body(...), candidates: list = Body(...)):
+    # [[id, embedding], ...] so ids keep their JSON type (see FaceServiceClient.identify_face)
+    with _galleries_lock:
+        _galleries[version] = {candidate_id: embedding for candidate_id, embedding in candidates}
+        _galleries.move_to_end(version)
+        while len(_galleries) > GALLERIES_KEPT:
+            _galleries.popitem(last=False)
+    return {"version": version, "faces": len(candidates)}
+
+
+@app.post("/identify")
+def identify(image: str = Body(...), gallery: Optional[str] = Body(None), candidates: Optional[list] = Body(None)):
+    """1:N against a stored gallery version, or against candidates sent inline"""
+    if gallery is not None:
+        with _galleries_lock:
+            stored = _galleries.get(gallery)
+        if stored is None:
+            return {"match": False, "gallery_missing": True}
+    elif candidates is not None:
+        stored = {candidate_id: embedding for candidate_id, embedding in candidates}
+    else:
+        raise HTTPException(status_code=400, detail="Either gallery or candidates is required")
+    with _Image(image) as path:
+        return face_service.identify_face(path, stored)
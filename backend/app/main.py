@@ -1,6 +1,12 @@
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+# Structured, queued logging (see core/logging_config.py); before anything below logs
+from .core.logging_config import setup_logging
+setup_logging()
+logger = logging.getLogger("main")
+
 app = FastAPI(
     title="Attendance & Payroll System API",
     description="Backend API for Face Recognition Attendance and Payroll  ",
@@ -28,32 +34,78 @@ def init_data():
                 default_company = Company(id="default", name="Default Company")
                 db.add(default_company)
                 db.commit()
-                print("✅ Default company created.")
+                logger.info("Default company created")
             except Exception:
                 db.rollback()
-                print("ℹ️ Default company might have been created by another process.")
+                logger.info("Default company might have been created by another process")
         
         # Create default admin if not exists
         username = "admin"
         user = db.query(AdminUser).filter(AdminUser.username == username).first()
         if not user:
-            print(f"🚀 Creating default admin user: {username}")
+            logger.info(f"Creating default admin user: {username}")
             try:
                 hashed_password = auth_service.get_password_hash("password123")
                 new_user = AdminUser(username=username, password_hash=hashed_password, role="superadmin")
                 db.add(new_user)
                 db.commit()
-                print("✅ Default admin created.")
+                logger.info("Default admin created")
             except Exception as e:
                 db.rollback() # Important to rollback to clear the session
                 # If it's a unique violation, it just means someone else created it
                 if "unique constraint" in str(e).lower() or "Duplicate" in str(e):
-                    print(f"ℹ️ Admin user '{username}' already exists (race condition handled).")
+                    logger.info(f"Admin user '{username}' already exists (race condition handled)")
                 else:
-                    print(f"❌ Failed to create admin: {e}")
+                    logger.exception("Failed to create admin")
     finally:
         db.close()
 
+@app.on_event("startup")
+def ensure_attendance_partitions():
+    # Postgres only: keep next months' attendance_logs partitions ready (no-op on SQLite)
+    from .core.partitioning import ensure_upcoming_partitions
+    try:
+        created = ensure_upcoming_partitions(engine)
+        if created:
+            logger.info(f"Created attendance partitions: {', '.join(created)}")
+    except Exception:
+        logger.exception("Could not ensure attendance partitions")
+
+@app.on_event("startup")
+async def start_presence_map():
+    # Today's check-in state for duplicate-punch rejection; rebuilt at each IST midnight
+    from .services.presence import presence
+    try:
+        presence.warm_today()
+    except Exception:
+        logger.exception("Could not warm presence map")
+    presence.start()
+
+@app.on_event("startup")
+async def preload_face_models():
+    # Off by default: the recognition stack loads on the first scan (FACE_PRELOAD=true loads it now, in the background).
+    # APP_ROLE=api workers never load it; the inference server does.
+    from .services.face_client import APP_ROLE
+    from .services.face_recognition import face_service, FACE_PRELOAD
+    if FACE_PRELOAD and APP_ROLE != "api":
+        import asyncio
+        asyncio.get_running_loop().run_in_executor(None, face_service.preload)
+
+@app.on_event("shutdown")
+async def stop_live_events():
+    from .services.live_events import live_events
+    await live_events.close()
+
+@app.on_event("shutdown")
+async def stop_presence_map():
+    from .services.presence import presence
+    await presence.stop()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    from .core.database import dispose_async_engine
+    await dispose_async_engine()
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -72,6 +124,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# SQL count/time per request (X-DB-Queries / X-DB-Time-ms with DB_DEBUG_HEADERS) and the slow-query log
+from .core.query_stats import QueryStatsMiddleware
+app.add_middleware(QueryStatsMiddleware)
+
+# Request metrics (latency, sizes, errors, SQL per request) for GET /metrics, when METRICS_ENABLED.
+# Added after QueryStatsMiddleware so it wraps it and can read the request's query stats.
+from .core.metrics import METRICS_ENABLED, MetricsMiddleware, metrics_response
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 from .api import endpoints
 app.include_router(endpoints.router, prefix="/api/v1")
 
@@ -83,14 +145,16 @@ def read_root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
 from fastapi import Request
 from fastapi.responses import JSONResponse
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    import traceback
-    error_details = traceback.format_exc()
-    print(f"🔥 GLOBAL 500 ERROR: {str(exc)}\n{error_details}")
+    logger.error(f"Unhandled error on {request.method} {request.url.path}: {exc}", exc_info=exc)
     origin = request.headers.get("origin")
     allow_origin = origin if origin in [
         "https://t3sol.in",
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, Date, Numeric, Enum, Text
+from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, Date, Numeric, Enum, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..core.database import Base
@@ -34,6 +34,7 @@ class AdminUser(Base):
     username = Column(String, unique=True, nullable=False)
     password_hash = Column(String, nullable=False)
     role = Column(String, default="admin") # superadmin, hr, etc.
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")  # Bumped on role/password change; older tokens stop working
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class Company(Base):
@@ -63,7 +64,7 @@ class Employee(Base):
     __tablename__ = "employees"
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     company_id = Column(String, ForeignKey("companies.id"))
-    emp_code = Column(String, nullable=False)
+    emp_code = Column(String, nullable=False, index=True)
     first_name = Column(String, nullable=False)
     last_name = Column(String)
     mobile_no = Column(String, unique=True, nullable=False)
@@ -86,8 +87,14 @@ class Employee(Base):
     
     company = relationship("Company", back_populates="employees")
     attendance_logs = relationship("AttendanceLog", back_populates="employee")
+    
+    __table_args__ = (
+        Index("ix_employees_department_status", "department", "status"),
+    )
 
 class AttendanceLog(Base):
+    # On Postgres this table may be range-partitioned by month on `date` (migrate_partition_attendance_logs.py),
+    # with primary key (id, date). Filter on date ranges, not extract(), so queries prune to the right partitions.
     __tablename__ = "attendance_logs"
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     employee_id = Column(String, ForeignKey("employees.id"))
@@ -104,7 +111,49 @@ class AttendanceLog(Base):
     ot_holiday_hours = Column(Numeric(5, 2), default=0.0)  # Holiday OT hours
     total_hours_worked = Column(Numeric(5, 2), default=0.0)  # Total hours worked that day
     
+    # Origin of the row: 'face' (kiosk scan), 'import' (biometric Excel), 'manual' (admin edit)
+    source = Column(String, nullable=True)
+    
     employee = relationship("Employee", back_populates="attendance_logs")
+    
+    __table_args__ = (
+        Index("ix_attendance_logs_emp_date", "employee_id", "date"),
+    )
+
+class PunchEvent(Base):
+    """Raw punch pushed by a biometric device (append-only, folded into AttendanceLog)"""
+    __tablename__ = "punch_events"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    idempotency_key = Column(String, unique=True, nullable=False)  # Device-supplied or hash of device/emp/time
+    device_id = Column(String, nullable=False)
+    emp_code = Column(String, nullable=False)
+    punched_at = Column(DateTime(timezone=True), nullable=False)
+    punch_date = Column(Date, nullable=False)  # IST calendar day of the punch
+    batch_id = Column(String, nullable=False, index=True)  # Ingestion request that delivered it
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_punch_events_emp_day", "emp_code", "punch_date"),
+    )
+
+class DailyAttendanceSummary(Base):
+    """Per-day attendance rollup by department and employee type (maintained by attendance_rollup service)"""
+    __tablename__ = "daily_attendance_summary"
+    date = Column(Date, primary_key=True)
+    department = Column(String, primary_key=True)  # 'Unassigned' when the employee has none
+    employee_type = Column(String, primary_key=True)
+    
+    headcount = Column(Integer, default=0)  # Active employees in the group when refreshed
+    present_count = Column(Integer, default=0)
+    half_day_count = Column(Integer, default=0)
+    absent_count = Column(Integer, default=0)  # headcount - present - half_day
+    
+    total_hours_worked = Column(Numeric(12, 2), default=0.0)
+    ot_hours = Column(Numeric(12, 2), default=0.0)
+    ot_weekend_hours = Column(Numeric(12, 2), default=0.0)
+    ot_holiday_hours = Column(Numeric(12, 2), default=0.0)
+    
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 class SalaryStructure(Base):
     __tablename__ = "salary_structures"
@@ -323,6 +372,11 @@ class LoanPayment(Base):
     # Relationships
     loan = relationship("EmployeeLoan", back_populates="payments")
     employee = relationship("Employee")
+    
+    __table_args__ = (
+        # One EMI per loan per month (payroll re-runs post idempotently against this)
+        UniqueConstraint("loan_id", "month", "year", name="uq_loan_payments_loan_month"),
+    )
 
 
 # Update Employee relationship for loans
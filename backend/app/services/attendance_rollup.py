@@ -0,0 +1,228 @@
+import datetime
+import logging
+from sqlalchemy import select, update, delete, func, case, and_, not_, literal, tuple_, Date, event
+from sqlalchemy.orm import Session, object_session
+from ..models.models import Employee, AttendanceLog, DailyAttendanceSummary
+from .cache import invalidate_on_commit
+
+logger = logging.getLogger("attendance_rollup")
+
+UNASSIGNED_DEPARTMENT = "Unassigned"
+DEFAULT_EMPLOYEE_TYPE = "full_time"
+
+# Cache namespace for dashboard aggregates; dropped whenever attendance or employees change
+DASHBOARD_CACHE = "dashboard"
+
+HOUR_COLUMNS = ("total_hours_worked", "ot_hours", "ot_weekend_hours", "ot_holiday_hours")
+
+
+def _dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def _group_columns():
+    return (
+        func.coalesce(Employee.department, UNASSIGNED_DEPARTMENT),
+        func.coalesce(Employee.employee_type, DEFAULT_EMPLOYEE_TYPE),
+    )
+
+
+class AttendanceRollupService:
+    """
+    Keeps daily_attendance_summary in step with attendance_logs.
+
+    Scans call apply_change() with the one log they wrote, which adjusts the
+    counters of that employee's group row in place. Batch writers (imports,
+    device punches, edits) call refresh() for the dates (and optionally
+    employees) they touched, inside their own transaction; each affected
+    (date, department, employee_type) group is recomputed from that day's
+    logs with one INSERT ... SELECT ... ON CONFLICT DO UPDATE (safe when two
+    scans or a scan and an import refresh the same day at once), so
+    dashboards and reports read O(days x groups) rows instead of scanning logs.
+    """
+
+    @staticmethod
+    def refresh(db: Session, dates, employee_ids=None):
+        """Recompute summary rows for dates; limited to the groups of employee_ids when given"""
+        dates = sorted({d for d in dates if d is not None})
+        if not dates:
+            return 0
+        # Session is autoflush=False; make pending log edits visible to the aggregate
+        db.flush()
+        invalidate_on_commit(db, DASHBOARD_CACHE)
+
+        S = DailyAttendanceSummary
+        department, employee_type = _group_columns()
+        groups = None
+        summarized = set()
+        if employee_ids:
+            groups = select(department, employee_type).where(Employee.id.in_(list(employee_ids))).distinct()
+            # The first write of a day summarizes every group, so a day is never left half-built
+            summarized = set(db.execute(select(S.date).where(S.date.in_(dates)).distinct()).scalars())
+
+        attended = case((AttendanceLog.status.in_(("present", "half_day")), Employee.id))
+        dialect_insert = _dialect_insert(db)
+        columns = [
+            "date", "department", "employee_type", "headcount", "present_count", "half_day_count",
+            "absent_count", "total_hours_worked", "ot_hours", "ot_weekend_hours", "ot_holiday_hours",
+        ]
+        active_groups = select(department, employee_type).where(Employee.status == "active").distinct()
+        for day in dates:
+            scoped = groups is not None and day in summarized
+            headcount = func.count(Employee.id.distinct())
+            rows = (
+                select(
+                    literal(day, Date),
+                    department,
+                    employee_type,
+                    headcount,
+                    func.count(case((AttendanceLog.status == "present", Employee.id)).distinct()),
+                    func.count(case((AttendanceLog.status == "half_day", Employee.id)).distinct()),
+                    headcount - func.count(attended.distinct()),
+                    func.coalesce(func.sum(AttendanceLog.total_hours_worked), 0),
+                    func.coalesce(func.sum(AttendanceLog.ot_hours), 0),
+                    func.coalesce(func.sum(AttendanceLog.ot_weekend_hours), 0),
+                    func.coalesce(func.sum(AttendanceLog.ot_holiday_hours), 0),
+                )
+                .select_from(Employee)
+                .outerjoin(AttendanceLog, and_(AttendanceLog.employee_id == Employee.id, AttendanceLog.date == day))
+                .where(Employee.status == "active")
+                .group_by(department, employee_type)
+            )
+            if scoped:
+                rows = rows.where(tuple_(department, employee_type).in_(groups))
+            stmt = dialect_insert(S.__table__).from_select(columns, rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["date", "department", "employee_type"],
+                set_={**{c: stmt.excluded[c] for c in columns[3:]}, "refreshed_at": func.now()},
+            )
+            db.execute(stmt)
+
+            # Groups left without active employees (last one moved or deactivated)
+            stale = delete(S).where(S.date == day, not_(tuple_(S.department, S.employee_type).in_(active_groups)))
+            if scoped:
+                stale = stale.where(tuple_(S.department, S.employee_type).in_(groups))
+            db.execute(stale, execution_options={"synchronize_session": False})
+        return len(dates)
+
+    @staticmethod
+    def _contribution(log):
+        """One employee-day's share of its group's summary row; log is None when there is none (absent)"""
+        status = log.get("status") if log else None
+        share = {
+            "present_count": int(status == "present"),
+            "half_day_count": int(status == "half_day"),
+            "absent_count": int(status not in ("present", "half_day")),
+        }
+        for column in HOUR_COLUMNS:
+            share[column] = float((log or {}).get(column) or 0)
+        return share
+
+    @staticmethod
+    def apply_change(db: Session, day: datetime.date, employee, before, after):
+        """
+        Move one employee-day's log from `before` to `after` (dicts of status
+        and hour columns, None for no log) as +/- updates on the employee's
+        group row. Falls back to refresh() when the day or group has no row
+        yet, or the employee is not counted (inactive).
+        """
+        if employee.status != "active":
+            return AttendanceRollupService.refresh(db, [day], [employee.id])
+        old, new = AttendanceRollupService._contribution(before), AttendanceRollupService._contribution(after)
+        delta = {column: new[column] - old[column] for column in new if new[column] != old[column]}
+        if not delta:
+            return 0
+        invalidate_on_commit(db, DASHBOARD_CACHE)
+        S = DailyAttendanceSummary
+        stmt = update(S).where(
+            S.date == day,
+            S.department == (employee.department or UNASSIGNED_DEPARTMENT),
+            S.employee_type == (employee.employee_type or DEFAULT_EMPLOYEE_TYPE),
+        )
+        if delta.get("absent_count", 0) < 0:
+            # No absentee left to convert: the row predates this employee, so rebuild it
+            stmt = stmt.where(S.absent_count + delta["absent_count"] >= 0)
+        result = db.execute(
+            stmt.values(**{column: getattr(S, column) + change for column, change in delta.items()}, refreshed_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            # The log is already written, so recomputing from the logs includes this change
+            return AttendanceRollupService.refresh(db, [day], [employee.id])
+        return 1
+
+    @staticmethod
+    def apply_change_and_commit(db: Session, day: datetime.date, employee, before, after):
+        """apply_change() for paths that have already committed the log; a rollup failure must not fail the request"""
+        try:
+            AttendanceRollupService.apply_change(db, day, employee, before, after)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Attendance rollup update failed for {day}: {e}")
+
+    @staticmethod
+    def refresh_and_commit(db: Session, dates, employee_ids=None):
+        """For paths that have already committed their own write; a rollup failure must not fail the request"""
+        try:
+            AttendanceRollupService.refresh(db, dates, employee_ids)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Attendance rollup refresh failed for {dates}: {e}")
+
+    @staticmethod
+    def incomplete_dates(db: Session, dates):
+        """Those of dates lacking a summary row for at least one current (department, employee_type) group"""
+        dates = set(dates)
+        if not dates:
+            return set()
+        S = DailyAttendanceSummary
+        department, employee_type = _group_columns()
+        active = {tuple(row) for row in db.execute(select(department, employee_type).where(Employee.status == "active").distinct())}
+        have = {}
+        for day, dept, emp_type in db.execute(
+            select(S.date, S.department, S.employee_type).where(S.date.in_(dates))
+        ):
+            have.setdefault(day, set()).add((dept, emp_type))
+        return {day for day in dates if not active <= have.get(day, set())}
+
+    @staticmethod
+    def day_counts(db: Session, day: datetime.date):
+        """Active headcount and present/absent counters for one day (no rows yet: nobody present)"""
+        total = db.query(Employee).filter(Employee.status == "active").count()
+        present = int(db.execute(
+            select(func.coalesce(func.sum(DailyAttendanceSummary.present_count), 0))
+            .where(DailyAttendanceSummary.date == day)
+        ).scalar())
+        # Simple logic: Absent = Total - Present (ignoring leaves/shifts for now)
+        return {"total_employees": total, "present_today": present, "absent_today": max(0, total - present)}
+
+    @staticmethod
+    def unsummarized_dates(db: Session, start: datetime.date = None, end: datetime.date = None):
+        """Dates that have attendance logs but missing summary rows (used by the backfill)"""
+        logged = select(AttendanceLog.date).distinct()
+        if start:
+            logged = logged.where(AttendanceLog.date >= start)
+        if end:
+            logged = logged.where(AttendanceLog.date <= end)
+        return sorted(AttendanceRollupService.incomplete_dates(db, db.execute(logged).scalars()))
+
+
+attendance_rollup = AttendanceRollupService()
+
+
+@event.listens_for(Employee, "after_insert")
+@event.listens_for(Employee, "after_update")
+@event.listens_for(Employee, "after_delete")
+@event.listens_for(AttendanceLog, "after_insert")
+@event.listens_for(AttendanceLog, "after_update")
+@event.listens_for(AttendanceLog, "after_delete")
+def _dashboard_source_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        invalidate_on_commit(session, DASHBOARD_CACHE)
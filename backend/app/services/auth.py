@@ -1,7 +1,17 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from ..core.database import SessionLocal
+from ..models.models import AdminUser
+from .cache import cache, invalidate_on_commit
 
 # Configuration
 SECRET_KEY = "super-secret-key-change-this-in-prod"
@@ -10,13 +20,62 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 300 # 5 hours for dev convenience
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Validated principals are reused for this long without touching admin_users; 0 disables the cache
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+# Cache namespace whose generation is bumped on any role/password change (shared across workers via Redis)
+PRINCIPAL_CACHE = "principals"
+# How often that generation is re-read (a Redis GET); bounds how long a revoked token stays usable
+PRINCIPAL_GENERATION_CHECK_SECONDS = float(os.getenv("PRINCIPAL_GENERATION_CHECK_SECONDS", "5"))
+
+# bcrypt runs on its own small pool so a login storm cannot occupy the event loop or every request thread
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hash/verify jobs allowed to wait for a worker; beyond this callers get PasswordHasherBusy
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+
+class PasswordHasherBusy(Exception):
+    """Too many password hashes already queued"""
+
+
+class Principal:
+    """The authenticated admin as routes see it (id, username, role), without an ORM row"""
+    __slots__ = ("id", "username", "role", "token_version")
+
+    def __init__(self, id, username, role, token_version=0):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.token_version = token_version
+
 class AuthService:
+    def __init__(self):
+        self._principals = {}    # (username, token_version) -> (generation, expires_at, Principal)
+        self._generation = (0, float("-inf"))    # (PRINCIPAL_CACHE generation, monotonic time read)
+        self._lock = threading.Lock()
+        self._hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+        self._hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
+
     def verify_password(self, plain_password, hashed_password):
         return pwd_context.verify(plain_password, hashed_password)
 
     def get_password_hash(self, password):
         return pwd_context.hash(password)
 
+    async def _run_hash(self, fn, *args):
+        if not self._hash_slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._hash_pool, fn, *args)
+        finally:
+            self._hash_slots.release()
+
+    async def verify_password_async(self, plain_password, hashed_password):
+        """verify_password on the bounded bcrypt pool; raises PasswordHasherBusy when the queue is full"""
+        return await self._run_hash(self.verify_password, plain_password, hashed_password)
+
+    async def get_password_hash_async(self, password):
+        return await self._run_hash(self.get_password_hash, password)
+
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
         to_encode = data.copy()
         if expires_delta:
@@ -27,4 +86,57 @@ class AuthService:
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
 
+    def token_claims(self, user):
+        """Role and token version travel in the token so requests can authorize without a user lookup"""
+        return {"sub": user.username, "uid": user.id, "role": user.role, "ver": user.token_version or 0}
+
+    def _principal_generation(self):
+        """PRINCIPAL_CACHE generation, read at most once per PRINCIPAL_GENERATION_CHECK_SECONDS"""
+        generation, checked_at = self._generation
+        now = time.monotonic()
+        if now - checked_at >= PRINCIPAL_GENERATION_CHECK_SECONDS:
+            generation = cache.generation(PRINCIPAL_CACHE)
+            self._generation = (generation, now)
+        return generation
+
+    def get_principal(self, payload: dict):
+        """
+        Principal for a decoded token, or None when the user is gone or the
+        token predates a role/password change (token_version mismatch).
+        Cached per (subject, token version); the database is only asked on a miss
+        and the shared generation only every few seconds.
+        """
+        username = payload.get("sub")
+        version = payload.get("ver", 0)
+        key = (username, version)
+        generation = self._principal_generation()
+        entry = self._principals.get(key)
+        if entry and entry[0] == generation and entry[1] > time.monotonic():
+            return entry[2]
+
+        db = SessionLocal()
+        try:
+            user = db.query(AdminUser).filter(AdminUser.username == username).first()
+            if user is None or (user.token_version or 0) != version:
+                return None
+            principal = Principal(user.id, user.username, user.role, user.token_version or 0)
+        finally:
+            db.close()
+        if PRINCIPAL_CACHE_TTL_SECONDS > 0:
+            with self._lock:
+                self._principals[key] = (generation, time.monotonic() + PRINCIPAL_CACHE_TTL_SECONDS, principal)
+        return principal
+
 auth_service = AuthService()
+
+
+@event.listens_for(AdminUser, "before_update")
+def _revoke_tokens_on_credential_change(mapper, connection, target):
+    """A role or password change retires every token issued before it"""
+    from sqlalchemy import inspect
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.password_hash.history.has_changes():
+        target.token_version = (target.token_version or 0) + 1
+        session = object_session(target)
+        if session is not None:
+            invalidate_on_commit(session, PRINCIPAL_CACHE)
@@ -1,189 +1,577 @@
-import pandas as pd
 import datetime
 import uuid
 import re
+import os
 import calendar
+import functools
+import shutil
+import tempfile
+import zipfile
+import json
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from sqlalchemy.orm import Session
 from ..models import models
 from ..models.models import Employee, AttendanceLog, Company
+from .employee_search import employee_search
+from .cache import invalidate_on_commit
+from .department_directory import DEPARTMENT_CACHE
+from .attendance_rollup import attendance_rollup
 import logging
 
 logger = logging.getLogger("biometric_import")
 
+# Device reports are wall-clock times at the site
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+
+MONTHS = {'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'June': 6, 'July': 7,
+          'August': 8, 'September': 9, 'October': 10, 'November': 11, 'December': 12}
+
+EXCEL_EXTENSIONS = (".xls", ".xlsx")
+
+# When several devices report the same employee-day, the strongest status wins
+STATUS_PRIORITY = {"present": 4, "half_day": 3, "holiday": 2, "weekly_off": 2, "absent": 1}
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+QUERY_CHUNK_SIZE = 500
+
+# Fields compared by the dry-run diff, in display order
+DIFF_FIELDS = ("check_in", "check_out", "status", "total_hours_worked", "ot_hours", "ot_weekend_hours")
+
+# Limits on what a batch upload may unpack from ZIP archives, checked from the
+# archive directory (ZipInfo.file_size) before anything is decompressed
+ZIP_MAX_MEMBERS = int(os.getenv("BIOMETRIC_ZIP_MAX_MEMBERS", "200"))
+ZIP_MAX_TOTAL_BYTES = int(os.getenv("BIOMETRIC_ZIP_MAX_TOTAL_BYTES", str(200 * 1024 * 1024)))
+
+# Staged dry-run previews are parked on local disk (as JSON, in a directory only this
+# user can write) so any worker on the node can apply them
+PREVIEW_DIR = os.getenv(
+    "BIOMETRIC_PREVIEW_DIR", os.path.join(os.path.expanduser("~"), ".cache", "attendance", "biometric_previews")
+)
+PREVIEW_TTL_SECONDS = 3600
+
+
+def _preview_dir():
+    """PREVIEW_DIR, created if needed; refused unless owned by us and closed to other users"""
+    os.makedirs(PREVIEW_DIR, mode=0o700, exist_ok=True)
+    st = os.stat(PREVIEW_DIR)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f"Preview directory {PREVIEW_DIR} must be owned by this user with mode 0700")
+    return PREVIEW_DIR
+
+
+def _dump_staged(employees: dict, merged: dict) -> str:
+    rows = []
+    for row in merged.values():
+        row = dict(row)
+        row["date"] = row["date"].isoformat()
+        for field in ("check_in", "check_out"):
+            if row[field] is not None:
+                row[field] = row[field].isoformat()
+        rows.append(row)
+    # default=float: hours can be numpy scalars
+    return json.dumps({"employees": employees, "rows": rows}, default=float)
+
+
+def _load_staged(data: str):
+    staged = json.loads(data)
+    merged = {}
+    for row in staged["rows"]:
+        row["date"] = datetime.date.fromisoformat(row["date"])
+        for field in ("check_in", "check_out"):
+            if row[field] is not None:
+                row[field] = datetime.datetime.fromisoformat(row[field])
+        merged[(row["emp_code"], row["date"])] = row
+    return staged["employees"], merged
+
+
+def _parse_val(v, date_context=None):
+    import pandas as pd
+    if pd.isna(v): return None
+    if date_context and isinstance(v, (datetime.time, datetime.datetime)):
+        t = v if isinstance(v, datetime.time) else v.time()
+        return datetime.datetime.combine(date_context, t, tzinfo=IST)
+
+    # Handle numeric values (e.g. 7.0 from pandas)
+    if isinstance(v, (int, float)):
+        if date_context:
+            hours = int(v)
+            minutes = int(round((v - hours) * 100))  # e.g. 7.30 -> 7:30
+            if minutes >= 60:
+                minutes = 59
+            return datetime.datetime.combine(date_context, datetime.time(hours, minutes), tzinfo=IST)
+        return float(v)
+
+    s = str(v).strip()
+    if not s or s.lower() == "nan": return None
+
+    if date_context:
+        t = _parse_clock(s)
+        if t is not None:
+            return datetime.datetime.combine(date_context, t, tzinfo=IST)
+    try: return float(s)
+    except: return 0.0
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_clock(s):
+    # A sheet repeats the same few hundred clock strings; strptime is the parse hot spot
+    # Try common time formats including decimal H.M and hour-only
+    for fmt in ["%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M:%S %p", "%H.%M", "%H"]:
+        try:
+            return datetime.datetime.strptime(s, fmt).time()
+        except: continue
+    return None
+
+
+def parse_attendance_sheet(df: "pd.DataFrame", source: str = ""):
+    """
+    Parse one biometric report sheet into staged rows without touching the database.
+    Returns {"employees": {emp_code: name}, "rows": [...]} where each row is a dict
+    keyed by emp_code/date ready to be merged and written.
+    """
+    import pandas as pd
+    # HYBRID MODE: Let AI analyze the file layout
+    from .ai_service import ai_service
+    layout = ai_service.get_excel_layout(df)
+    status_cache = {} # Cache AI mapping for the duration of this sheet
+    # Positional access on the raw object array is ~50x cheaper than df.iloc per cell
+    cells = df.values
+    n_rows, n_cols = cells.shape
+
+    # 1. Parse Month and Year from header
+    header_text = ""
+    for r_idx in [2, 3]: # try row 3 or 4
+        if n_rows > r_idx and n_cols > 7:
+            val = str(cells[r_idx, 7])
+            if "Month of" in val:
+                header_text = val
+                break
+
+    my_match = re.search(r"Month of (\w+), (\d{4})", header_text)
+    if not my_match and layout and 'month_year_text' in layout:
+        my_match = re.search(r"(\w+), (\d{4})", layout['month_year_text'])
+
+    if my_match:
+        month_name = my_match.group(1).title()
+        year = int(my_match.group(2))
+        month_idx = MONTHS.get(month_name, datetime.datetime.now().month)
+    else:
+        month_idx = datetime.datetime.now().month
+        year = datetime.datetime.now().year
+
+    # Get number of days in this specific month
+    _, num_days = calendar.monthrange(year, month_idx)
+
+    # Dynamic Day Column Start Detection
+    if layout and 'day_1_column_index' in layout:
+        day_1_col = int(layout['day_1_column_index'])
+        logger.info(f"AI Detected Day 1 Column Index: {day_1_col}")
+    else:
+        day_1_col = 8 # Default fallback
+        if n_rows > 4:
+            row_5 = cells[4]
+            for c_idx in range(len(row_5)):
+                item = str(row_5[c_idx]).strip()
+                if item in ["01", "1"]:
+                    day_1_col = c_idx
+                    break
+
+    employees = {}
+    rows = []
+
+    # Row-by-row scan for employee headers
+    for i in range(5, n_rows):
+        code = str(cells[i, 0]).strip()
+        if not re.match(r"^\d+$", code): continue
+
+        name = str(cells[i, 1]).strip()
+        employees.setdefault(code, name)
+
+        # Locate labels within 15 rows of the header
+        label_rows = {}
+        for j in range(i + 1, min(i + 15, n_rows)):
+            label = str(cells[j, 0]).strip().lower()
+            if "in time" in label: label_rows['in'] = j
+            elif "out time" in label: label_rows['out'] = j
+            elif "work" in label: label_rows['work'] = j
+            elif "ot" in label: label_rows['ot'] = j
+            elif "status" in label: label_rows['status'] = j
+            if j > i + 1 and re.match(r"^\d+$", str(cells[j, 0]).strip()): break
+
+        if 'status' not in label_rows:
+            continue
+
+        for day in range(1, num_days + 1):
+            col = day_1_col + (day - 1)
+            if col >= n_cols: break
+
+            try:
+                dt = datetime.date(year, month_idx, day)
+                is_wk = dt.weekday() >= 5
+
+                st_raw = cells[label_rows['status'], col]
+                st_val = str(st_raw).strip().upper()
+
+                # Skip only if truly empty/NaN and no times provided
+                cin = _parse_val(cells[label_rows['in'], col], dt) if 'in' in label_rows else None
+                cout = _parse_val(cells[label_rows['out'], col], dt) if 'out' in label_rows else None
+                if pd.isna(st_raw) and not (cin or cout): continue
+
+                if cin and cout and cout < cin: cout += datetime.timedelta(days=1)
+
+                wk_h = (_parse_val(cells[label_rows['work'], col]) if 'work' in label_rows else 0.0) or 0.0
+                ot_h = (_parse_val(cells[label_rows['ot'], col]) if 'ot' in label_rows else 0.0) or 0.0
+
+                # Determine status
+                # Normal: PP, PPl are present. AA is absent. WW is weekly off.
+                if st_val in ["AA", "AB"]:
+                    final_status = "absent"
+                elif cin or wk_h > 0 or "P" in st_val:
+                    final_status = "present"
+                elif "W" in st_val or is_wk:
+                    # Default to weekly_off if it's a weekend or marked 'W' and no work hours
+                    final_status = "weekly_off"
+                else:
+                    # AI Fallback for unknown status codes with local caching
+                    if st_val not in status_cache:
+                        status_cache[st_val] = ai_service.map_unknown_status(st_val) or "absent"
+                    final_status = status_cache[st_val]
+
+                rows.append({
+                    "emp_code": code, "date": dt,
+                    "check_in": cin, "check_out": cout, "status": final_status,
+                    "total_hours_worked": wk_h,
+                    "ot_hours": ot_h if not is_wk else 0.0,
+                    "ot_weekend_hours": ot_h if is_wk else 0.0,
+                })
+            except Exception as day_err:
+                logger.error(f"Error processing day {day} for {name} {source}: {day_err}")
+                continue
+
+    return {"employees": employees, "rows": rows}
+
+
+def _parse_workbook_sheet(task):
+    """Process-pool entry point: parse one (file, sheet) pair."""
+    import pandas as pd
+    path, sheet = task
+    df = pd.read_excel(path, header=None, sheet_name=sheet)
+    return parse_attendance_sheet(df, source=f"[{os.path.basename(path)}:{sheet}]")
+
+
+def merge_staged_rows(parsed_sheets):
+    """
+    Merge staged rows from several devices/sheets into one row per employee-day.
+    Conflicts resolve to the earliest check-in, the latest check-out, the largest
+    reported hours and the strongest status.
+    """
+    employees = {}
+    merged = {}
+    for parsed in parsed_sheets:
+        for code, name in parsed["employees"].items():
+            employees.setdefault(code, name)
+        for row in parsed["rows"]:
+            key = (row["emp_code"], row["date"])
+            current = merged.get(key)
+            if current is None:
+                merged[key] = dict(row)
+                continue
+
+            ins = [t for t in (current["check_in"], row["check_in"]) if t]
+            outs = [t for t in (current["check_out"], row["check_out"]) if t]
+            current["check_in"] = min(ins) if ins else None
+            current["check_out"] = max(outs) if outs else None
+            for field in ("total_hours_worked", "ot_hours", "ot_weekend_hours"):
+                current[field] = max(current[field] or 0.0, row[field] or 0.0)
+            if STATUS_PRIORITY.get(row["status"], 0) > STATUS_PRIORITY.get(current["status"], 0):
+                current["status"] = row["status"]
+    return employees, merged
+
+
+def _chunks(items, size=QUERY_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _comparable(field, value):
+    """Normalize a log value so staged and stored rows compare equal when they mean the same."""
+    if value is None:
+        return 0.0 if field not in ("check_in", "check_out", "status") else None
+    if field in ("check_in", "check_out"):
+        # Naive values come back from SQLite and are IST wall-clock
+        if value.tzinfo is not None:
+            value = value.astimezone(IST).replace(tzinfo=None)
+        return value.replace(microsecond=0)
+    if field == "status":
+        return value
+    return round(float(value), 2)
+
+
+def _display(field, value):
+    if value is None:
+        return None
+    if field in ("check_in", "check_out"):
+        return value.strftime("%Y-%m-%d %H:%M")
+    return value
+
+
 class BiometricImportService:
     @staticmethod
     def import_from_excel(file_path: str, db: Session):
         try:
-            # Read the Excel file
-            df = pd.read_excel(file_path, header=None)
-            
-            # HYBRID MODE: Let AI analyze the file layout
-            from .ai_service import ai_service
-            layout = ai_service.get_excel_layout(df)
-            status_cache = {} # Cache AI mapping for the duration of this import
-            
-            # 1. Parse Month and Year from header
-            header_text = ""
-            for r_idx in [2, 3]: # try row 3 or 4
-                if len(df) > r_idx:
-                    val = str(df.iloc[r_idx, 7])
-                    if "Month of" in val:
-                        header_text = val
-                        break
-            
-            my_match = re.search(r"Month of (\w+), (\d{4})", header_text)
-            if not my_match and layout and 'month_year_text' in layout:
-                my_match = re.search(r"(\w+), (\d{4})", layout['month_year_text'])
-            
-            months = {'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'June': 6, 'July': 7, 
-                      'August': 8, 'September': 9, 'October': 10, 'November': 11, 'December': 12}
-            
-            if my_match:
-                month_name = my_match.group(1).title()
-                year = int(my_match.group(2))
-                month_idx = months.get(month_name, datetime.datetime.now().month)
-            else:
-                month_idx = datetime.datetime.now().month
-                year = datetime.datetime.now().year
-
-            # Get number of days in this specific month
-            _, num_days = calendar.monthrange(year, month_idx)
-
-            # Ensure default company
-            if not db.query(Company).filter(Company.id == "default").first():
-                db.add(Company(id="default", name="Default Company"))
-                db.commit()
-
-            def parse_val(v, date_context=None):
-                if pd.isna(v): return None
-                if date_context and isinstance(v, (datetime.time, datetime.datetime)):
-                    t = v if isinstance(v, datetime.time) else v.time()
-                    return datetime.datetime.combine(date_context, t)
-
-                # Handle numeric values (e.g. 7.0 from pandas)
-                if isinstance(v, (int, float)):
-                    if date_context:
-                        hours = int(v)
-                        minutes = int(round((v - hours) * 100))  # e.g. 7.30 -> 7:30
-                        if minutes >= 60:
-                            minutes = 59
-                        return datetime.datetime.combine(date_context, datetime.time(hours, minutes))
-                    return float(v)
-
-                s = str(v).strip()
-                if not s or s.lower() == "nan": return None
-
-                if date_context:
-                    # Try common time formats including decimal H.M and hour-only
-                    for fmt in ["%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M:%S %p", "%H.%M", "%H"]:
-                        try:
-                            return datetime.datetime.combine(date_context, datetime.datetime.strptime(s, fmt).time())
-                        except: continue
-                try: return float(s)
-                except: return 0.0
-
-            imported_count = 0
-            new_emp_count = 0
-            
-            # Dynamic Day Column Start Detection
-            if layout and 'day_1_column_index' in layout:
-                day_1_col = int(layout['day_1_column_index'])
-                logger.info(f"AI Detected Day 1 Column Index: {day_1_col}")
+            employees, merged = BiometricImportService.stage_excel(file_path)
+            return BiometricImportService.write_staged(employees, merged, db)
+        except Exception as e:
+            db.rollback(); logger.error(f"Critical import error: {e}"); raise e
+
+    @staticmethod
+    def import_batch(sources: list, db: Session, max_workers: int = None):
+        """
+        Import many biometric workbooks (or ZIP archives of them) at once.
+        Every sheet of every workbook is parsed in a worker process, the staged
+        rows are merged across devices and written in a single transaction.
+        """
+        workdir = tempfile.mkdtemp(prefix="biometric_batch_")
+        try:
+            files = []
+            unpacked_bytes = 0
+            for src in sources:
+                # .xlsx workbooks are zip containers too, so go by extension
+                if src.lower().endswith(".zip"):
+                    with zipfile.ZipFile(src) as zf:
+                        members = zf.infolist()
+                        if len(members) > ZIP_MAX_MEMBERS:
+                            raise ValueError(f"ZIP archive has {len(members)} entries; at most {ZIP_MAX_MEMBERS} allowed")
+                        for idx, member in enumerate(members):
+                            base = os.path.basename(member.filename)
+                            if member.is_dir() or not base.lower().endswith(EXCEL_EXTENSIONS):
+                                continue
+                            # Reads stop at file_size, so the declared sizes bound what is written
+                            unpacked_bytes += member.file_size
+                            if unpacked_bytes > ZIP_MAX_TOTAL_BYTES:
+                                raise ValueError(
+                                    f"ZIP contents exceed {ZIP_MAX_TOTAL_BYTES // (1024 * 1024)} MB uncompressed"
+                                )
+                            target = os.path.join(workdir, f"{idx}_{base}")
+                            with zf.open(member) as fsrc, open(target, "wb") as fdst:
+                                shutil.copyfileobj(fsrc, fdst)
+                            files.append(target)
+                else:
+                    files.append(src)
+
+            if not files:
+                raise ValueError("No Excel workbooks found in upload")
+
+            import pandas as pd
+            tasks = []
+            for path in files:
+                with pd.ExcelFile(path) as book:
+                    tasks.extend((path, sheet) for sheet in book.sheet_names)
+
+            workers = min(len(tasks), max_workers or os.cpu_count() or 1)
+            if workers <= 1:
+                parsed = [_parse_workbook_sheet(t) for t in tasks]
             else:
-                day_1_col = 8 # Default fallback
-                if len(df) > 4:
-                    row_5 = df.iloc[4]
-                    for c_idx in range(len(row_5)):
-                        item = str(row_5.iloc[c_idx]).strip()
-                        if item in ["01", "1"]:
-                            day_1_col = c_idx
-                            break
-            
-            # Row-by-row scan for employee headers
-            for i in range(5, len(df)):
-                code = str(df.iloc[i, 0]).strip()
-                if not re.match(r"^\d+$", code): continue
-                
-                name = str(df.iloc[i, 1]).strip()
-                employee = db.query(Employee).filter(Employee.emp_code == code).first()
-                if not employee:
-                    employee = Employee(
-                        id=str(uuid.uuid4()), emp_code=code, first_name=name,
-                        mobile_no=f"999{code[-7:].zfill(7)}", status='active', company_id="default"
-                    )
-                    db.add(employee); db.flush(); new_emp_count += 1
-
-                # Locate labels within 15 rows of the header
-                rows = {}
-                for j in range(i + 1, min(i + 15, len(df))):
-                    label = str(df.iloc[j, 0]).strip().lower()
-                    if "in time" in label: rows['in'] = j
-                    elif "out time" in label: rows['out'] = j
-                    elif "work" in label: rows['work'] = j
-                    elif "ot" in label: rows['ot'] = j
-                    elif "status" in label: rows['status'] = j
-                    if j > i + 1 and re.match(r"^\d+$", str(df.iloc[j, 0]).strip()): break
-
-                if 'status' in rows:
-                    for day in range(1, num_days + 1):
-                        col = day_1_col + (day - 1)
-                        if col >= len(df.columns): break
-                        
-                        try:
-                            dt = datetime.date(year, month_idx, day)
-                            is_wk = dt.weekday() >= 5
-                            
-                            st_raw = df.iloc[rows['status'], col]
-                            st_val = str(st_raw).strip().upper()
-                            
-                            # Skip only if truly empty/NaN and no times provided
-                            cin = parse_val(df.iloc[rows['in'], col], dt) if 'in' in rows else None
-                            cout = parse_val(df.iloc[rows['out'], col], dt) if 'out' in rows else None
-                            if pd.isna(st_raw) and not (cin or cout): continue
-                            
-                            if cin and cout and cout < cin: cout += datetime.timedelta(days=1)
-                            
-                            wk_h = parse_val(df.iloc[rows['work'], col]) if 'work' in rows else 0.0
-                            ot_h = parse_val(df.iloc[rows['ot'], col]) if 'ot' in rows else 0.0
-
-                            # Determine status
-                            # Normal: PP, PPl are present. AA is absent. WW is weekly off.
-                            if st_val in ["AA", "AB"]:
-                                final_status = "absent"
-                            elif cin or wk_h > 0 or "P" in st_val:
-                                final_status = "present"
-                            elif "W" in st_val or is_wk:
-                                # Default to weekly_off if it's a weekend or marked 'W' and no work hours
-                                final_status = "weekly_off"
-                            else:
-                                # AI Fallback for unknown status codes with local caching
-                                if st_val not in status_cache:
-                                    status_cache[st_val] = ai_service.map_unknown_status(st_val) or "absent"
-                                final_status = status_cache[st_val]
-
-                            log = db.query(AttendanceLog).filter(AttendanceLog.employee_id == employee.id, AttendanceLog.date == dt).first()
-                            if log:
-                                log.check_in, log.check_out, log.total_hours_worked, log.status = cin, cout, wk_h, final_status
-                                if is_wk: log.ot_weekend_hours, log.ot_hours = ot_h, 0.0
-                                else: log.ot_hours, log.ot_weekend_hours = ot_h, 0.0
-                            else:
-                                db.add(AttendanceLog(
-                                    id=str(uuid.uuid4()), employee_id=employee.id, date=dt,
-                                    check_in=cin, check_out=cout, status=final_status,
-                                    total_hours_worked=wk_h, ot_hours=ot_h if not is_wk else 0.0,
-                                    ot_weekend_hours=ot_h if is_wk else 0.0
-                                ))
-                            imported_count += 1
-                        except Exception as day_err:
-                            logger.error(f"Error processing day {day} for {name}: {day_err}")
-                            continue
-
-            db.commit()
-            return {
-                "status": "success", "logs_processed": imported_count, "new_employees": new_emp_count,
-                "message": f"Successfully imported {imported_count} records. {new_emp_count} new employees added."
+                # spawn: never fork a worker that may hold TensorFlow / DB connections
+                ctx = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                    parsed = list(pool.map(_parse_workbook_sheet, tasks))
+
+            employees, merged = merge_staged_rows(parsed)
+            result = BiometricImportService.write_staged(employees, merged, db)
+            result.update({"files_processed": len(files), "sheets_processed": len(tasks)})
+            return result
+        except Exception as e:
+            db.rollback(); logger.error(f"Critical batch import error: {e}"); raise e
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    @staticmethod
+    def stage_excel(file_path: str):
+        """Parse the first sheet of a workbook into merged employee-day rows."""
+        import pandas as pd
+        df = pd.read_excel(file_path, header=None)
+        return merge_staged_rows([parse_attendance_sheet(df)])
+
+    @staticmethod
+    def _resolve_employee_ids(codes, db: Session):
+        emp_ids = {}
+        for chunk in _chunks(codes):
+            for code, emp_id in db.query(Employee.emp_code, Employee.id).filter(Employee.emp_code.in_(chunk)):
+                emp_ids.setdefault(code, emp_id)
+        return emp_ids
+
+    @staticmethod
+    def _load_existing(emp_ids: dict, merged: dict, db: Session, columns=()):
+        """Pre-load the stored logs covering the staged date range, keyed by (emp_code, date)."""
+        existing = {}
+        if not merged or not emp_ids:
+            return existing
+        codes_by_id = {emp_id: code for code, emp_id in emp_ids.items()}
+        dates = [d for _, d in merged]
+        cols = [AttendanceLog.id, AttendanceLog.employee_id, AttendanceLog.date] + [getattr(AttendanceLog, c) for c in columns]
+        for chunk in _chunks(codes_by_id):
+            for row in db.query(*cols).filter(
+                AttendanceLog.employee_id.in_(chunk),
+                AttendanceLog.date >= min(dates),
+                AttendanceLog.date <= max(dates)
+            ):
+                existing.setdefault((codes_by_id[row.employee_id], row.date), row)
+        return existing
+
+    @staticmethod
+    def diff_staged(employees: dict, merged: dict, db: Session):
+        """
+        Compare staged rows with the stored month using set operations.
+        Returns the key sets plus per-field changes for rows that differ.
+        """
+        emp_ids = BiometricImportService._resolve_employee_ids(set(employees) | {c for c, _ in merged}, db)
+        existing = BiometricImportService._load_existing(emp_ids, merged, db, DIFF_FIELDS + ("source",))
+
+        staged_sigs = {(key, tuple(_comparable(f, row[f]) for f in DIFF_FIELDS)) for key, row in merged.items()}
+        stored_sigs = {(key, tuple(_comparable(f, getattr(row, f)) for f in DIFF_FIELDS)) for key, row in existing.items()}
+
+        staged_keys = set(merged)
+        new_keys = staged_keys - set(existing)
+        unchanged_keys = {key for key, _ in staged_sigs & stored_sigs}
+        changed_keys = staged_keys - new_keys - unchanged_keys
+        conflict_keys = {key for key in changed_keys if existing[key].source == "manual"}
+
+        changes = {}
+        for key in changed_keys:
+            stored, staged = existing[key], merged[key]
+            changes[key] = {
+                f: [_display(f, getattr(stored, f)), _display(f, staged[f])]
+                for f in DIFF_FIELDS
+                if _comparable(f, getattr(stored, f)) != _comparable(f, staged[f])
             }
+
+        return {
+            "new": new_keys, "changed": changed_keys, "unchanged": unchanged_keys,
+            "conflicts": conflict_keys, "changes": changes,
+            "new_employees": sorted(set(employees) - set(emp_ids)),
+        }
+
+    @staticmethod
+    def preview_import(file_path: str, db: Session):
+        """Dry run: stage the sheet, diff it against stored rows and park it for a later apply."""
+        employees, merged = BiometricImportService.stage_excel(file_path)
+        diff = BiometricImportService.diff_staged(employees, merged, db)
+
+        preview_dir = _preview_dir()
+        now = time.time()
+        for name in os.listdir(preview_dir):
+            path = os.path.join(preview_dir, name)
+            if now - os.path.getmtime(path) > PREVIEW_TTL_SECONDS:
+                os.remove(path)
+        preview_id = uuid.uuid4().hex
+        fd = os.open(os.path.join(preview_dir, f"{preview_id}.json"), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(_dump_staged(employees, merged))
+
+        def by_employee(keys):
+            grouped = {}
+            for code, log_date in sorted(keys):
+                grouped.setdefault(code, []).append(log_date.isoformat())
+            return grouped
+
+        return {
+            "status": "preview",
+            "preview_id": preview_id,
+            "summary": {
+                "new": len(diff["new"]),
+                "changed": len(diff["changed"]) - len(diff["conflicts"]),
+                "unchanged": len(diff["unchanged"]),
+                "conflicts": len(diff["conflicts"]),
+                "new_employees": len(diff["new_employees"]),
+            },
+            "new": by_employee(diff["new"]),
+            "changed": [
+                {"emp_code": code, "date": d.isoformat(), "fields": diff["changes"][(code, d)]}
+                for code, d in sorted(diff["changed"] - diff["conflicts"])
+            ],
+            "conflicts": [
+                {"emp_code": code, "date": d.isoformat(), "fields": diff["changes"][(code, d)]}
+                for code, d in sorted(diff["conflicts"])
+            ],
+            "new_employees": diff["new_employees"],
+        }
+
+    @staticmethod
+    def apply_preview(preview_id: str, db: Session, overwrite_conflicts: bool = False):
+        """Write a previously staged dry run without re-parsing the workbook."""
+        if not re.match(r"^[0-9a-f]{32}$", preview_id or ""):
+            raise ValueError("Invalid preview id")
+        path = os.path.join(_preview_dir(), f"{preview_id}.json")
+        if not os.path.exists(path):
+            raise ValueError("Preview not found or expired. Run the dry run again.")
+        with open(path, encoding="utf-8") as fh:
+            employees, merged = _load_staged(fh.read())
+
+        try:
+            # Re-diff against current rows: edits made since the preview must not be clobbered
+            diff = BiometricImportService.diff_staged(employees, merged, db)
+            skipped = set() if overwrite_conflicts else diff["conflicts"]
+            to_write = {k: v for k, v in merged.items() if k in (diff["new"] | diff["changed"]) - skipped}
+            result = BiometricImportService.write_staged(employees, to_write, db)
         except Exception as e:
-            db.rollback(); logger.error(f"Critical import error: {e}"); raise e
+            db.rollback(); logger.error(f"Applying preview {preview_id} failed: {e}"); raise e
+        os.remove(path)
+        result["conflicts_skipped"] = len(skipped)
+        result["unchanged"] = len(diff["unchanged"])
+        return result
+
+    @staticmethod
+    def write_staged(employees: dict, merged: dict, db: Session):
+        """Upsert merged employee-day rows with bulk statements and one commit."""
+        # Ensure default company
+        if not db.query(Company).filter(Company.id == "default").first():
+            db.add(Company(id="default", name="Default Company"))
+            db.flush()
+
+        codes = set(employees) | {code for code, _ in merged}
+        emp_ids = BiometricImportService._resolve_employee_ids(codes, db)
+
+        new_employees = []
+        for code in sorted(codes - set(emp_ids)):
+            emp_ids[code] = str(uuid.uuid4())
+            new_employees.append({
+                "id": emp_ids[code], "emp_code": code, "first_name": employees.get(code, code),
+                "mobile_no": f"999{code[-7:].zfill(7)}", "status": "active", "company_id": "default"
+            })
+        if new_employees:
+            db.bulk_insert_mappings(Employee, new_employees)
+            # Bulk inserts skip mapper events
+            employee_search.invalidate()
+            invalidate_on_commit(db, DEPARTMENT_CACHE)
+
+        existing = BiometricImportService._load_existing(emp_ids, merged, db)
+
+        inserts, updates = [], []
+        for key, row in merged.items():
+            values = {k: v for k, v in row.items() if k != "emp_code"}
+            values["employee_id"] = emp_ids[key[0]]
+            values["source"] = "import"
+            if key in existing:
+                updates.append({"id": existing[key].id, **values})
+            else:
+                inserts.append({"id": str(uuid.uuid4()), **values})
+
+        if updates:
+            db.bulk_update_mappings(AttendanceLog, updates)
+        if inserts:
+            db.bulk_insert_mappings(AttendanceLog, inserts)
+        attendance_rollup.refresh(db, {key[1] for key in merged})
+        db.commit()
+
+        imported_count = len(merged)
+        new_emp_count = len(new_employees)
+        return {
+            "status": "success", "logs_processed": imported_count, "new_employees": new_emp_count,
+            "message": f"Successfully imported {imported_count} records. {new_emp_count} new employees added."
+        }
 
 biometric_service = BiometricImportService()
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("cache")
+
+# Short TTL: invalidation handles writes from this process (or every process, with Redis);
+# the TTL only bounds staleness from writes that bypass the ORM events
+DEFAULT_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "30"))
+
+# Optional shared backend so all workers see the same entries and invalidations
+REDIS_URL = os.getenv("REDIS_URL") or (f"redis://{os.getenv('REDIS_HOST')}:6379/0" if os.getenv("REDIS_HOST") else None)
+REDIS_PREFIX = "attendance:cache"
+REDIS_RETRY_SECONDS = 60
+
+_PENDING_KEY = "cache_invalidate_on_commit"
+
+# Misses for keys sharing a stripe compute one at a time; a fixed set keeps memory flat
+KEY_LOCK_STRIPES = 64
+
+_redis = None
+_redis_failed_at = 0.0
+
+
+def redis_client():
+    """Shared Redis connection, or None when Redis is not configured or was recently unreachable"""
+    global _redis, _redis_failed_at
+    if not REDIS_URL:
+        return None
+    if _redis is not None:
+        return _redis
+    if time.monotonic() - _redis_failed_at < REDIS_RETRY_SECONDS:
+        return None
+    try:
+        import redis
+        client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        client.ping()
+        _redis = client
+        logger.info("Connected to Redis")
+    except Exception as e:
+        _redis_failed_at = time.monotonic()
+        logger.warning(f"Redis unavailable, using in-process fallback: {e}")
+    return _redis
+
+
+def redis_error(e):
+    """Drop the connection after a failed call; redis_client() retries after REDIS_RETRY_SECONDS"""
+    global _redis, _redis_failed_at
+    logger.warning(f"Redis error, using in-process fallback: {e}")
+    _redis = None
+    _redis_failed_at = time.monotonic()
+
+
+class CacheService:
+    """
+    Serialized JSON responses keyed by (namespace, key), with an ETag per entry.
+
+    Each namespace has a generation number that is part of every key;
+    invalidate() bumps it, so all entries of the namespace are dropped at
+    once without scanning. Entries live in-process, or in Redis when
+    REDIS_URL (or REDIS_HOST) is set and reachable.
+    """
+
+    def __init__(self):
+        self._local = {}            # (namespace, generation, key) -> (expires_at, etag, body)
+        self._generations = {}      # namespace -> int (in-process backend)
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+
+    def generation(self, namespace: str) -> int:
+        client = redis_client()
+        if client is not None:
+            try:
+                return int(client.get(f"{REDIS_PREFIX}:gen:{namespace}") or 0)
+            except Exception as e:
+                redis_error(e)
+        return self._generations.get(namespace, 0)
+
+    def invalidate(self, *namespaces):
+        client = redis_client()
+        for namespace in namespaces:
+            with self._lock:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+                # Drop local entries of older generations
+                for k in [k for k in self._local if k[0] == namespace]:
+                    del self._local[k]
+            if client is not None:
+                try:
+                    client.incr(f"{REDIS_PREFIX}:gen:{namespace}")
+                except Exception as e:
+                    redis_error(e)
+
+    def _read(self, full_key):
+        client = redis_client()
+        if client is not None:
+            try:
+                raw = client.get(f"{REDIS_PREFIX}:{full_key[0]}:{full_key[1]}:{full_key[2]}")
+                if raw is None:
+                    return None
+                etag, _, body = raw.partition(b"\n")
+                return etag.decode(), body
+            except Exception as e:
+                redis_error(e)
+        entry = self._local.get(full_key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1], entry[2]
+        return None
+
+    def _write(self, full_key, etag, body, ttl):
+        client = redis_client()
+        if client is not None:
+            try:
+                client.setex(f"{REDIS_PREFIX}:{full_key[0]}:{full_key[1]}:{full_key[2]}", ttl, etag.encode() + b"\n" + body)
+                return
+            except Exception as e:
+                redis_error(e)
+        with self._lock:
+            self._local[full_key] = (time.monotonic() + ttl, etag, body)
+
+    def get_or_compute(self, namespace: str, key: str, compute, ttl: int = DEFAULT_TTL_SECONDS):
+        """
+        Return (etag, json_body) for the entry, calling compute() on a miss.
+        Concurrent misses for the same key in this process compute once.
+        """
+        full_key = (namespace, self.generation(namespace), key)
+        hit = self._read(full_key)
+        if hit:
+            return hit
+
+        key_lock = self._key_locks[hash((namespace, key)) % KEY_LOCK_STRIPES]
+        with key_lock:
+            hit = self._read(full_key)
+            if hit:
+                return hit
+            body = json.dumps(jsonable_encoder(compute()), separators=(",", ":")).encode()
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            self._write(full_key, etag, body, ttl)
+            return etag, body
+
+
+cache = CacheService()
+
+
+def invalidate_on_commit(session: Session, *namespaces):
+    """Invalidate namespaces once session commits (nothing happens on rollback)"""
+    session.info.setdefault(_PENDING_KEY, set()).update(namespaces)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    namespaces = session.info.pop(_PENDING_KEY, None)
+    if namespaces:
+        cache.invalidate(*namespaces)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,135 @@
+import datetime
+import logging
+from sqlalchemy import Date, DateTime, Integer, Numeric, Boolean
+from ..core.database import SessionLocal
+
+logger = logging.getLogger("columnar_export")
+
+# App-written times are IST wall-clock; naive values from SQLite are tagged with this offset.
+# Columns filled by a server default (CURRENT_TIMESTAMP) are UTC instead.
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+
+# Rows per Arrow record batch / Parquet row group
+BATCH_ROWS = 10000
+
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def _pyarrow():
+    """pyarrow is optional; callers turn ImportError into a 503"""
+    import pyarrow
+    import pyarrow.parquet  # noqa: F401  (registers pyarrow.parquet)
+    return pyarrow
+
+
+def arrow_schema(stmt):
+    """Arrow schema derived from the SQLAlchemy types of a select()'s columns"""
+    pa = _pyarrow()
+    fields = []
+    for col in stmt.selected_columns:
+        t = col.type
+        if isinstance(t, DateTime):
+            arrow_type = pa.timestamp("us", tz="+05:30")
+        elif isinstance(t, Date):
+            arrow_type = pa.date32()
+        elif isinstance(t, Numeric) and t.precision is not None:
+            arrow_type = pa.decimal128(t.precision, t.scale or 0)
+        elif isinstance(t, Numeric):
+            arrow_type = pa.float64()
+        elif isinstance(t, Integer):
+            arrow_type = pa.int32()
+        elif isinstance(t, Boolean):
+            arrow_type = pa.bool_()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(col.key, arrow_type))
+    return pa.schema(fields)
+
+
+class _ChunkSink:
+    """Write-only file object whose buffered bytes are drained after each batch"""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _naive_zones(stmt):
+    """Timezone to assume for naive datetimes in each selected column"""
+    return [
+        datetime.timezone.utc if getattr(col, "server_default", None) is not None else IST
+        for col in stmt.selected_columns
+    ]
+
+
+def _record_batch(pa, schema, zones, rows):
+    columns = []
+    for i, field in enumerate(schema):
+        values = [row[i] for row in rows]
+        if pa.types.is_timestamp(field.type):
+            tz = zones[i]
+            values = [v.replace(tzinfo=tz) if v is not None and v.tzinfo is None else v for v in values]
+        columns.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def stream_columnar(stmt, fmt: str = "parquet"):
+    """
+    Yield a Parquet file or Arrow IPC stream for stmt in BATCH_ROWS slices,
+    read through a server-side cursor on a dedicated session.
+    """
+    pa = _pyarrow()
+    schema = arrow_schema(stmt)
+    zones = _naive_zones(stmt)
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt, execution_options={"stream_results": True, "yield_per": BATCH_ROWS})
+        for rows in result.partitions():
+            batch = _record_batch(pa, schema, zones, rows)
+            if fmt == "parquet":
+                writer.write_batch(batch, row_group_size=BATCH_ROWS)
+            else:
+                writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+        writer.close()
+        yield sink.drain()
+    except Exception as e:
+        logger.error(f"Columnar export failed mid-stream: {e}")
+        raise
+    finally:
+        db.close()
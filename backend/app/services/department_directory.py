@@ -0,0 +1,68 @@
+import logging
+from sqlalchemy import select, func, and_, event
+from sqlalchemy.orm import Session, object_session
+from ..models.models import Department, Employee
+from .cache import cache, invalidate_on_commit
+
+logger = logging.getLogger("department_directory")
+
+# Cache namespace for department listings; dropped on any employee or department write
+DEPARTMENT_CACHE = "departments"
+
+
+def _with_counts():
+    """Departments LEFT JOIN active employees, counted in one GROUP BY"""
+    return (
+        select(Department, func.count(Employee.id).label("employee_count"))
+        .outerjoin(Employee, and_(Employee.department == Department.name, Employee.status == "active"))
+        .group_by(Department.id)
+    )
+
+
+class DepartmentDirectoryService:
+    """Departments with their active-employee counts"""
+
+    @staticmethod
+    def list(db: Session, status: str = None):
+        stmt = _with_counts()
+        if status:
+            stmt = stmt.where(Department.status == status)
+        return [{
+            "id": dept.id,
+            "name": dept.name,
+            "description": dept.description,
+            "department_head": dept.department_head,
+            "status": dept.status,
+            "employee_count": employee_count,
+            "created_at": dept.created_at.isoformat() if dept.created_at else None,
+            "updated_at": dept.updated_at.isoformat() if dept.updated_at else None
+        } for dept, employee_count in db.execute(stmt).all()]
+
+    @staticmethod
+    def list_cached(db: Session, status: str = None):
+        """(etag, json body) for list(), served from the cache until employees or departments change"""
+        return cache.get_or_compute(
+            DEPARTMENT_CACHE, f"list:{status or ''}",
+            lambda: DepartmentDirectoryService.list(db, status)
+        )
+
+    @staticmethod
+    def get(db: Session, dept_id: str):
+        """(department, active employee count), or None"""
+        row = db.execute(_with_counts().where(Department.id == dept_id)).first()
+        return (row[0], row[1]) if row else None
+
+
+department_directory = DepartmentDirectoryService()
+
+
+@event.listens_for(Employee, "after_insert")
+@event.listens_for(Employee, "after_update")
+@event.listens_for(Employee, "after_delete")
+@event.listens_for(Department, "after_insert")
+@event.listens_for(Department, "after_update")
+@event.listens_for(Department, "after_delete")
+def _directory_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        invalidate_on_commit(session, DEPARTMENT_CACHE)
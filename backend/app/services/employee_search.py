@@ -0,0 +1,119 @@
+import threading
+import time
+import logging
+from sqlalchemy import select, func, event
+from sqlalchemy.orm import Session
+from ..models.models import Employee
+
+logger = logging.getLogger("employee_search")
+
+# How often the in-memory index re-checks the employees table for changes made by other workers
+INDEX_CHECK_SECONDS = 30
+
+# Trigram postings need at least this many characters; shorter terms scan the (small) name list
+NGRAM = 3
+
+
+def search_expression():
+    """
+    Normalized "first last code" text. Must stay identical to the expression
+    behind ix_employees_search_trgm (migrate_employee_search_index.py) so
+    Postgres can answer LIKE '%term%' from the trigram GIN index.
+    """
+    return func.lower(
+        func.coalesce(Employee.first_name, '') + ' '
+        + func.coalesce(Employee.last_name, '') + ' '
+        + func.coalesce(Employee.emp_code, '')
+    )
+
+
+def normalize(first_name, last_name, emp_code):
+    return f"{first_name or ''} {last_name or ''} {emp_code or ''}".lower()
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class EmployeeSearchService:
+    """Resolves a free-text employee search to employee ids without touching attendance rows"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}       # employee id -> normalized text
+        self._postings = {}    # trigram -> set of employee ids
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._generation = 1      # bumped on every local employee write
+        self._built_generation = 0
+
+    def invalidate(self):
+        """Mark the in-memory index stale; the next search rebuilds it"""
+        self._generation += 1
+
+    def resolve_ids(self, term: str, db: Session):
+        term = (term or "").strip().lower()
+        if not term:
+            return None
+        if db.get_bind().dialect.name == "postgresql":
+            # Served by the pg_trgm GIN index
+            return set(db.execute(
+                select(Employee.id).where(search_expression().contains(term, autoescape=True))
+            ).scalars())
+        return self._search_local(term, db)
+
+    def _search_local(self, term, db):
+        self._refresh_if_stale(db)
+        with self._lock:
+            names, postings = self._names, self._postings
+        if len(term) < NGRAM:
+            return {emp_id for emp_id, text in names.items() if term in text}
+
+        candidates = None
+        for gram in sorted(_ngrams(term), key=lambda g: len(postings.get(g, ()))):
+            ids = postings.get(gram)
+            if not ids:
+                return set()
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        # Trigram hits are candidates only; confirm the full substring
+        return {emp_id for emp_id in candidates if term in names[emp_id]}
+
+    def _refresh_if_stale(self, db):
+        now = time.monotonic()
+        generation = self._generation
+        current = generation == self._built_generation
+        if current and now - self._checked_at < INDEX_CHECK_SECONDS:
+            return
+        # Cheap change check so rows written by other workers are picked up too
+        fingerprint = tuple(db.execute(
+            select(func.count(Employee.id), func.max(Employee.created_at), func.max(Employee.updated_at))
+        ).one())
+        if current and fingerprint == self._fingerprint:
+            self._checked_at = now
+            return
+
+        rows = db.execute(select(Employee.id, Employee.first_name, Employee.last_name, Employee.emp_code)).all()
+        names, postings = {}, {}
+        for emp_id, first_name, last_name, emp_code in rows:
+            text = normalize(first_name, last_name, emp_code)
+            names[emp_id] = text
+            for gram in _ngrams(text):
+                postings.setdefault(gram, set()).add(emp_id)
+        with self._lock:
+            self._names, self._postings = names, postings
+            self._fingerprint = fingerprint
+            self._checked_at = now
+            self._built_generation = generation
+        logger.info(f"Employee search index rebuilt: {len(names)} employees, {len(postings)} trigrams")
+
+
+employee_search = EmployeeSearchService()
+
+
+@event.listens_for(Employee, "after_insert")
+@event.listens_for(Employee, "after_update")
+@event.listens_for(Employee, "after_delete")
+def _employee_changed(mapper, connection, target):
+    employee_search.invalidate()
@@ -0,0 +1,125 @@
+"""
+Face recognition for this process, by deployment role.
+
+APP_ROLE=all (default) runs recognition in-process, as before. APP_ROLE=api
+hands every call to the inference server (app/inference_server.py) at
+FACE_SERVICE_URL, so API workers never load TensorFlow; the inference
+workers are the only ones holding the model.
+
+Either way routes use `face_service` with the same methods and results.
+"""
+import os
+import json
+import socket
+import base64
+import threading
+import http.client
+from urllib.parse import urlparse
+
+# all: recognition in this process | api: delegate to the inference server | inference: the server itself
+APP_ROLE = os.getenv("APP_ROLE", "all").lower()
+# unix:///path/to.sock (same node) or http://host:port
+FACE_SERVICE_URL = os.getenv("FACE_SERVICE_URL", "unix:///tmp/attendance-face.sock")
+FACE_SERVICE_TIMEOUT = float(os.getenv("FACE_SERVICE_TIMEOUT", "30"))
+
+
+class FaceServiceUnavailable(RuntimeError):
+    """The inference server could not be reached or failed the call"""
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class FaceServiceClient:
+    """
+    Same interface as FaceRecognitionService, over HTTP to the inference server.
+    Each thread keeps one keep-alive connection; a connection the server has
+    dropped is replaced and the call retried once.
+    """
+
+    def __init__(self, url: str = FACE_SERVICE_URL, timeout: float = FACE_SERVICE_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _new_connection(self):
+        parsed = urlparse(self.url)
+        if parsed.scheme == "unix":
+            return _UnixHTTPConnection(parsed.path, self.timeout)
+        return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=self.timeout)
+
+    def _call(self, method: str, path: str, payload: dict = None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in (1, 2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self._new_connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise FaceServiceUnavailable(f"Face service at {self.url} unreachable: {e}")
+                continue
+            if response.status != 200:
+                raise FaceServiceUnavailable(f"Face service {path} returned {response.status}: {data[:200]!r}")
+            return json.loads(data)
+
+    @staticmethod
+    def _image(image_path: str):
+        with open(image_path, "rb") as f:
+            return base64.b64encode(f.read()).decode("ascii")
+
+    def get_status(self):
+        return self._call("GET", "/status")
+
+    def verify_liveness(self, image_path: str) -> bool:
+        return self._call("POST", "/liveness", {"image": self._image(image_path)})["live"]
+
+    def register_face(self, image_path: str) -> list:
+        return self._call("POST", "/register", {"image": self._image(image_path)})["embedding"]
+
+    def match_face(self, live_image_path: str, stored_embedding: list):
+        return self._call("POST", "/match", {
+            "image": self._image(live_image_path),
+            "embedding": stored_embedding
+        })
+
+    @staticmethod
+    def _pairs(candidates: dict):
+        # [id, embedding] pairs, not an object: JSON object keys are always strings,
+        # and employee_id must come back with the id's own type
+        return [[candidate_id, embedding] for candidate_id, embedding in candidates.items()]
+
+    def identify_face(self, live_image_path: str, candidates: dict, gallery_version: str = None):
+        image = self._image(live_image_path)
+        if gallery_version is None:
+            return self._call("POST", "/identify", {"image": image, "candidates": self._pairs(candidates)})
+        # The server keeps galleries by version: send the embeddings only when it lacks this one
+        result = self._call("POST", "/identify", {"image": image, "gallery": gallery_version})
+        if result.get("gallery_missing"):
+            self._call("POST", "/gallery", {"version": gallery_version, "candidates": self._pairs(candidates)})
+            result = self._call("POST", "/identify", {"image": image, "gallery": gallery_version})
+            if result.get("gallery_missing"):
+                # Another worker's upload replaced it in between; fall back to sending it inline
+                result = self._call("POST", "/identify", {"image": image, "candidates": self._pairs(candidates)})
+        return result
+
+
+if APP_ROLE == "api":
+    face_service = FaceServiceClient()
+else:
+    from .face_recognition import face_service
@@ -0,0 +1,72 @@
+import json
+import logging
+import threading
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from ..models.models import Employee
+
+logger = logging.getLogger("face_gallery")
+
+
+def _version_stmt():
+    """One row that changes whenever a registered face is added, replaced or removed"""
+    return select(
+        func.count(Employee.id),
+        func.max(Employee.created_at),
+        func.max(Employee.updated_at),
+        func.coalesce(func.sum(func.length(Employee.face_encoding_ref)), 0),
+    ).where(Employee.is_face_registered == True)
+
+
+def _rows_stmt():
+    return select(Employee.id, Employee.face_encoding_ref).where(Employee.is_face_registered == True)
+
+
+class FaceGalleryService:
+    """
+    Registered face embeddings for 1:N identification, with a version string.
+
+    A scan only asks the database for the version (one aggregate row); the
+    embeddings are re-read and decoded when it changes. The version also
+    lets the inference server keep its own copy of the gallery, so a scan
+    sends the version instead of every embedding.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._candidates = {}
+
+    @staticmethod
+    def _version_of(row):
+        return ":".join(str(value) for value in row)
+
+    def _install(self, version, rows):
+        candidates = {candidate_id: json.loads(encoding) for candidate_id, encoding in rows if encoding}
+        with self._lock:
+            self._version, self._candidates = version, candidates
+        logger.info(f"Face gallery loaded: {len(candidates)} faces (version {version})")
+        return version, candidates
+
+    def _cached(self, version):
+        with self._lock:
+            return self._candidates if version == self._version else None
+
+    def load(self, db: Session):
+        """(version, {employee_id: embedding}) for the current registrations"""
+        version = self._version_of(db.execute(_version_stmt()).one())
+        candidates = self._cached(version)
+        if candidates is not None:
+            return version, candidates
+        return self._install(version, db.execute(_rows_stmt()).all())
+
+    async def load_async(self, adb):
+        """load() on an AsyncSession"""
+        version = self._version_of((await adb.execute(_version_stmt())).one())
+        candidates = self._cached(version)
+        if candidates is not None:
+            return version, candidates
+        return self._install(version, (await adb.execute(_rows_stmt())).all())
+
+
+face_gallery = FaceGalleryService()
@@ -1,52 +1,90 @@
 import sys
 import os
-
-# Defensive imports
-try:
-    import cv2
-    import numpy as np
-    from scipy.spatial.distance import cosine
-except ImportError as e:
-    print(f"CRITICAL DEPENDENCY MISSING: {e}")
-    cv2 = None
-    np = None
-    cosine = None
-
-try:
-    from deepface import DeepFace
-    deepface_error = None
-except Exception as e:
-    DeepFace = None
-    deepface_error = str(e)
-    print(f"DeepFace failed to load: {e}")
-    import traceback
-    traceback.print_exc()
+import logging
+import threading
+from ..core.metrics import FACE_STAGE
+
+logger = logging.getLogger("face_recognition")
+
+# cv2 / numpy / scipy / DeepFace (TensorFlow) are imported on first use, not at
+# module load, so workers and scripts that never scan a face boot without them.
+cv2 = None
+np = None
+cosine = None
+DeepFace = None
+deepface_error = None
+_loaded = False
+_load_lock = threading.Lock()
 
 # Configuration
 THRESHOLD = 0.40
 MODEL_NAME = "VGG-Face"
+# Load the libraries and model weights at startup instead of on the first scan
+FACE_PRELOAD = os.getenv("FACE_PRELOAD", "false").lower() == "true"
+
+
+def _load_dependencies():
+    global cv2, np, cosine, DeepFace, deepface_error, _loaded
+    with _load_lock:
+        if _loaded:
+            return
+        # Defensive imports
+        try:
+            import cv2 as _cv2
+            import numpy as _np
+            from scipy.spatial.distance import cosine as _cosine
+            cv2, np, cosine = _cv2, _np, _cosine
+        except ImportError as e:
+            logger.critical(f"Dependency missing: {e}")
+
+        try:
+            from deepface import DeepFace as _DeepFace
+            DeepFace = _DeepFace
+        except Exception as e:
+            deepface_error = str(e)
+            logger.exception("DeepFace failed to load")
+        _loaded = True
 
 class FaceRecognitionService:
     def __init__(self):
         # Force mock mode if dependencies are missing OR env var is set
         self.mock_mode = False
         self.init_error = None
+        self._ready = False
         
         if os.getenv("FORCE_MOCK_MODE", "false").lower() == "true":
              self.mock_mode = True
              self.init_error = "Mock Mode forced by Environment Variable."
-             print("⚠️ MOCK MODE ENABLED via FORCE_MOCK_MODE env var")
-        
+             logger.warning("Mock mode enabled via FORCE_MOCK_MODE")
+             self._ready = True  # Nothing to load
+
+    def _ensure_loaded(self):
+        """Import the recognition stack on first use and settle mock mode"""
+        if self._ready:
+            return
+        _load_dependencies()
         if cv2 is None or np is None:
             self.init_error = "Core dependencies (cv2, numpy) missing."
-            print(self.init_error)
+            logger.error(self.init_error)
             self.mock_mode = True
         
         if not DeepFace:
              self.init_error = "DeepFace library not loaded."
              self.mock_mode = True
+        self._ready = True
+
+    def preload(self):
+        """Load libraries and build the model now so the first scan is not slow"""
+        self._ensure_loaded()
+        if not self.mock_mode and DeepFace:
+            try:
+                DeepFace.build_model(MODEL_NAME)
+                logger.info(f"Face model {MODEL_NAME} loaded")
+            except Exception:
+                logger.exception("Could not preload face model")
 
     def get_status(self):
+        self._ensure_loaded()
         return {
             "mock_mode": self.mock_mode,
             "error": self.init_error,
@@ -65,16 +103,19 @@ class FaceRecognitionService:
         # But we force mocked for now based on user issues
         
     def verify_liveness(self, image_path: str) -> bool:
+        self._ensure_loaded()
         if self.mock_mode or cv2 is None:
             return True # Pass through in mock mode
             
         try:
-            frame = cv2.imread(image_path)
-            if frame is None:
-                return False
+            with FACE_STAGE.time(stage="decode"):
+                frame = cv2.imread(image_path)
+                if frame is None:
+                    return False
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+            with FACE_STAGE.time(stage="liveness"):
+                variance = cv2.Laplacian(gray, cv2.CV_64F).var()
             
             if variance < 100: 
                 return False
@@ -83,8 +124,9 @@ class FaceRecognitionService:
             return False
 
     def register_face(self, image_path: str) -> list:
+        self._ensure_loaded()
         if self.mock_mode:
-            print("Warning: Running in MOCK MODE (Face Recognition disabled).")
+            logger.debug("Mock mode: returning a dummy embedding")
             # Return dummy 512-d vector
             return [0.1] * 512
 
@@ -93,18 +135,20 @@ class FaceRecognitionService:
                 pass 
 
             if DeepFace:
-                embedding_objs = DeepFace.represent(img_path=image_path, model_name=MODEL_NAME)
+                with FACE_STAGE.time(stage="embed"):
+                    embedding_objs = DeepFace.represent(img_path=image_path, model_name=MODEL_NAME)
                 if not embedding_objs:
                     return None
                 return embedding_objs[0]["embedding"]
             else:
                 return [0.1] * 512
         except Exception as e:
-            print(f"Error registering face: {e}")
+            logger.error(f"Error registering face: {e}", exc_info=True)
             self.mock_mode = True
             return [0.1] * 512
 
     def match_face(self, live_image_path: str, stored_embedding: list):
+        self._ensure_loaded()
         if self.mock_mode:
             return {"match": True, "confidence": 0.95}
 
@@ -112,17 +156,19 @@ class FaceRecognitionService:
             if not DeepFace:
                  return {"match": True, "confidence": 0.90, "reason": "Mocked match due to missing DeepFace"}
 
-            live_objs = DeepFace.represent(img_path=live_image_path, model_name=MODEL_NAME, enforce_detection=True)
+            with FACE_STAGE.time(stage="embed"):
+                live_objs = DeepFace.represent(img_path=live_image_path, model_name=MODEL_NAME, enforce_detection=True)
             if not live_objs:
                 return {"match": False, "reason": "No face detected"}
             
             live_embedding = live_objs[0]["embedding"]
 
             # 2. Compare using Cosine Distance
-            if cosine:
-                score = cosine(live_embedding, stored_embedding)
-            else:
-                score = 0 # fallback
+            with FACE_STAGE.time(stage="search"):
+                if cosine:
+                    score = cosine(live_embedding, stored_embedding)
+                else:
+                    score = 0 # fallback
             
             if score < THRESHOLD:
                 return {"match": True, "confidence": 1 - score}
@@ -130,28 +176,31 @@ class FaceRecognitionService:
                 return {"match": False, "confidence": 1 - score, "reason": "Low similarity"}
 
         except Exception as e:
-            print(f"Error matching face: {e}")
+            logger.error(f"Error matching face: {e}", exc_info=True)
             self.mock_mode = True
             return {"match": True, "confidence": 0.90, "reason": "Mocked match due to error"}
 
-    def identify_face(self, live_image_path: str, candidates: dict):
+    def identify_face(self, live_image_path: str, candidates: dict, gallery_version: str = None):
         """
         1:N Matching.
         kandidates: dict of {employee_id: embedding_list}
+        gallery_version: unused here; lets the inference client send the version instead of the gallery
         Returns: {match: bool, employee_id: str|None, confidence: float}
         """
+        self._ensure_loaded()
         if self.mock_mode:
             # In mock mode, randomly select a candidate to simulate face matching
             if not candidates:
                  return {"match": False, "reason": "No candidates provided"}
             
-            # Use a simple hash of the image path to consistently pick the same person for the same image
+            # Hash the image bytes (the temp path is unique per request) so the same image picks the same person
             import hashlib
-            image_hash = int(hashlib.md5(live_image_path.encode()).hexdigest(), 16)
-            candidate_list = list(candidates.keys())
+            with open(live_image_path, "rb") as image:
+                image_hash = int(hashlib.md5(image.read()).hexdigest(), 16)
+            candidate_list = sorted(candidates.keys(), key=str)
             selected_id = candidate_list[image_hash % len(candidate_list)]
             
-            print(f"🎭 MOCK MODE: Auto-detected employee from {len(candidates)} candidates")
+            logger.debug(f"Mock mode: auto-detected employee from {len(candidates)} candidates")
             return {"match": True, "employee_id": selected_id, "confidence": 0.92}
 
         try:
@@ -159,7 +208,8 @@ class FaceRecognitionService:
                  return {"match": True, "employee_id": next(iter(candidates)), "confidence": 0.90}
 
             # Generate embedding for live face
-            live_objs = DeepFace.represent(img_path=live_image_path, model_name=MODEL_NAME, enforce_detection=True)
+            with FACE_STAGE.time(stage="embed"):
+                live_objs = DeepFace.represent(img_path=live_image_path, model_name=MODEL_NAME, enforce_detection=True)
             if not live_objs:
                 return {"match": False, "reason": "No face detected"}
             
@@ -168,17 +218,18 @@ class FaceRecognitionService:
             best_score = 1.0 # Cosine distance (lower is better, 0 is exact)
             best_id = None
             
-            for emp_id, stored_emb in candidates.items():
-                if not stored_emb: continue
-                
-                if cosine:
-                    score = cosine(live_embedding, stored_emb)
-                else:
-                    score = 1 # fail safe
-                
-                if score < best_score:
-                    best_score = score
-                    best_id = emp_id
+            with FACE_STAGE.time(stage="search"):
+                for emp_id, stored_emb in candidates.items():
+                    if not stored_emb: continue
+                    
+                    if cosine:
+                        score = cosine(live_embedding, stored_emb)
+                    else:
+                        score = 1 # fail safe
+                    
+                    if score < best_score:
+                        best_score = score
+                        best_id = emp_id
             
             if best_score < THRESHOLD:
                 return {"match": True, "employee_id": best_id, "confidence": 1 - best_score}
@@ -186,7 +237,7 @@ class FaceRecognitionService:
                 return {"match": False, "reason": "No close match found among registered employees"}
 
         except Exception as e:
-            print(f"Error identifying face: {e}")
+            logger.error(f"Error identifying face: {e}", exc_info=True)
             return {"match": False, "reason": f"System Error: {str(e)}"}
 
 # Singleton instance
@@ -0,0 +1,124 @@
+import json
+import asyncio
+import logging
+from .cache import REDIS_URL, redis_client, redis_error
+
+logger = logging.getLogger("live_events")
+
+REDIS_CHANNEL = "attendance:live"
+
+# Events buffered per subscriber; a client that falls further behind loses the oldest ones
+QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+
+
+class LiveEventHub:
+    """
+    In-process pub/sub for dashboard subscribers (GET /dashboard/live).
+
+    Without Redis, publish() delivers straight to this worker's subscribers.
+    With Redis, publish() goes to a channel and every worker relays the
+    channel to its own subscribers, so a check-in handled by one uvicorn
+    worker reaches dashboards connected to any of them.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._loop = None
+        self._listener = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._loop = asyncio.get_running_loop()
+        self._subscribers.add(queue)
+        if REDIS_URL and (self._listener is None or self._listener.done()):
+            self._listener = self._loop.create_task(self._relay_redis())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def has_audience(self) -> bool:
+        """Whether an event could reach anyone: a subscriber here, or other workers through Redis"""
+        return bool(self._subscribers) or bool(REDIS_URL)
+
+    def _deliver(self, message: str):
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def _deliver_local(self, message: str):
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(message)
+        else:
+            # Called from a threadpool endpoint
+            loop.call_soon_threadsafe(self._deliver, message)
+
+    def publish(self, event_type: str, data: dict):
+        """Send an event to every dashboard subscriber; never raises. Blocks on Redis: keep off the event loop."""
+        try:
+            message = json.dumps({"type": event_type, **data}, default=str)
+        except Exception as e:
+            logger.error(f"Could not serialize live event {event_type}: {e}")
+            return
+        client = redis_client()
+        if client is not None:
+            try:
+                client.publish(REDIS_CHANNEL, message)
+                return
+            except Exception as e:
+                redis_error(e)
+        self._deliver_local(message)
+
+    async def _relay_redis(self):
+        import redis.asyncio as aioredis
+        while self._subscribers:
+            try:
+                client = aioredis.from_url(REDIS_URL)
+                pubsub = client.pubsub()
+                await pubsub.subscribe(REDIS_CHANNEL)
+                try:
+                    while self._subscribers:
+                        msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=KEEPALIVE_SECONDS)
+                        if msg and msg["type"] == "message":
+                            self._deliver(msg["data"].decode())
+                finally:
+                    await pubsub.aclose()
+                    await client.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis live relay failed, retrying: {e}")
+                await asyncio.sleep(5)
+
+    async def stream(self, request):
+        """text/event-stream body for one subscriber; ends when the client disconnects"""
+        queue = self.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                    yield f"event: attendance\ndata: {message}\n\n"
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+
+live_events = LiveEventHub()
@@ -0,0 +1,131 @@
+import datetime
+import logging
+from sqlalchemy import select, update, insert, inspect, exists, and_, or_, case, func
+from sqlalchemy.orm import Session
+from ..models.models import EmployeeLoan, LoanPayment
+from ..core.partitioning import month_range
+
+logger = logging.getLogger("loan_ledger")
+
+# Loan ids per UPDATE ... WHERE id IN (...) when decrementing balances
+UPDATE_BATCH_SIZE = 5000
+
+
+# Per database URL: whether loan_payments has the (loan_id, month, year) unique index
+_unique_index = {}
+
+
+def _has_unique_index(db: Session) -> bool:
+    """
+    ON CONFLICT needs the unique index to exist. create_all does not add it
+    to an existing table (migrate_loan_payment_unique.py does), so check once.
+    """
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _unique_index:
+        inspector = inspect(bind)
+        wanted = ["loan_id", "month", "year"]
+        found = any(idx.get("unique") and idx["column_names"] == wanted for idx in inspector.get_indexes("loan_payments"))
+        found = found or any(uc["column_names"] == wanted for uc in inspector.get_unique_constraints("loan_payments"))
+        if not found:
+            logger.warning("loan_payments has no unique (loan_id, month, year) index; "
+                           "run migrate_loan_payment_unique.py. Posting EMIs without conflict protection.")
+        _unique_index[key] = found
+    return _unique_index[key]
+
+
+def _dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+class LoanLedgerService:
+    """
+    Posts monthly EMI payments for a payroll run as one set-based stage.
+
+    post_month() records the month's EMI for every due active loan, at most
+    once per (loan_id, month, year) (enforced by a unique constraint), and
+    decrements balances only for the payments it actually inserted, so
+    re-running a draft payroll posts nothing twice. Payroll then reads the
+    month's deduction per employee from deductions().
+    """
+
+    @staticmethod
+    def post_month(db: Session, month: int, year: int, employee_ids=None, payment_date: datetime.date = None):
+        """Post this month's EMIs; returns the number of loans newly charged"""
+        _, month_end = month_range(year, month)
+        already_paid = exists().where(and_(
+            LoanPayment.loan_id == EmployeeLoan.id,
+            LoanPayment.month == month,
+            LoanPayment.year == year
+        ))
+        due = select(EmployeeLoan.id, EmployeeLoan.employee_id, EmployeeLoan.emi_amount).where(
+            EmployeeLoan.status == "active",
+            # Loans recorded without a start date have always been charged from their first payroll
+            or_(EmployeeLoan.start_date.is_(None), EmployeeLoan.start_date < month_end),
+            ~already_paid
+        )
+        if employee_ids is not None:
+            employee_ids = list(employee_ids)
+            if not employee_ids:
+                return 0
+            due = due.where(EmployeeLoan.employee_id.in_(employee_ids))
+
+        payment_date = payment_date or datetime.date.today()
+        rows = [{
+            "loan_id": loan_id,
+            "employee_id": employee_id,
+            "payment_date": payment_date,
+            "amount": emi_amount,
+            "month": month,
+            "year": year,
+            "status": "paid"
+        } for loan_id, employee_id, emi_amount in db.execute(due)]
+        if not rows:
+            return 0
+
+        if _has_unique_index(db):
+            # A concurrent run may have posted some of these; RETURNING gives only our inserts
+            stmt = _dialect_insert(db)(LoanPayment.__table__).on_conflict_do_nothing(
+                index_elements=["loan_id", "month", "year"]
+            ).returning(LoanPayment.loan_id)
+            posted = list(db.execute(stmt, rows).scalars())
+        else:
+            # Not yet migrated: `due` already excludes loans paid this month (no guard against a concurrent run)
+            db.execute(insert(LoanPayment.__table__), rows)
+            posted = [row["loan_id"] for row in rows]
+
+        remaining = EmployeeLoan.remaining_emis
+        for i in range(0, len(posted), UPDATE_BATCH_SIZE):
+            db.execute(
+                update(EmployeeLoan)
+                .where(EmployeeLoan.id.in_(posted[i:i + UPDATE_BATCH_SIZE]))
+                .values(
+                    remaining_emis=case((remaining > 1, remaining - 1), else_=0),
+                    status=case((remaining <= 1, "completed"), else_=EmployeeLoan.status)
+                )
+                .execution_options(synchronize_session=False)
+            )
+        logger.info(f"Posted {len(posted)} loan EMIs for {month:02d}/{year}")
+        return len(posted)
+
+    @staticmethod
+    def deductions(db: Session, month: int, year: int, employee_ids=None):
+        """{employee_id: total EMI posted for the month}"""
+        stmt = select(LoanPayment.employee_id, func.sum(LoanPayment.amount)).where(
+            LoanPayment.month == month,
+            LoanPayment.year == year,
+            LoanPayment.status == "paid"
+        ).group_by(LoanPayment.employee_id)
+        if employee_ids is not None:
+            employee_ids = list(employee_ids)
+            if not employee_ids:
+                return {}
+            stmt = stmt.where(LoanPayment.employee_id.in_(employee_ids))
+        return {employee_id: float(total or 0) for employee_id, total in db.execute(stmt)}
+
+
+loan_ledger = LoanLedgerService()
@@ -0,0 +1,204 @@
+import os
+import json
+import asyncio
+import datetime
+import logging
+import threading
+from sqlalchemy import select, event
+from sqlalchemy.orm import Session
+from ..core.database import SessionLocal
+from ..models.models import AttendanceLog
+from .cache import redis_client, redis_error
+from .time_format import IST, format_clock
+
+logger = logging.getLogger("presence")
+
+REDIS_PREFIX = "attendance:presence"
+# Keep yesterday's map around briefly for requests that straddle midnight
+REDIS_TTL_SECONDS = 36 * 3600
+_WARM_FIELD = "__warm__"
+# A single API worker sees every punch, edit and delete, so its own map can be trusted
+# like the shared one; with several workers (and no Redis) an entry is only a hint
+LOCAL_MAP_TRUSTED = int(os.getenv("API_WORKERS", "1")) <= 1
+
+
+class PresenceService:
+    """
+    Today's check-in/check-out state per employee, so repeat punches at the
+    terminal are rejected without an attendance_logs lookup.
+
+    Only positive knowledge is used: an entry means the employee has
+    checked in (and possibly out) today. A missing entry falls back to the
+    database, so writes that bypass this map (bulk imports, device punches)
+    can only cause an extra query. Edits and deletes of a log drop its entry.
+
+    The map lives in Redis when configured, shared by all workers, and its
+    entries are trusted. Otherwise each worker keeps its own copy. With one
+    worker (API_WORKERS=1) that copy sees every write and is trusted too.
+    With several it misses other workers' edits and deletes, so an entry is
+    only a hint: it is re-checked against the log row before a punch is
+    rejected, and that one query stands in for the lookup the caller would
+    otherwise make. Bulk deletes bypass the mapper events and call
+    forget()/warm() themselves.
+
+    Redis calls block: async callers run shared_state/record/forget in the
+    threadpool and local_state on their session (AsyncSession.run_sync).
+    """
+
+    def __init__(self):
+        self._day = None
+        self._entries = {}    # employee_id -> {"check_in": label, "check_out": label|None}
+        self._lock = threading.Lock()
+        self._task = None
+
+    @staticmethod
+    def today():
+        return datetime.datetime.now(IST).date()
+
+    def _key(self, day):
+        return f"{REDIS_PREFIX}:{day.isoformat()}"
+
+    def _load(self, db: Session, day: datetime.date):
+        """The whole day's state from one query, installed as this worker's map"""
+        rows = db.execute(
+            select(AttendanceLog.employee_id, AttendanceLog.check_in, AttendanceLog.check_out)
+            .where(AttendanceLog.date == day)
+        ).all()
+        entries = {
+            emp_id: {"check_in": format_clock(check_in, "--:--"), "check_out": format_clock(check_out)}
+            for emp_id, check_in, check_out in rows
+        }
+        with self._lock:
+            self._day, self._entries = day, entries
+        return entries
+
+    def warm(self, db: Session, day: datetime.date = None):
+        """Load the whole day's state and publish it to Redis when configured"""
+        day = day or self.today()
+        entries = self._load(db, day)
+        client = redis_client()
+        if client is not None:
+            try:
+                key = self._key(day)
+                pipe = client.pipeline()
+                pipe.delete(key)
+                mapping = {emp_id: json.dumps(state) for emp_id, state in entries.items()}
+                mapping[_WARM_FIELD] = "1"
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, REDIS_TTL_SECONDS)
+                pipe.execute()
+            except Exception as e:
+                redis_error(e)
+        logger.info(f"Presence map warmed for {day}: {len(entries)} employees")
+        return len(entries)
+
+    def shared_state(self, employee_id: str, day: datetime.date):
+        """(True, state or None) when the shared Redis map can answer, else (False, None)"""
+        client = redis_client()
+        if client is not None:
+            try:
+                state, warm = client.hmget(self._key(day), [employee_id, _WARM_FIELD])
+                if state is not None:
+                    return True, json.loads(state)
+                if warm is not None:
+                    return True, None
+            except Exception as e:
+                redis_error(e)
+        return False, None
+
+    def local_state(self, db: Session, employee_id: str, day: datetime.date):
+        """This worker's state for employee_id (confirmed against the log row unless trusted); no Redis calls"""
+        if self._day != day:
+            # First punch of a new day on this worker
+            self._load(db, day)
+        state = self._entries.get(employee_id)
+        if state is None or LOCAL_MAP_TRUSTED:
+            return state
+        row = db.execute(
+            select(AttendanceLog.check_in, AttendanceLog.check_out).where(
+                AttendanceLog.employee_id == employee_id,
+                AttendanceLog.date == day
+            ).limit(1)
+        ).first()
+        with self._lock:
+            if row is None:
+                # Deleted by another worker or a bulk delete
+                if self._day == day:
+                    self._entries.pop(employee_id, None)
+                return None
+            state = {"check_in": format_clock(row.check_in, "--:--"), "check_out": format_clock(row.check_out)}
+            if self._day == day:
+                self._entries[employee_id] = state
+        return state
+
+    def get(self, db: Session, employee_id: str, day: datetime.date):
+        """State for employee_id on day, or None when the database has to be asked"""
+        known, state = self.shared_state(employee_id, day)
+        if known:
+            return state
+        return self.local_state(db, employee_id, day)
+
+    def record(self, employee_id: str, day: datetime.date, check_in=None, check_out=None):
+        """Remember a committed check-in/check-out"""
+        state = {"check_in": format_clock(check_in, "--:--"), "check_out": format_clock(check_out)}
+        client = redis_client()
+        if client is not None:
+            try:
+                key = self._key(day)
+                pipe = client.pipeline()
+                pipe.hset(key, employee_id, json.dumps(state))
+                pipe.expire(key, REDIS_TTL_SECONDS)
+                pipe.execute()
+            except Exception as e:
+                redis_error(e)
+        with self._lock:
+            if self._day == day:
+                self._entries[employee_id] = state
+
+    def forget(self, employee_id: str, day: datetime.date):
+        client = redis_client()
+        if client is not None:
+            try:
+                client.hdel(self._key(day), employee_id)
+            except Exception as e:
+                redis_error(e)
+        with self._lock:
+            if self._day == day:
+                self._entries.pop(employee_id, None)
+
+    def warm_today(self):
+        db = SessionLocal()
+        try:
+            return self.warm(db)
+        finally:
+            db.close()
+
+    async def _rewarm_at_midnight(self):
+        while True:
+            now = datetime.datetime.now(IST)
+            midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(), IST)
+            await asyncio.sleep((midnight - now).total_seconds() + 1)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.warm_today)
+            except Exception as e:
+                logger.error(f"Midnight presence warm failed: {e}")
+
+    def start(self):
+        """Rebuild the map as each IST day starts (call from the running event loop)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._rewarm_at_midnight())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+presence = PresenceService()
+
+
+@event.listens_for(AttendanceLog, "after_update")
+@event.listens_for(AttendanceLog, "after_delete")
+def _log_changed(mapper, connection, target):
+    if target.employee_id and target.date:
+        presence.forget(target.employee_id, target.date)
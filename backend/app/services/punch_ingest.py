@@ -0,0 +1,313 @@
+import csv
+import datetime
+import hashlib
+import io
+import json
+import uuid
+import logging
+from sqlalchemy import select, update, insert, exists, and_, or_, case, cast, func, literal, String
+from sqlalchemy.orm import Session
+from ..models.models import Employee, AttendanceLog, PunchEvent
+from .attendance_rollup import attendance_rollup
+
+logger = logging.getLogger("punch_ingest")
+
+# Devices report site wall-clock time
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+
+# Same rules as face checkout: 30 min tiffin break, 8h standard day, OT in 2h slots capped at 4h
+BREAK_DEDUCTION_HOURS = 0.5
+STANDARD_WORK_HOURS = 8.0
+
+# Log sources a device punch never overwrites: sheet imports and admin edits
+PROTECTED_SOURCES = ("manual", "import")
+
+# Rows per executemany round-trip when appending events
+INSERT_BATCH_SIZE = 5000
+
+# Only the first few malformed records are echoed back to the device
+MAX_REPORTED_ERRORS = 20
+
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 string or epoch seconds; naive values are site (IST) time"""
+    if value is None or value == "":
+        raise ValueError("missing timestamp")
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, tz=IST)
+    s = str(value).strip()
+    try:
+        return datetime.datetime.fromtimestamp(float(s), tz=IST)
+    except ValueError:
+        pass
+    ts = datetime.datetime.fromisoformat(s)
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=IST)
+    return ts.astimezone(IST)
+
+
+def parse_punch_payload(body: bytes):
+    """
+    Decode a device batch. Accepts a JSON array, JSON lines, or CSV with a
+    header row of device_id,emp_code,timestamp[,idempotency_key].
+    Returns (records, errors) where errors are (record number, reason).
+    """
+    text = body.decode("utf-8-sig").strip()
+    if not text:
+        return [], []
+
+    if text.startswith("["):
+        raw = json.loads(text)
+        if not isinstance(raw, list):
+            raise ValueError("JSON payload must be an array of punch objects")
+    elif text.startswith("{"):
+        raw = []
+        for n, line in enumerate(text.splitlines(), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                raw.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raw.append(ValueError(f"invalid JSON on line {n}: {e.msg}"))
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        fields = {f.strip().lower() for f in (reader.fieldnames or [])}
+        if not {"device_id", "emp_code", "timestamp"} <= fields:
+            raise ValueError("CSV header must include device_id, emp_code, timestamp")
+        raw = [{(k or "").strip().lower(): v for k, v in row.items()} for row in reader]
+
+    records, errors = [], []
+    for n, item in enumerate(raw, start=1):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            if not isinstance(item, dict):
+                raise ValueError("punch must be an object")
+            device_id = str(item.get("device_id") or "").strip()
+            emp_code = str(item.get("emp_code") or "").strip()
+            if not device_id or not emp_code:
+                raise ValueError("device_id and emp_code are required")
+            punched_at = parse_timestamp(item.get("timestamp"))
+            key = str(item.get("idempotency_key") or "").strip()
+            if not key:
+                # Replays of the same punch from the same device collapse to one event
+                key = hashlib.sha1(f"{device_id}|{emp_code}|{punched_at.isoformat()}".encode()).hexdigest()
+            records.append({
+                "idempotency_key": key,
+                "device_id": device_id,
+                "emp_code": emp_code,
+                "punched_at": punched_at,
+                "punch_date": punched_at.date(),
+            })
+        except (ValueError, TypeError, OverflowError, OSError) as e:
+            errors.append((n, str(e)))
+    return records, errors
+
+
+def compute_work_hours(check_in, check_out, day):
+    """Net hours and OT split for one employee-day, mirroring face checkout"""
+    if not check_in or not check_out:
+        return {"total_hours_worked": 0.0, "ot_hours": 0.0, "ot_weekend_hours": 0.0}
+    if check_in.tzinfo is None:
+        check_in = check_in.replace(tzinfo=IST)
+    if check_out.tzinfo is None:
+        check_out = check_out.replace(tzinfo=IST)
+
+    raw_hours = (check_out - check_in).total_seconds() / 3600
+    net_hours = round(max(0, raw_hours - BREAK_DEDUCTION_HOURS), 2)
+
+    if day.weekday() >= 5:
+        return {"total_hours_worked": net_hours, "ot_hours": 0.0, "ot_weekend_hours": net_hours}
+
+    ot = 0.0
+    if net_hours > STANDARD_WORK_HOURS:
+        raw_ot = net_hours - STANDARD_WORK_HOURS
+        if raw_ot >= 4.0:
+            ot = 4.0
+        elif raw_ot >= 2.0:
+            ot = 2.0
+    return {"total_hours_worked": net_hours, "ot_hours": ot, "ot_weekend_hours": 0.0}
+
+
+def _dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def _new_id_expr(db: Session):
+    """Server-side id for rows created by INSERT ... SELECT"""
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.gen_random_uuid(), String)
+    return func.lower(func.hex(func.randomblob(16)))
+
+
+class PunchIngestService:
+    @staticmethod
+    def ingest(body: bytes, db: Session):
+        """
+        Append a batch of raw device punches and fold them into AttendanceLog.
+        Events are keyed by idempotency_key so device retries are harmless.
+        Punches for unknown or inactive employee codes are stored but not
+        folded; they are counted in "unfolded" and listed by code.
+        """
+        records, errors = parse_punch_payload(body)
+        received = len(records) + len(errors)
+        result = {
+            "received": received,
+            "accepted": 0,
+            "duplicates": 0,
+            "rejected": len(errors),
+            "errors": [{"record": n, "error": msg} for n, msg in errors[:MAX_REPORTED_ERRORS]],
+            "unfolded": 0,
+            "unknown_employees": [],
+            "inactive_employees": [],
+            "days_updated": 0,
+        }
+        if not records:
+            return result
+
+        batch_id = uuid.uuid4().hex
+        for r in records:
+            r["batch_id"] = batch_id
+
+        dialect_insert = _dialect_insert(db)
+        stmt = dialect_insert(PunchEvent.__table__).on_conflict_do_nothing(index_elements=["idempotency_key"])
+        for i in range(0, len(records), INSERT_BATCH_SIZE):
+            db.execute(stmt, records[i:i + INSERT_BATCH_SIZE])
+
+        accepted = db.execute(
+            select(func.count()).select_from(PunchEvent).where(PunchEvent.batch_id == batch_id)
+        ).scalar()
+        result["accepted"] = accepted
+        result["duplicates"] = len(records) - accepted
+
+        if accepted:
+            # Per code in the batch: events, matching employees, and whether any of them is active
+            per_code = db.execute(
+                select(
+                    PunchEvent.emp_code,
+                    func.count(PunchEvent.id.distinct()),
+                    func.count(Employee.id),
+                    func.max(case((Employee.status == "active", 1), else_=0)),
+                )
+                .outerjoin(Employee, Employee.emp_code == PunchEvent.emp_code)
+                .where(PunchEvent.batch_id == batch_id)
+                .group_by(PunchEvent.emp_code)
+            ).all()
+            for code, events, employees, active in per_code:
+                if active:
+                    continue
+                result["unfolded"] += events
+                result["unknown_employees" if not employees else "inactive_employees"].append(code)
+            result["unknown_employees"].sort()
+            result["inactive_employees"].sort()
+            result["days_updated"] = PunchIngestService.fold_batch(batch_id, db)
+
+        db.commit()
+        logger.info(f"Punch batch {batch_id}: {result['accepted']}/{received} accepted, "
+                    f"{result['unfolded']} unfolded, {result['days_updated']} employee-days folded")
+        return result
+
+    @staticmethod
+    def fold_batch(batch_id: str, db: Session):
+        """
+        Fold every event for the employee-days touched by a batch into
+        AttendanceLog as first-in/last-out. Re-aggregating the whole day keeps
+        late or out-of-order deliveries correct. Logs with a source in
+        PROTECTED_SOURCES are not changed. Returns employee-days whose log
+        was created or had its times moved.
+        """
+        touched = (
+            select(PunchEvent.emp_code, PunchEvent.punch_date)
+            .where(PunchEvent.batch_id == batch_id)
+            .distinct()
+            .subquery()
+        )
+        day = (
+            select(
+                Employee.id.label("employee_id"),
+                PunchEvent.punch_date.label("punch_date"),
+                func.min(PunchEvent.punched_at).label("first_punch"),
+                func.max(PunchEvent.punched_at).label("last_punch"),
+            )
+            .select_from(touched)
+            .join(PunchEvent, and_(PunchEvent.emp_code == touched.c.emp_code,
+                                   PunchEvent.punch_date == touched.c.punch_date))
+            .join(Employee, Employee.emp_code == PunchEvent.emp_code)
+            .where(Employee.status == "active")
+            .group_by(Employee.id, PunchEvent.punch_date)
+            .subquery()
+        )
+
+        # Merge with what kiosk scans already recorded for the day; imported and
+        # admin-edited logs are authoritative and left as they are
+        log = AttendanceLog
+        touched_logs = (
+            select(log.id, log.date, log.check_in, log.check_out)
+            .select_from(touched)
+            .join(Employee, Employee.emp_code == touched.c.emp_code)
+            .join(log, and_(log.employee_id == Employee.id, log.date == touched.c.punch_date))
+        )
+        before = {r.id: (r.check_in, r.check_out) for r in db.execute(touched_logs)}
+        new_in = case(
+            (or_(log.check_in.is_(None), day.c.first_punch < log.check_in), day.c.first_punch),
+            else_=log.check_in,
+        )
+        latest = case(
+            (and_(log.check_out.isnot(None), log.check_out > day.c.last_punch), log.check_out),
+            else_=day.c.last_punch,
+        )
+        latest = case(
+            (and_(log.check_in.isnot(None), log.check_in > latest), log.check_in),
+            else_=latest,
+        )
+        db.execute(
+            update(log)
+            .where(
+                log.employee_id == day.c.employee_id,
+                log.date == day.c.punch_date,
+                or_(log.source.is_(None), log.source.notin_(PROTECTED_SOURCES)),
+            )
+            .values(
+                check_in=new_in,
+                check_out=case((latest > new_in, latest), else_=None),
+                status=case((or_(log.status.is_(None), log.status == "absent"), "present"), else_=log.status),
+                source=func.coalesce(log.source, "device"),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        missing = select(
+            _new_id_expr(db),
+            day.c.employee_id,
+            day.c.punch_date,
+            day.c.first_punch,
+            case((day.c.last_punch > day.c.first_punch, day.c.last_punch), else_=None),
+            literal("present"),
+            literal("device"),
+        ).where(~exists().where(log.employee_id == day.c.employee_id, log.date == day.c.punch_date))
+        db.execute(
+            insert(log).from_select(
+                ["id", "employee_id", "date", "check_in", "check_out", "status", "source"], missing
+            )
+        )
+
+        # Hours/OT follow the checkout rules; recomputed only where the fold moved a time
+        rows = [
+            r for r in db.execute(touched_logs)
+            if before.get(r.id) != (r.check_in, r.check_out)
+        ]
+        if not rows:
+            return 0
+        db.bulk_update_mappings(AttendanceLog, [
+            {"id": r.id, **compute_work_hours(r.check_in, r.check_out, r.date)} for r in rows
+        ])
+        attendance_rollup.refresh(db, {r.date for r in rows})
+        return len(rows)
+
+
+punch_service = PunchIngestService()
@@ -0,0 +1,55 @@
+import datetime
+
+# All attendance times are shown in site time
+IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+IST_OFFSET_MINUTES = 330
+
+# "%I:%M %p" for every minute of the day, so formatting is a list lookup instead of strftime
+CLOCK_LABELS = tuple(
+    datetime.time(m // 60, m % 60).strftime("%I:%M %p") for m in range(24 * 60)
+)
+
+
+def to_ist(value):
+    """
+    Normalize a stored timestamp to IST.
+
+    Naive values are IST wall-clock: that is what the app writes and what
+    SQLite hands back after dropping the offset. Aware values (Postgres
+    timestamptz) are converted.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=IST)
+    return value.astimezone(IST)
+
+
+def minute_of_day(value):
+    """IST minute of day (0-1439) without building a converted datetime"""
+    minutes = value.hour * 60 + value.minute
+    offset = value.utcoffset()
+    if offset is not None:
+        minutes += IST_OFFSET_MINUTES - int(offset.total_seconds()) // 60
+    return minutes % 1440
+
+
+def format_clock(value, default=None):
+    """'09:05 AM' style IST time for one timestamp"""
+    if value is None:
+        return default
+    return CLOCK_LABELS[minute_of_day(value)]
+
+
+def format_clocks(values, default=None):
+    """format_clock over a whole column of a result batch"""
+    labels = CLOCK_LABELS
+    out = []
+    for v in values:
+        if v is None:
+            out.append(default)
+        elif v.tzinfo is None:
+            out.append(labels[v.hour * 60 + v.minute])
+        else:
+            out.append(labels[minute_of_day(v)])
+    return out
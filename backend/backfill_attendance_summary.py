@@ -0,0 +1,72 @@
+"""
+Backfill the daily attendance rollup (daily_attendance_summary)
+
+    python backfill_attendance_summary.py                 # dates with logs but no summary rows
+    python backfill_attendance_summary.py --start 2024-01-01 --end 2024-03-31 --full
+
+--full recomputes every date in the range, not just the missing ones. Each
+date is committed on its own, so an interrupted run can simply be restarted.
+"""
+import os
+import sys
+import argparse
+import datetime
+
+# Ensure backend directory is in python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.core.database import engine, SessionLocal
+from app.models.models import DailyAttendanceSummary
+from app.services.attendance_rollup import attendance_rollup
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected YYYY-MM-DD")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill daily attendance summary rows")
+    parser.add_argument("--start", type=_date, help="YYYY-MM-DD (default: earliest log)")
+    parser.add_argument("--end", type=_date, help="YYYY-MM-DD (default: latest log)")
+    parser.add_argument("--full", action="store_true", help="Recompute every date in the range")
+    args = parser.parse_args()
+
+    # New table; normally created by create_all on app startup
+    DailyAttendanceSummary.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        if args.full:
+            if not (args.start and args.end):
+                print("[ERROR] --full needs both --start and --end")
+                return 1
+            days = (args.end - args.start).days + 1
+            dates = [args.start + datetime.timedelta(days=i) for i in range(days)]
+        else:
+            dates = attendance_rollup.unsummarized_dates(db, args.start, args.end)
+
+        if not dates:
+            print("[SKIP] Summary is up to date.")
+            return 0
+
+        for day in dates:
+            attendance_rollup.refresh(db, [day])
+            db.commit()
+        print(f"[SUCCESS] Summarized {len(dates)} day(s): {dates[0]} .. {dates[-1]}")
+        return 0
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Backfill failed: {e}")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Per-request cost of authorization on two authenticated routes
+
+    python bench_auth.py [--requests 500] [--username admin --password password123]
+
+Runs the app in-process (TestClient) against DATABASE_URL and times
+GET /loans and GET /employees/{id}/payroll-rules with the principal cache
+disabled (a user lookup on every request, as before) and enabled. Counts
+SQL statements per request so the saved round-trip is visible even on a
+local SQLite file. Read-only: nothing is written to the database.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# Ensure backend directory is in python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.database import engine, SessionLocal
+from app.models.models import Employee
+from app.services import auth
+
+
+def run(client, url, headers, n, statements):
+    timings = []
+    statements[0] = 0
+    for _ in range(n):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code not in (200, 404):
+            raise SystemExit(f"{url} returned {response.status_code}: {response.text[:200]}")
+    return statistics.mean(timings), statistics.median(timings), statements[0] / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark token authorization with and without the principal cache")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="password123")
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    client.__enter__()
+    token = client.post("/api/v1/auth/login", data={"username": args.username, "password": args.password})
+    if token.status_code != 200:
+        print(f"[ERROR] Login failed: {token.text}")
+        return 1
+    headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+
+    db = SessionLocal()
+    try:
+        emp = db.query(Employee.id).first()
+    finally:
+        db.close()
+    urls = ["/api/v1/loans"]
+    if emp:
+        urls.append(f"/api/v1/employees/{emp.id}/payroll-rules")
+    else:
+        print("[SKIP] No employees; benchmarking /loans only")
+
+    statements = [0]
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    ttl = auth.PRINCIPAL_CACHE_TTL_SECONDS or 60
+    print(f"{'route':<48} {'cache':<6} {'mean ms':>8} {'p50 ms':>8} {'SQL/req':>8}")
+    for url in urls:
+        for label, cache_ttl in (("off", 0), ("on", ttl)):
+            auth.PRINCIPAL_CACHE_TTL_SECONDS = cache_ttl
+            auth.auth_service._principals.clear()
+            run(client, url, headers, 20, statements)  # warm up
+            mean, p50, per_request = run(client, url, headers, args.requests, statements)
+            print(f"{url[:48]:<48} {label:<6} {mean:>8.2f} {p50:>8.2f} {per_request:>8.2f}")
+    client.__exit__(None, None, None)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Boot cost of the API: import time and memory of `app.main` in a fresh interpreter
+
+    python bench_startup.py [--runs 5] [--target 1.0] [--with-face]
+
+Each run starts a new Python process, imports the app (what a uvicorn worker
+does before serving) and reports wall time, peak RSS and which heavy
+libraries got loaded. --with-face also loads the recognition stack and
+model, as a scan worker would on its first request. Exits non-zero when the
+median API boot exceeds --target seconds.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ("tensorflow", "deepface", "cv2", "scipy", "numpy", "pandas", "reportlab", "google.generativeai", "pyarrow")
+
+PROBE = r"""
+import sys, time, json, resource
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+if WITH_FACE:
+    from app.services.face_recognition import face_service
+    face_service.preload()
+    elapsed_face = time.perf_counter() - start
+else:
+    elapsed_face = None
+print("BENCH " + json.dumps({
+    "seconds": elapsed,
+    "seconds_with_face": elapsed_face,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [m for m in HEAVY if m in sys.modules],
+}))
+"""
+
+
+def run_once(with_face):
+    code = f"WITH_FACE = {with_face!r}\nHEAVY = {HEAVY_MODULES!r}\n" + PROBE
+    proc = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH "):])
+    raise SystemExit(f"[ERROR] Probe failed:\n{proc.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API worker startup time and memory")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=float, default=1.0, help="Median API boot budget in seconds")
+    parser.add_argument("--with-face", action="store_true", help="Also load the face recognition stack")
+    args = parser.parse_args()
+
+    results = [run_once(args.with_face) for _ in range(args.runs)]
+    boot = statistics.median(r["seconds"] for r in results)
+    rss = statistics.median(r["max_rss_mb"] for r in results)
+    print(f"API boot      : median {boot:.3f}s  (min {min(r['seconds'] for r in results):.3f}s, {args.runs} runs)")
+    if args.with_face:
+        face = statistics.median(r["seconds_with_face"] for r in results)
+        print(f"With face     : median {face:.3f}s")
+    print(f"Peak RSS      : median {rss:.0f} MB")
+    print(f"Heavy modules : {', '.join(results[-1]['heavy']) or 'none'}")
+
+    if boot > args.target:
+        print(f"[FAIL] API boot {boot:.3f}s exceeds target {args.target:.3f}s")
+        return 1
+    print(f"[OK] API boot within {args.target:.3f}s target")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
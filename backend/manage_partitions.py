@@ -0,0 +1,118 @@
+"""
+Attendance log partition maintenance (PostgreSQL)
+
+    python manage_partitions.py list
+    python manage_partitions.py ensure [--ahead 3]
+    python manage_partitions.py detach --before 2023-01 [--archive-schema archive] [--dry-run]
+    python manage_partitions.py verify [--month 2024-03]
+
+On SQLite every command reports that there is nothing to do.
+"""
+import os
+import sys
+import argparse
+import datetime
+
+# Ensure backend directory is in python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.core.database import engine
+from app.core import partitioning
+
+
+def _month(value):
+    try:
+        year, month = value.split("-")
+        return datetime.date(int(year), int(month), 1)
+    except Exception:
+        raise argparse.ArgumentTypeError("expected YYYY-MM")
+
+
+def _require_partitioned():
+    if engine.dialect.name != "postgresql":
+        print("[SKIP] Not PostgreSQL; attendance_logs is not partitioned.")
+        return False
+    with engine.connect() as conn:
+        if not partitioning.is_partitioned(conn):
+            print("[SKIP] attendance_logs is not partitioned yet. Run migrate_partition_attendance_logs.py first.")
+            return False
+    return True
+
+
+def cmd_list(args):
+    if not _require_partitioned():
+        return 0
+    with engine.connect() as conn:
+        for name, first_day in partitioning.list_partitions(conn):
+            print(f"{name}  {first_day:%Y-%m}")
+    return 0
+
+
+def cmd_ensure(args):
+    if not _require_partitioned():
+        return 0
+    created = partitioning.ensure_upcoming_partitions(engine, months_ahead=args.ahead)
+    for name in created:
+        print(f"[ADD] {name}")
+    if not created:
+        print("[SKIP] All upcoming partitions already exist.")
+    return 0
+
+
+def cmd_detach(args):
+    if not _require_partitioned():
+        return 0
+    names = partitioning.detach_partitions_before(
+        engine, args.before, archive_schema=args.archive_schema, dry_run=args.dry_run
+    )
+    verb = "Would detach" if args.dry_run else "Detached"
+    for name in names:
+        print(f"[{'DRY-RUN' if args.dry_run else 'DETACH'}] {verb} {name} -> {args.archive_schema}.{name}")
+    if not names:
+        print(f"[SKIP] No partitions end before {args.before:%Y-%m}.")
+    return 0
+
+
+def cmd_verify(args):
+    if not _require_partitioned():
+        return 0
+    month = args.month or datetime.date.today().replace(day=1)
+    report = partitioning.verify_pruning(engine, month.year, month.month)
+    ok = True
+    for label, result in report["queries"].items():
+        status = "OK" if result["pruned"] else "NOT PRUNED"
+        ok = ok and result["pruned"]
+        print(f"[{status}] {label}: scans {', '.join(result['scanned']) or '(nothing)'}")
+    print(f"Expected only: {report['expected']}")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage attendance_logs monthly partitions")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="List attached monthly partitions").set_defaults(func=cmd_list)
+
+    p = sub.add_parser("ensure", help="Create partitions for this month and upcoming months")
+    p.add_argument("--ahead", type=int, default=partitioning.MONTHS_AHEAD)
+    p.set_defaults(func=cmd_ensure)
+
+    p = sub.add_parser("detach", help="Detach and archive partitions older than a month")
+    p.add_argument("--before", type=_month, required=True, help="YYYY-MM; partitions ending on or before this month's start")
+    p.add_argument("--archive-schema", default="archive")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=cmd_detach)
+
+    p = sub.add_parser("verify", help="Check that month-scoped queries prune to one partition")
+    p.add_argument("--month", type=_month, help="YYYY-MM (default: current month)")
+    p.set_defaults(func=cmd_verify)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
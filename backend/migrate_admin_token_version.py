@@ -0,0 +1,55 @@
+import os
+import sys
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+try:
+    from app.core.database import DATABASE_URL
+except:
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
+
+# Fix postgres:// to postgresql://
+if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+def run_migration():
+    print("Starting migration: Add token_version column to Admin Users...")
+    print(f"Database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else DATABASE_URL.split('://')[1] if '://' in DATABASE_URL else 'unknown'}")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        inspector = inspect(engine)
+        
+        with engine.connect() as conn:
+            # Check if table exists
+            if "admin_users" not in inspector.get_table_names():
+                print("[ERROR] Table 'admin_users' does not exist. Run the main migration first.")
+                return 1
+            
+            # Get existing columns
+            columns = [col['name'] for col in inspector.get_columns('admin_users')]
+            
+            if "token_version" not in columns:
+                # Existing tokens carry no version claim and are read as version 0, so nobody is logged out
+                print("[ADD] Adding column: token_version")
+                conn.execute(text("ALTER TABLE admin_users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+                conn.commit()
+            else:
+                print("[SKIP] Column 'token_version' already exists.")
+            
+            print("[SUCCESS] Migration successful!")
+            return 0
+            
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(run_migration())
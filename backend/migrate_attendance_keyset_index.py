@@ -0,0 +1,57 @@
+import os
+import sys
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+try:
+    from app.core.database import DATABASE_URL
+except:
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
+
+# Fix postgres:// to postgresql://
+if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+def run_migration():
+    print("Starting migration: Keyset index for attendance log paging...")
+    print(f"Database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else DATABASE_URL.split('://')[1] if '://' in DATABASE_URL else 'unknown'}")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        inspector = inspect(engine)
+        
+        with engine.connect() as conn:
+            # Check if table exists
+            if "attendance_logs" not in inspector.get_table_names():
+                print("[ERROR] Table 'attendance_logs' does not exist. Run the main migration first.")
+                return
+            
+            indexes = [idx['name'] for idx in inspector.get_indexes('attendance_logs')]
+            
+            if "ix_attendance_logs_keyset" not in indexes:
+                # Must match the /attendance/logs ORDER BY so pages are read straight off the index.
+                # SQLite already sorts NULLs last under DESC and rejects NULLS LAST in index definitions.
+                if engine.dialect.name == "postgresql":
+                    columns = "date DESC, check_in DESC NULLS LAST, id DESC"
+                else:
+                    columns = "date DESC, check_in DESC, id DESC"
+                print(f"[ADD] Adding index: ix_attendance_logs_keyset ({columns})")
+                conn.execute(text(f"CREATE INDEX ix_attendance_logs_keyset ON attendance_logs ({columns})"))
+                conn.commit()
+            else:
+                print("[SKIP] Index 'ix_attendance_logs_keyset' already exists.")
+            
+            print("[SUCCESS] Migration successful!")
+            
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,57 @@
+import os
+import sys
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+try:
+    from app.core.database import DATABASE_URL
+except:
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
+
+# Fix postgres:// to postgresql://
+if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+def run_migration():
+    print("Starting migration: Add source column to Attendance Logs...")
+    print(f"Database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else DATABASE_URL.split('://')[1] if '://' in DATABASE_URL else 'unknown'}")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        inspector = inspect(engine)
+        
+        with engine.connect() as conn:
+            # Check if table exists
+            if "attendance_logs" not in inspector.get_table_names():
+                print("[ERROR] Table 'attendance_logs' does not exist. Run the main migration first.")
+                return
+            
+            # Get existing columns
+            columns = [col['name'] for col in inspector.get_columns('attendance_logs')]
+            
+            if "source" not in columns:
+                print("[ADD] Adding column: source")
+                conn.execute(text("ALTER TABLE attendance_logs ADD COLUMN source VARCHAR"))
+                conn.commit()
+                
+                # Kiosk scans are the only rows that carry a confidence score
+                print("[UPDATE] Back-filling source for face scans")
+                conn.execute(text("UPDATE attendance_logs SET source = 'face' WHERE source IS NULL AND confidence_score IS NOT NULL"))
+                conn.commit()
+            else:
+                print("[SKIP] Column 'source' already exists.")
+            
+            print("[SUCCESS] Migration successful!")
+            
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    run_migration()
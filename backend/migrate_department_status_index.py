@@ -0,0 +1,55 @@
+import os
+import sys
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+try:
+    from app.core.database import DATABASE_URL
+except:
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
+
+# Fix postgres:// to postgresql://
+if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+def run_migration():
+    print("Starting migration: Index employees by department and status...")
+    print(f"Database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else DATABASE_URL.split('://')[1] if '://' in DATABASE_URL else 'unknown'}")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        inspector = inspect(engine)
+        
+        with engine.connect() as conn:
+            # Check if table exists
+            if "employees" not in inspector.get_table_names():
+                print("[ERROR] Table 'employees' does not exist. Run the main migration first.")
+                return
+            
+            # Active-employee counts per department (departments listing, dashboard breakdown)
+            wanted = [
+                ("employees", "ix_employees_department_status", "department, status"),
+            ]
+            for table, name, cols in wanted:
+                indexes = [idx['name'] for idx in inspector.get_indexes(table)]
+                if name not in indexes:
+                    print(f"[ADD] Adding index: {name} ({cols})")
+                    conn.execute(text(f"CREATE INDEX {name} ON {table} ({cols})"))
+                    conn.commit()
+                else:
+                    print(f"[SKIP] Index '{name}' already exists.")
+            
+            print("[SUCCESS] Migration successful!")
+            
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,63 @@
+import os
+import sys
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+try:
+    from app.core.database import DATABASE_URL
+except:
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
+
+# Fix postgres:// to postgresql://
+if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+def run_migration():
+    print("Starting migration: Trigram search index on employees...")
+    print(f"Database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else DATABASE_URL.split('://')[1] if '://' in DATABASE_URL else 'unknown'}")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        inspector = inspect(engine)
+        
+        if engine.dialect.name != "postgresql":
+            # SQLite deployments use the in-memory trigram index in app/services/employee_search.py
+            print("[SKIP] Not PostgreSQL; employee search uses the in-memory index.")
+            print("[SUCCESS] Migration successful!")
+            return
+        
+        with engine.connect() as conn:
+            # Check if table exists
+            if "employees" not in inspector.get_table_names():
+                print("[ERROR] Table 'employees' does not exist. Run the main migration first.")
+                return
+            
+            indexes = [idx['name'] for idx in inspector.get_indexes('employees')]
+            
+            if "ix_employees_search_trgm" not in indexes:
+                print("[ADD] Enabling extension: pg_trgm")
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                # Expression must match employee_search.search_expression()
+                print("[ADD] Adding index: ix_employees_search_trgm (GIN, first/last name + code)")
+                conn.execute(text(
+                    "CREATE INDEX ix_employees_search_trgm ON employees USING gin "
+                    "((lower(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(emp_code, ''))) gin_trgm_ops)"
+                ))
+                conn.commit()
+            else:
+                print("[SKIP] Index 'ix_employees_search_trgm' already exists.")
+            
+            print("[SUCCESS] Migration successful!")
+            
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,66 @@
+import os
+import sys
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+try:
+    from app.core.database import DATABASE_URL
+except:
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
+
+# Fix postgres:// to postgresql://
+if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+def run_migration():
+    """Returns False on failure so the deploy stops: payroll's EMI posting relies on this index"""
+    print("Starting migration: Unique loan EMI per month...")
+    print(f"Database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else DATABASE_URL.split('://')[1] if '://' in DATABASE_URL else 'unknown'}")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        inspector = inspect(engine)
+        
+        with engine.connect() as conn:
+            # Check if table exists
+            if "loan_payments" not in inspector.get_table_names():
+                print("[SKIP] Table 'loan_payments' does not exist yet; create_all will add the constraint.")
+                return True
+            
+            name = "uq_loan_payments_loan_month"
+            existing = [idx['name'] for idx in inspector.get_indexes("loan_payments")]
+            existing += [uc['name'] for uc in inspector.get_unique_constraints("loan_payments")]
+            if name in existing:
+                print(f"[SKIP] Constraint '{name}' already exists.")
+            else:
+                # Older payroll runs could post the same EMI twice; those rows must be resolved by hand
+                duplicates = conn.execute(text(
+                    "SELECT loan_id, month, year, COUNT(*) FROM loan_payments "
+                    "GROUP BY loan_id, month, year HAVING COUNT(*) > 1"
+                )).fetchall()
+                if duplicates:
+                    print(f"[ERROR] {len(duplicates)} loan/month pairs have more than one payment:")
+                    for loan_id, month, year, count in duplicates[:20]:
+                        print(f"    loan {loan_id}  {month:02d}/{year}  x{count}")
+                    print("[ERROR] Remove the duplicate payments and re-run this migration.")
+                    return False
+                print(f"[ADD] Adding unique index: {name} (loan_id, month, year)")
+                conn.execute(text(f"CREATE UNIQUE INDEX {name} ON loan_payments (loan_id, month, year)"))
+                conn.commit()
+            
+            print("[SUCCESS] Migration successful!")
+            return True
+            
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+if __name__ == "__main__":
+    sys.exit(0 if run_migration() else 1)
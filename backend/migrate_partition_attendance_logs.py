@@ -0,0 +1,122 @@
+"""
+Convert attendance_logs into a monthly range-partitioned table (PostgreSQL)
+
+    python migrate_partition_attendance_logs.py [--months-back 24]
+
+One-off: not part of run_migrations.py. It locks attendance_logs
+(ACCESS EXCLUSIVE) and copies every row in one transaction, so run it by
+hand in a maintenance window. Monthly partitions start --months-back months
+before today (or at the oldest log, if later); older rows, including
+mistyped dates, go to the default partition.
+"""
+import os
+import sys
+import argparse
+import datetime
+from sqlalchemy import create_engine, text, inspect
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+try:
+    from app.core.database import DATABASE_URL
+except:
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
+
+# Fix postgres:// to postgresql://
+if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+# Monthly partitions created below today's month; older rows land in the default partition
+MONTHS_BACK = 24
+
+def run_migration(months_back=MONTHS_BACK):
+    print("Starting migration: Partition attendance_logs by month...")
+    print(f"Database: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else DATABASE_URL.split('://')[1] if '://' in DATABASE_URL else 'unknown'}")
+    
+    try:
+        engine = create_engine(DATABASE_URL)
+        
+        if engine.dialect.name != "postgresql":
+            print("[SKIP] Not PostgreSQL; attendance_logs stays a single table.")
+            print("[SUCCESS] Migration successful!")
+            return
+        
+        from app.core.partitioning import (
+            is_partitioned, month_range, add_months, partition_name, MONTHS_AHEAD, DEFAULT_PARTITION
+        )
+        inspector = inspect(engine)
+        
+        # Check if table exists
+        if "attendance_logs" not in inspector.get_table_names():
+            print("[ERROR] Table 'attendance_logs' does not exist. Run the main migration first.")
+            return
+        
+        with engine.begin() as conn:
+            if is_partitioned(conn):
+                print("[SKIP] attendance_logs is already partitioned.")
+                print("[SUCCESS] Migration successful!")
+                return
+            
+            # One transaction: any failure leaves the original table untouched
+            conn.execute(text("LOCK TABLE attendance_logs IN ACCESS EXCLUSIVE MODE"))
+            conn.execute(text("ALTER TABLE attendance_logs RENAME TO attendance_logs_legacy"))
+            conn.execute(text(
+                "CREATE TABLE attendance_logs (LIKE attendance_logs_legacy INCLUDING DEFAULTS) "
+                "PARTITION BY RANGE (date)"
+            ))
+            
+            first_day, row_count = conn.execute(text(
+                "SELECT min(date), count(*) FROM attendance_logs_legacy"
+            )).one()
+            today = datetime.date.today()
+            floor = add_months(today, -months_back)
+            month = max(add_months(first_day or today, 0), floor)
+            last = add_months(today, MONTHS_AHEAD)
+            while month <= last:
+                start, end = month_range(month.year, month.month)
+                print(f"[ADD] Partition {partition_name(month.year, month.month)} [{start}, {end})")
+                conn.execute(text(
+                    f"CREATE TABLE {partition_name(month.year, month.month)} PARTITION OF attendance_logs "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+                month = add_months(month, 1)
+            # Catches rows before the first partition and far-future typos instead of failing the insert
+            conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF attendance_logs DEFAULT"))
+            
+            print(f"[COPY] Moving {row_count} rows into partitions")
+            conn.execute(text("INSERT INTO attendance_logs SELECT * FROM attendance_logs_legacy"))
+            copied = conn.execute(text("SELECT count(*) FROM attendance_logs")).scalar()
+            if copied != row_count:
+                raise RuntimeError(f"Row count mismatch after copy: {copied} != {row_count}")
+            
+            conn.execute(text("DROP TABLE attendance_logs_legacy"))
+            
+            # Unique constraints on a partitioned table must include the partition key
+            print("[ADD] Primary key (id, date), foreign key and indexes")
+            conn.execute(text("ALTER TABLE attendance_logs ADD CONSTRAINT attendance_logs_pkey PRIMARY KEY (id, date)"))
+            conn.execute(text(
+                "ALTER TABLE attendance_logs ADD CONSTRAINT attendance_logs_employee_id_fkey "
+                "FOREIGN KEY (employee_id) REFERENCES employees (id)"
+            ))
+            conn.execute(text("CREATE INDEX ix_attendance_logs_emp_date ON attendance_logs (employee_id, date)"))
+            conn.execute(text(
+                "CREATE INDEX ix_attendance_logs_keyset ON attendance_logs (date DESC, check_in DESC NULLS LAST, id DESC)"
+            ))
+        
+        print("[SUCCESS] Migration successful!")
+            
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition attendance_logs by month")
+    parser.add_argument("--months-back", type=int, default=MONTHS_BACK,
+                        help=f"Months of monthly partitions before the current one (default {MONTHS_BACK})")
+    args = parser.parse_args()
+    run_migration(args.months_back)
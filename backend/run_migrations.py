@@ -137,6 +137,54 @@ def main():
             "description": "Adding comprehensive salary components...",
             "critical": False,  # Not critical as columns may already exist
             "step": 2
+        },
+        {
+            "script": "migrate_attendance_source.py",
+            "description": "Adding source column to attendance logs...",
+            "critical": False,
+            "step": 3
+        },
+        {
+            "script": "migrate_punch_events.py",
+            "description": "Indexing attendance logs for device punch ingestion...",
+            "critical": False,
+            "step": 4
+        },
+        {
+            "script": "migrate_attendance_keyset_index.py",
+            "description": "Indexing attendance logs for keyset pagination...",
+            "critical": False,
+            "step": 5
+        },
+        {
+            "script": "migrate_employee_search_index.py",
+            "description": "Adding trigram search index on employees...",
+            "critical": False,
+            "step": 6
+        },
+        {
+            "script": "backfill_attendance_summary.py",
+            "description": "Backfilling daily attendance summary...",
+            "critical": False,
+            "step": 7
+        },
+        {
+            "script": "migrate_department_status_index.py",
+            "description": "Indexing employees by department and status...",
+            "critical": False,
+            "step": 8
+        },
+        {
+            "script": "migrate_loan_payment_unique.py",
+            "description": "Adding one-EMI-per-month constraint on loan payments...",
+            "critical": True,  # Payroll EMI posting upserts against this index
+            "step": 9
+        },
+        {
+            "script": "migrate_admin_token_version.py",
+            "description": "Adding token_version column to admin users...",
+            "critical": True,  # Login reads this column
+            "step": 10
         }
     ]
     
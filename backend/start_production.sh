@@ -9,6 +9,37 @@ echo "Starting Attendance System Backend"
 echo "=========================================="
 echo ""
 
+# Deployment role (see app/services/face_client.py):
+#   all       - one server, face recognition in every worker (default)
+#   api       - API workers without TensorFlow; scans go to the inference server at FACE_SERVICE_URL
+#               (a unix:// socket means "this node": a local inference server is started here too)
+#   inference - only the face inference server
+APP_ROLE="${APP_ROLE:-all}"
+export APP_ROLE
+FACE_SERVICE_URL="${FACE_SERVICE_URL:-unix:///tmp/attendance-face.sock}"
+export FACE_SERVICE_URL
+# Each API worker holds at most DB_POOL_SIZE + DB_MAX_OVERFLOW (default 10 + 10) database
+# connections, sync and async engines together; keep API_WORKERS x that under max_connections
+API_WORKERS="${API_WORKERS:-4}"
+export API_WORKERS   # the presence map only trusts its in-process copy with a single worker
+INFERENCE_WORKERS="${INFERENCE_WORKERS:-2}"
+
+start_inference() {
+    local socket_path="${FACE_SERVICE_URL#unix://}"
+    rm -f "$socket_path"
+    uvicorn app.inference_server:app --uds "$socket_path" --workers "$INFERENCE_WORKERS" "$@"
+}
+
+if [ "$APP_ROLE" = "inference" ]; then
+    echo "Role: inference ($INFERENCE_WORKERS workers on $FACE_SERVICE_URL)"
+    if [[ "$FACE_SERVICE_URL" == unix://* ]]; then
+        start_inference
+    else
+        exec uvicorn app.inference_server:app --host 0.0.0.0 --port "${INFERENCE_PORT:-8001}" --workers "$INFERENCE_WORKERS"
+    fi
+    exit $?
+fi
+
 # Run database migrations
 echo "[1/3] Running database migrations..."
 python run_migrations.py || {
@@ -20,8 +51,17 @@ echo "[2/3] Migrations complete!"
 echo ""
 
 # Start the application
-echo "[3/3] Starting application server..."
+echo "[3/3] Starting application server (role: $APP_ROLE)..."
 echo ""
 
+if [ "$APP_ROLE" = "api" ] && [[ "$FACE_SERVICE_URL" == unix://* ]]; then
+    echo "Starting local face inference server ($INFERENCE_WORKERS workers on $FACE_SERVICE_URL)..."
+    start_inference &
+    for _ in $(seq 1 120); do
+        [ -S "${FACE_SERVICE_URL#unix://}" ] && break
+        sleep 1
+    done
+fi
+
 # Use uvicorn to start the FastAPI application
-exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers 4
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers "$API_WORKERS"
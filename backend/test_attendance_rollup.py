@@ -0,0 +1,192 @@
+"""
+Daily attendance rollup (daily_attendance_summary)
+
+    python test_attendance_rollup.py
+
+Runs against a throwaway SQLite database. Checks that the first scoped
+refresh of a day summarizes every group, that scans adjust their group's
+counters by delta to the same numbers a recompute gives, that the report
+only reads (and caps its range), that refreshing a day twice updates rows
+in place (upsert) instead of failing on the primary key, and that a hard
+delete removes the employee from the rollup. Exits non-zero on failure.
+"""
+import os
+import sys
+import tempfile
+import datetime
+
+# Throwaway database; must be set before the app is imported
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="rollup_"), "rollup.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ["FORCE_MOCK_MODE"] = "true"
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.database import SessionLocal
+from app.models.models import Employee, AttendanceLog, DailyAttendanceSummary
+from app.services.attendance_rollup import attendance_rollup
+
+DAY = datetime.date(2026, 1, 5)
+QUIET_DAY = datetime.date(2026, 1, 6)  # no attendance written at all
+
+
+def seed():
+    db = SessionLocal()
+    try:
+        prod = Employee(emp_code="RP001", first_name="Prod", last_name="One", mobile_no="7000000001",
+                        department="Prod", status="active")
+        stores = Employee(emp_code="RS001", first_name="Stores", last_name="One", mobile_no="7000000002",
+                          department="Stores", status="active")
+        db.add_all([prod, stores])
+        db.commit()
+        return prod.id, stores.id
+    finally:
+        db.close()
+
+
+def summary_rows(db, day):
+    rows = db.query(DailyAttendanceSummary).filter(DailyAttendanceSummary.date == day).all()
+    return {row.department: row for row in rows}
+
+
+def test_scoped_refresh_does_not_hide_other_groups(prod_id, stores_id):
+    print("\n--- Scoped refresh, then dashboard/report ---")
+    db = SessionLocal()
+    try:
+        # What a check-in does: write the log, refresh only the scanned employee's group
+        db.add(AttendanceLog(employee_id=prod_id, date=DAY, status="present", source="manual",
+                             check_in=datetime.datetime.combine(DAY, datetime.time(9, 0))))
+        db.commit()
+        attendance_rollup.refresh_and_commit(db, [DAY], [prod_id])
+
+        # First write of the day summarizes every group, so reads have nothing to fill in
+        rows = summary_rows(db, DAY)
+        print(f"  groups after scoped refresh: {sorted(rows)}")
+        assert set(rows) == {"Prod", "Stores"}, "scoped refresh left the day half-built"
+        assert rows["Stores"].absent_count == 1 and rows["Prod"].present_count == 1
+    finally:
+        db.close()
+
+
+def test_scan_applies_a_delta(prod_id, stores_id):
+    print("\n--- Scans adjust counters in place ---")
+    db = SessionLocal()
+    try:
+        stores = db.get(Employee, stores_id)
+        log = AttendanceLog(employee_id=stores_id, date=DAY, status="present", source="face",
+                            check_in=datetime.datetime.combine(DAY, datetime.time(9, 15)))
+        db.add(log)
+        db.commit()
+        # Check-in: no log -> present
+        attendance_rollup.apply_change_and_commit(db, DAY, stores, None, {"status": "present"})
+        row = summary_rows(db, DAY)["Stores"]
+        assert (row.present_count, row.absent_count) == (1, 0), (row.present_count, row.absent_count)
+
+        # Check-out: hours move, counts stay
+        counted = {"status": "present", "total_hours_worked": None, "ot_hours": None}
+        log.total_hours_worked, log.ot_hours = 9.5, 0
+        db.commit()
+        attendance_rollup.apply_change_and_commit(
+            db, DAY, stores, counted, {"status": "present", "total_hours_worked": 9.5, "ot_hours": 0}
+        )
+        db.expire_all()
+        row = summary_rows(db, DAY)["Stores"]
+        assert float(row.total_hours_worked) == 9.5 and row.present_count == 1
+
+        # The delta matches what a full recompute gives
+        attendance_rollup.refresh(db, [DAY])
+        db.commit()
+        db.expire_all()
+        again = summary_rows(db, DAY)["Stores"]
+        assert (again.present_count, again.absent_count, float(again.total_hours_worked)) == (1, 0, 9.5)
+
+        db.delete(log)
+        db.commit()
+        attendance_rollup.refresh(db, [DAY])
+        db.commit()
+        print("  ok")
+    finally:
+        db.close()
+
+
+def test_report_is_read_only(client, headers):
+    print("\n--- Report reads summary rows only ---")
+    response = client.get(
+        f"/api/v1/reports/attendance-summary?start_date={DAY}&end_date={QUIET_DAY}", headers=headers
+    )
+    assert response.status_code == 200, response.text
+    groups = {(row["period"], row["group"]): row for row in response.json()["rows"]}
+    print(f"  rows: {sorted(groups)}")
+    assert (DAY.isoformat(), "Prod") in groups and (DAY.isoformat(), "Stores") in groups
+    db = SessionLocal()
+    try:
+        assert not summary_rows(db, QUIET_DAY), "GET wrote summary rows"
+    finally:
+        db.close()
+
+    response = client.get(
+        "/api/v1/reports/attendance-summary?start_date=2020-01-01&end_date=2026-01-01", headers=headers
+    )
+    assert response.status_code == 400, "unbounded range accepted"
+
+
+def test_refresh_is_an_upsert(prod_id, stores_id):
+    print("\n--- Repeated refresh updates in place ---")
+    db = SessionLocal()
+    try:
+        attendance_rollup.refresh(db, [DAY])
+        db.add(AttendanceLog(employee_id=stores_id, date=DAY, status="present", source="manual",
+                             check_in=datetime.datetime.combine(DAY, datetime.time(9, 30))))
+        # Second refresh of the same day and groups in one transaction: rows exist, must be updated
+        attendance_rollup.refresh(db, [DAY], [stores_id])
+        db.commit()
+        rows = summary_rows(db, DAY)
+        assert rows["Stores"].present_count == 1 and rows["Stores"].absent_count == 0
+
+        # A group whose last active employee leaves is dropped
+        db.get(Employee, stores_id).status = "inactive"
+        db.commit()
+        attendance_rollup.refresh(db, [DAY])
+        db.commit()
+        assert set(summary_rows(db, DAY)) == {"Prod"}
+        print("  ok")
+    finally:
+        db.close()
+
+
+def test_hard_delete_updates_rollup(client, headers, prod_id):
+    print("\n--- Hard delete drops the employee from the rollup ---")
+    response = client.delete(f"/api/v1/employees/{prod_id}?hard_delete=true", headers=headers)
+    assert response.status_code == 200, response.text
+    db = SessionLocal()
+    try:
+        rows = summary_rows(db, DAY)
+        print(f"  groups: {sorted(rows)}")
+        assert "Prod" not in rows, "deleted employee still counted in the rollup"
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    try:
+        with TestClient(app) as client:
+            token = client.post("/api/v1/auth/login", data={"username": "admin", "password": "password123"})
+            headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+            prod_id, stores_id = seed()
+            test_scoped_refresh_does_not_hide_other_groups(prod_id, stores_id)
+            test_scan_applies_a_delta(prod_id, stores_id)
+            test_report_is_read_only(client, headers)
+            test_refresh_is_an_upsert(prod_id, stores_id)
+            test_hard_delete_updates_rollup(client, headers, prod_id)
+        print("\n[SUCCESS] Attendance rollup checks passed!")
+    except AssertionError as e:
+        print(f"\n[FAILURE] {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n[ERROR] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
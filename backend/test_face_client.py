@@ -0,0 +1,81 @@
+"""
+Face client <-> inference server round trip (APP_ROLE=api)
+
+    python test_face_client.py
+
+Starts app.inference_server in mock mode on a throwaway unix socket and
+calls it through FaceServiceClient, checking that results match the
+in-process service, in particular that identify_face returns employee_id
+with the same type as the candidate keys. Exits non-zero on failure.
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.services.face_client import FaceServiceClient, FaceServiceUnavailable
+
+EMBEDDING = [0.1] * 8
+
+
+def start_server(socket_path):
+    env = dict(os.environ, FORCE_MOCK_MODE="true", APP_ROLE="inference")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.inference_server:app", "--uds", socket_path, "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    client = FaceServiceClient(f"unix://{socket_path}", timeout=5)
+    for _ in range(100):
+        try:
+            client.get_status()
+            return server, client
+        except FaceServiceUnavailable:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("inference server did not start")
+
+
+def test_identify_keeps_candidate_id_type(client, image):
+    print("\n--- identify_face candidate id types ---")
+    for candidates in ({5: EMBEDDING, 7: EMBEDDING}, {"a1b2": EMBEDDING, "c3d4": EMBEDDING}):
+        result = client.identify_face(image, candidates)
+        print(f"  {list(candidates)} -> {result['employee_id']!r}")
+        assert result["match"], result
+        assert result["employee_id"] in candidates, f"{result['employee_id']!r} is not one of {list(candidates)}"
+
+
+def test_other_calls(client, image):
+    print("\n--- register / match / liveness ---")
+    assert len(client.register_face(image)) == 512
+    assert client.match_face(image, EMBEDDING)["match"]
+    assert client.verify_liveness(image) in (True, False)
+    print("  ok")
+
+
+if __name__ == "__main__":
+    workdir = tempfile.mkdtemp(prefix="face_client_")
+    image = os.path.join(workdir, "face.jpg")
+    with open(image, "wb") as f:
+        f.write(b"not really a jpeg")
+    server = None
+    try:
+        server, client = start_server(os.path.join(workdir, "face.sock"))
+        test_identify_keeps_candidate_id_type(client, image)
+        test_other_calls(client, image)
+        print("\n[SUCCESS] Face client round trip works!")
+    except AssertionError as e:
+        print(f"\n[FAILURE] {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n[ERROR] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
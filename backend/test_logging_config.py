@@ -0,0 +1,92 @@
+"""
+Structured logging (app/core/logging_config.py)
+
+    python test_logging_config.py
+
+Sends records through the same queue handler and listener setup_logging()
+installs, and checks that an exception logged with logger.exception comes
+out as a JSON line whose traceback is in its own "exc" field, not folded
+into "msg", and that scan sampling never drops audit records. Exits
+non-zero on failure.
+"""
+import io
+import os
+import sys
+import json
+import queue
+import logging
+import logging.handlers
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.logging_config import JsonFormatter, JsonQueueHandler, SampleFilter, SCAN_LOGGER, AUDIT_LOGGER
+
+
+def emit_through_queue(log):
+    """Run log(logger) with records going handler -> queue -> listener -> JSON lines"""
+    out = io.StringIO()
+    stream = logging.StreamHandler(out)
+    stream.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, stream)
+    logger = logging.getLogger("test.logging_config")
+    logger.propagate = False
+    logger.handlers = [JsonQueueHandler(log_queue)]
+    logger.setLevel(logging.INFO)
+    listener.start()
+    try:
+        log(logger)
+    finally:
+        listener.stop()
+        logger.handlers = []
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_exception_has_exc_field():
+    print("\n--- logger.exception through the queue ---")
+
+    def log(logger):
+        try:
+            {}["missing"]
+        except KeyError:
+            logger.exception("Lookup failed for %s", "emp-1", extra={"device_id": "K1"})
+
+    [entry] = emit_through_queue(log)
+    print(f"  keys: {sorted(entry)}")
+    assert entry["msg"] == "Lookup failed for emp-1", f"msg carries more than the message: {entry['msg']!r}"
+    assert "exc" in entry, "traceback missing from the exc field"
+    assert "KeyError" in entry["exc"] and "Traceback" in entry["exc"]
+    assert entry["device_id"] == "K1"
+
+
+def test_plain_record_has_no_exc():
+    print("\n--- Plain record ---")
+    [entry] = emit_through_queue(lambda logger: logger.info("Scan %d ok", 7))
+    assert entry["msg"] == "Scan 7 ok"
+    assert "exc" not in entry
+    print("  ok")
+
+
+def test_sampling_spares_audit_events():
+    print("\n--- Sampling ---")
+    sampler = SampleFilter(SCAN_LOGGER, 0.0)
+
+    def record(name, level=logging.INFO):
+        return logging.LogRecord(name, level, __file__, 0, "event", (), None)
+
+    assert not sampler.filter(record(SCAN_LOGGER)), "routine scan record kept at rate 0"
+    assert sampler.filter(record(SCAN_LOGGER, logging.WARNING)), "scan warning dropped"
+    assert sampler.filter(record(AUDIT_LOGGER)), "audit record dropped by scan sampling"
+    print("  ok")
+
+
+if __name__ == "__main__":
+    try:
+        test_exception_has_exc_field()
+        test_plain_record_has_no_exc()
+        test_sampling_spares_audit_events()
+        print("\n[SUCCESS] Logging checks passed!")
+    except AssertionError as e:
+        print(f"\n[FAILURE] {e}")
+        sys.exit(1)
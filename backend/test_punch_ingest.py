@@ -0,0 +1,159 @@
+"""
+Device punch ingestion (POST /attendance/punches)
+
+    python test_punch_ingest.py
+
+Runs against a throwaway SQLite database. Checks that JSON arrays, JSON
+lines and CSV batches parse to the same punches, that replaying a batch
+(same idempotency keys) adds nothing, that a day's punches fold into one
+log as earliest in / latest out with hours computed, and that imported or
+admin-edited logs keep their times and hours. Exits non-zero on failure.
+"""
+import os
+import sys
+import json
+import tempfile
+import datetime
+
+# Throwaway database; must be set before the app is imported
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="punches_"), "punches.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ["FORCE_MOCK_MODE"] = "true"
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import SessionLocal, engine
+from app.models import models
+from app.models.models import Employee, AttendanceLog, PunchEvent
+from app.services.punch_ingest import punch_service, parse_punch_payload
+
+DAY = datetime.date(2026, 1, 7)  # a Wednesday
+PUNCHES = [
+    ("K1", "PI001", "2026-01-07T09:05:00"),
+    ("K2", "PI001", "2026-01-07T18:40:00"),
+    ("K1", "PI001", "2026-01-07T08:55:00"),  # out of order: earliest punch of the day
+    ("K2", "PI001", "2026-01-07T13:00:00"),
+]
+
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.add_all([
+            Employee(emp_code="PI001", first_name="Punch", last_name="One", mobile_no="7100000001", status="active"),
+            Employee(emp_code="PI002", first_name="Punch", last_name="Two", mobile_no="7100000002", status="active"),
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def day_log(db, emp_code):
+    return db.query(AttendanceLog).join(Employee, Employee.id == AttendanceLog.employee_id).filter(
+        Employee.emp_code == emp_code, AttendanceLog.date == DAY
+    ).one()
+
+
+def naive(ts):
+    # SQLite hands timestamps back without a zone
+    return ts.replace(tzinfo=None) if ts is not None else None
+
+
+def test_formats_parse_alike():
+    print("\n--- JSON, JSON lines and CSV ---")
+    objects = [{"device_id": d, "emp_code": c, "timestamp": t} for d, c, t in PUNCHES]
+    payloads = {
+        "json": json.dumps(objects).encode(),
+        "ndjson": "\n".join(json.dumps(o) for o in objects).encode(),
+        "csv": ("device_id,emp_code,timestamp\n" + "\n".join(",".join(p) for p in PUNCHES)).encode(),
+    }
+    parsed = {}
+    for name, body in payloads.items():
+        records, errors = parse_punch_payload(body)
+        assert not errors, f"{name}: {errors}"
+        parsed[name] = [(r["device_id"], r["emp_code"], r["punched_at"], r["idempotency_key"]) for r in records]
+    assert parsed["json"] == parsed["ndjson"] == parsed["csv"], "formats disagree"
+
+    records, errors = parse_punch_payload(b'{"device_id": "K1", "emp_code": "PI001", "timestamp": "x"}\n{oops}')
+    assert not records and [n for n, _ in errors] == [1, 2], errors
+    print("  ok")
+
+
+def test_replay_is_idempotent():
+    print("\n--- Replayed batch ---")
+    body = json.dumps([
+        {"device_id": d, "emp_code": c, "timestamp": t, "idempotency_key": f"{d}-{i}"}
+        for i, (d, c, t) in enumerate(PUNCHES)
+    ]).encode()
+    db = SessionLocal()
+    try:
+        first = punch_service.ingest(body, db)
+        assert first["accepted"] == len(PUNCHES) and first["duplicates"] == 0, first
+        again = punch_service.ingest(body, db)
+        print(f"  replay: {again}")
+        assert again["accepted"] == 0 and again["duplicates"] == len(PUNCHES), again
+        assert again["days_updated"] == 0
+        assert db.query(PunchEvent).count() == len(PUNCHES)
+    finally:
+        db.close()
+
+
+def test_fold_first_in_last_out():
+    print("\n--- Fold ---")
+    db = SessionLocal()
+    try:
+        log = day_log(db, "PI001")
+        print(f"  {log.check_in} -> {log.check_out}, {log.total_hours_worked}h")
+        assert naive(log.check_in) == datetime.datetime(2026, 1, 7, 8, 55)
+        assert naive(log.check_out) == datetime.datetime(2026, 1, 7, 18, 40)
+        assert log.source == "device" and log.status == "present"
+        # 9h45m less the 30 min break; 1.25h over the standard day is under the 2h OT slot
+        assert float(log.total_hours_worked) == 9.25 and float(log.ot_hours) == 0.0
+    finally:
+        db.close()
+
+
+def test_imported_log_is_left_alone():
+    print("\n--- Imported log vs. late device punches ---")
+    db = SessionLocal()
+    try:
+        emp = db.query(Employee).filter(Employee.emp_code == "PI002").one()
+        db.add(AttendanceLog(
+            employee_id=emp.id, date=DAY, status="present", source="import",
+            check_in=datetime.datetime(2026, 1, 7, 10, 0), check_out=datetime.datetime(2026, 1, 7, 16, 0),
+            total_hours_worked=7.0, ot_hours=0.0,
+        ))
+        db.commit()
+        result = punch_service.ingest(json.dumps([
+            {"device_id": "K1", "emp_code": "PI002", "timestamp": "2026-01-07T07:00:00"},
+            {"device_id": "K1", "emp_code": "PI002", "timestamp": "2026-01-07T20:00:00"},
+        ]).encode(), db)
+        assert result["accepted"] == 2 and result["days_updated"] == 0, result
+        db.expire_all()
+        log = day_log(db, "PI002")
+        assert naive(log.check_in) == datetime.datetime(2026, 1, 7, 10, 0)
+        assert naive(log.check_out) == datetime.datetime(2026, 1, 7, 16, 0)
+        assert float(log.total_hours_worked) == 7.0, "imported hours overwritten"
+        print("  ok")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    try:
+        seed()
+        test_formats_parse_alike()
+        test_replay_is_idempotent()
+        test_fold_first_in_last_out()
+        test_imported_log_is_left_alone()
+        print("\n[SUCCESS] Punch ingestion checks passed!")
+    except AssertionError as e:
+        print(f"\n[FAILURE] {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n[ERROR] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,139 @@
+"""
+Query budgets for key endpoints
+
+    python test_query_budget.py
+
+Seeds a throwaway SQLite database at two sizes and checks that each endpoint
+below runs at most its budgeted number of SQL statements (read from the
+X-DB-Queries header), whatever the number of rows. A lazy load per row
+(N+1) shows up as a count that grows with the data and fails the budget.
+Exits non-zero on failure.
+"""
+import os
+import sys
+import tempfile
+import datetime
+
+# Throwaway database; must be set before the app is imported
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="query_budget_"), "budget.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ["DB_DEBUG_HEADERS"] = "true"
+os.environ["FORCE_MOCK_MODE"] = "true"
+
+# Add parent directory to path to import app modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.database import SessionLocal
+from app.core.query_stats import assert_max_queries
+from app.models.models import Department, Employee, SalaryStructure, AttendanceLog, EmployeeLoan
+from app.services.cache import cache
+from app.services.attendance_rollup import DASHBOARD_CACHE
+from app.services.department_directory import department_directory, DEPARTMENT_CACHE
+
+MONTH, YEAR = 1, 2026
+
+# (method, url, max statements); counts are with the principal cache warm and response caches cleared
+BUDGETS = [
+    ("GET", "/api/v1/departments", 1),
+    ("GET", "/api/v1/loans", 1),
+    ("GET", "/api/v1/loans/outstanding-report", 1),
+    ("GET", f"/api/v1/payroll/list?month={MONTH}&year={YEAR}", 1),
+    ("GET", "/api/v1/dashboard/stats", 8),  # includes computing today's rollup rows (upsert + stale-group delete) on first load
+    ("GET", "/api/v1/attendance/logs?limit=50", 2),
+]
+
+
+def seed(start, count):
+    """Add `count` employees (with salary, a loan and a week of attendance) across 3 departments"""
+    db = SessionLocal()
+    try:
+        if not db.query(Department).count():
+            for name in ("Production", "Quality", "Stores"):
+                db.add(Department(name=name, status="active"))
+        for i in range(start, start + count):
+            emp = Employee(
+                emp_code=f"QB{i:04d}", first_name=f"Emp{i}", last_name="Budget", mobile_no=f"8{i:09d}",
+                department=("Production", "Quality", "Stores")[i % 3], status="active"
+            )
+            db.add(emp)
+            db.flush()
+            db.add(SalaryStructure(employee_id=emp.id, basic_salary=15000))
+            db.add(EmployeeLoan(
+                employee_id=emp.id, loan_type="advance", loan_amount=6000, emi_amount=1000,
+                total_emis=6, remaining_emis=6, start_date=datetime.date(YEAR, MONTH, 1)
+            ))
+            for day in range(5, 10):
+                date = datetime.date(YEAR, MONTH, day)
+                db.add(AttendanceLog(
+                    employee_id=emp.id, date=date, status="present", source="manual",
+                    check_in=datetime.datetime.combine(date, datetime.time(9, 0)),
+                    check_out=datetime.datetime.combine(date, datetime.time(18, 0))
+                ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_budgets(client, headers):
+    failures = []
+    for method, url, budget in BUDGETS:
+        cache.invalidate(DASHBOARD_CACHE, DEPARTMENT_CACHE)
+        response = client.request(method, url, headers=headers)
+        if response.status_code != 200:
+            failures.append(f"{url} returned {response.status_code}: {response.text[:200]}")
+            continue
+        count = int(response.headers["x-db-queries"])
+        print(f"  {url:<52} {count:>3} queries (budget {budget})")
+        if count > budget:
+            failures.append(f"{url} ran {count} queries (budget {budget})")
+    return failures
+
+
+def test_endpoint_query_budgets():
+    print("\n--- Endpoint query budgets ---")
+    client = TestClient(app)
+    client.__enter__()
+    try:
+        token = client.post("/api/v1/auth/login", data={"username": "admin", "password": "password123"})
+        headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+        client.get("/api/v1/loans", headers=headers)  # warm the principal cache
+
+        failures = []
+        total = 0
+        for count in (5, 25):
+            seed(total, count)
+            total += count
+            client.post("/api/v1/payroll/generate", json={"month": MONTH, "year": YEAR})
+            print(f" {total} employees:")
+            failures.extend(run_budgets(client, headers))
+    finally:
+        client.__exit__(None, None, None)
+    assert not failures, "\n".join(failures)
+
+
+def test_service_query_budget():
+    print("\n--- Service query budget ---")
+    db = SessionLocal()
+    try:
+        with assert_max_queries(1, "department_directory.list") as stats:
+            department_directory.list(db)
+        print(f"  department_directory.list: {stats.count} queries (budget 1)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    try:
+        test_endpoint_query_budgets()
+        test_service_query_budget()
+        print("\n[SUCCESS] All query budgets met!")
+    except AssertionError as e:
+        print(f"\n[FAILURE] Query budget exceeded:\n{e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n[ERROR] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)